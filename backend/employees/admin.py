@@ -1,5 +1,17 @@
 from django.contrib import admin
-from .models import Employee, Department, Construction, ConstructionSector
+from django.db import transaction
+from gestao_api.broadcast import broadcaster
+from .models import (
+    Employee,
+    Department,
+    Construction,
+    ConstructionSector,
+    PayrollPeriod,
+    PayrollPeriodEntry,
+    PaymentEntry,
+)
+from .payments import register_payments
+from .payroll import reset_payment_status
 
 
 @admin.register(Construction)
@@ -23,6 +35,60 @@ class DepartmentAdmin(admin.ModelAdmin):
     search_fields = ("name",)
 
 
+@admin.register(PayrollPeriod)
+class PayrollPeriodAdmin(admin.ModelAdmin):
+    list_display = (
+        "__str__",
+        "employee_count",
+        "salary_total",
+        "salary_paid",
+        "closed_at",
+    )
+    list_filter = ("year",)
+
+
+@admin.register(PayrollPeriodEntry)
+class PayrollPeriodEntryAdmin(admin.ModelAdmin):
+    list_display = (
+        "employee_name",
+        "period",
+        "construction",
+        "salary_payment_status",
+        "salary_amount_paid",
+    )
+    list_filter = ("period", "construction", "salary_payment_status")
+    search_fields = ("employee_name",)
+
+
+@admin.register(PaymentEntry)
+class PaymentEntryAdmin(admin.ModelAdmin):
+    list_display = ("employee", "payment_type", "period", "kind", "amount", "paid_on")
+    list_filter = ("period", "payment_type", "kind")
+    search_fields = ("employee__name",)
+
+    # O livro é somente inclusão: correções são feitas com estornos
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class PaymentEntryInline(admin.TabularInline):
+    model = PaymentEntry
+    fields = ("payment_type", "period", "kind", "amount", "paid_on")
+    readonly_fields = fields
+    ordering = ("-created_at", "-id")
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
     list_display = (
@@ -47,6 +113,7 @@ class EmployeeAdmin(admin.ModelAdmin):
     search_fields = ("name", "cpf", "position", "construction__name")
     readonly_fields = ("total_to_receive", "total_paid", "created_at", "updated_at")
     actions = ["mark_salary_as_paid", "mark_all_as_paid", "reset_all_payments"]
+    inlines = [PaymentEntryInline]
 
     fieldsets = (
         ("Informações Pessoais", {"fields": ("name", "cpf", "phone", "email")}),
@@ -102,30 +169,53 @@ class EmployeeAdmin(admin.ModelAdmin):
     )
 
     def mark_salary_as_paid(self, request, queryset):
-        for employee in queryset:
-            employee.mark_salary_as_paid()
-        self.message_user(request, f"{queryset.count()} salários marcados como pagos.")
+        _, employee_ids = register_payments(
+            [
+                {"employee_id": employee_id, "payment_type": "salary"}
+                for employee_id in queryset.values_list("pk", flat=True)
+            ]
+        )
+        self._notify_update("payment_registered", employee_ids)
+        self.message_user(request, f"{len(employee_ids)} salários marcados como pagos.")
 
     mark_salary_as_paid.short_description = "Marcar salários como pagos"
 
     def mark_all_as_paid(self, request, queryset):
-        for employee in queryset:
-            employee.mark_salary_as_paid()
-            employee.mark_meal_allowance_as_paid()
-            employee.mark_transport_allowance_as_paid()
+        # Lança o saldo restante de cada tipo no livro, em uma única transação
+        _, employee_ids = register_payments(
+            [
+                {"employee_id": employee_id, "payment_type": payment_type}
+                for employee_id in queryset.values_list("pk", flat=True)
+                for payment_type in Employee.PAYMENT_TYPE_FIELDS
+            ]
+        )
+        self._notify_update("payment_registered", employee_ids)
         self.message_user(
             request,
-            f"Todos os pagamentos de {queryset.count()} funcionários foram marcados como pagos.",
+            f"Todos os pagamentos de {len(employee_ids)} funcionários foram marcados como pagos.",
         )
 
     mark_all_as_paid.short_description = "Marcar todos os pagamentos como pagos"
 
     def reset_all_payments(self, request, queryset):
-        for employee in queryset:
-            employee.reset_all_payment_status()
+        with transaction.atomic():
+            employee_ids = reset_payment_status(queryset)
+        self._notify_update("payments_reset", employee_ids)
         self.message_user(
             request,
-            f"Status de pagamento resetado para {queryset.count()} funcionários.",
+            f"Status de pagamento resetado para {len(employee_ids)} funcionários.",
         )
 
     reset_all_payments.short_description = "Resetar todos os status de pagamento"
+
+    def _notify_update(self, action, employee_ids):
+        # Um único evento por ação em massa, em vez de um por funcionário
+        if not employee_ids:
+            return
+        broadcaster.notify(
+            "employees",
+            "employee_message",
+            "Employee data changed",
+            action,
+            ids=employee_ids,
+        )
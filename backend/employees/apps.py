@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class EmployeesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'employees'
+
+    def ready(self):
+        from financials import rollups
+        from . import ledger, signals  # noqa: F401
+
+        rollups.register_cost_source(ledger.cost_source)
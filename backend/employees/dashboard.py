@@ -0,0 +1,92 @@
+from decimal import Decimal
+from django.db.models import F
+from .models import Construction, Department
+from .serializers import DashboardSerializer
+from . import snapshot
+
+
+def _sum_present(*values):
+    """Soma os valores ignorando totais nulos (obras sem funcionários)"""
+    total = Decimal("0")
+    for value in values:
+        if value:
+            total += value
+    return total
+
+
+def compute_dashboard_metrics():
+    """
+    Calcula as métricas do dashboard a partir do snapshot incremental.
+
+    A leitura custa O(obras): a linha global do snapshot, a contagem de
+    departamentos e as obras ativas unidas às suas linhas do snapshot.
+    """
+    totals = snapshot.get_global_snapshot()
+    total_departments = Department.objects.count()
+
+    # LEFT JOIN mantém obras ativas que ainda não têm funcionários
+    constructions = (
+        Construction.objects.filter(is_active=True)
+        .order_by(*Construction._meta.ordering)
+        .values(
+            "pk",
+            "name",
+            employee_count=F("dashboard_snapshot__employee_count"),
+            salary_to_pay=F("dashboard_snapshot__salary_total"),
+            salary_paid=F("dashboard_snapshot__salary_paid"),
+            meal_to_pay=F("dashboard_snapshot__meal_allowance_total"),
+            meal_paid=F("dashboard_snapshot__meal_allowance_paid"),
+            transport_to_pay=F("dashboard_snapshot__transport_allowance_total"),
+            transport_paid=F("dashboard_snapshot__transport_allowance_paid"),
+        )
+    )
+
+    employees_by_construction = []
+    payments_by_construction = []
+
+    for row in constructions:
+        total_paid = _sum_present(
+            row["salary_paid"], row["meal_paid"], row["transport_paid"]
+        )
+
+        employees_by_construction.append(
+            {
+                "construction_id": row["pk"],
+                "construction_name": row["name"],
+                "total_employees": row["employee_count"] or 0,
+                "total_salary": row["salary_to_pay"] or Decimal("0"),
+                "total_paid": total_paid,
+            }
+        )
+        payments_by_construction.append(
+            {
+                "construction_id": row["pk"],
+                "construction_name": row["name"],
+                "total_to_pay": _sum_present(
+                    row["salary_to_pay"], row["meal_to_pay"], row["transport_to_pay"]
+                ),
+                "total_paid": total_paid,
+            }
+        )
+
+    return {
+        "total_employees": totals.employee_count,
+        "total_constructions": len(employees_by_construction),
+        "total_departments": total_departments,
+        "total_salary_to_pay": totals.salary_total,
+        "total_salary_paid": totals.salary_paid,
+        "total_meal_allowance_to_pay": totals.meal_allowance_total,
+        "total_meal_allowance_paid": totals.meal_allowance_paid,
+        "total_transport_allowance_to_pay": totals.transport_allowance_total,
+        "total_transport_allowance_paid": totals.transport_allowance_paid,
+        "employees_with_pending_salary": totals.pending_salary_count,
+        "employees_with_paid_salary": totals.paid_salary_count,
+        "employees_with_partial_salary": totals.partial_salary_count,
+        "employees_by_construction": employees_by_construction,
+        "payments_by_construction": payments_by_construction,
+    }
+
+
+def get_dashboard_data():
+    """Retorna os dados do dashboard já serializados (REST e WebSocket)"""
+    return DashboardSerializer(compute_dashboard_metrics()).data
@@ -0,0 +1,262 @@
+"""
+Importação em lote de funcionários (CSV, JSON ou NDJSON).
+
+As linhas são lidas sob demanda e processadas em blocos. Em cada bloco os
+nomes de departamento, obra e setor ainda desconhecidos são resolvidos com
+no máximo um upsert por modelo (ver ``references``), os CPFs são conferidos
+com uma única consulta e os funcionários são gravados com ``bulk_create``.
+Erros são reportados por linha sem interromper o lote.
+"""
+
+import csv
+import io
+import json
+from django.db import IntegrityError, transaction
+from .models import Employee
+from .serializers import EmployeeImportRowSerializer
+from . import references, snapshot
+
+IMPORT_FORMATS = ("csv", "json", "ndjson")
+
+# Campos de referência informados por nome em cada linha
+REFERENCE_FIELDS = ("department", "construction", "construction_sector")
+
+
+def open_text(fileobj):
+    """Abre um arquivo binário (upload, disco) como texto UTF-8, aceitando BOM"""
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+
+
+def parse_rows(stream, import_format):
+    """
+    Gera ``(número da linha, dados, erro)`` para cada registro do arquivo.
+
+    CSV e NDJSON são lidos linha a linha; JSON deve ser uma lista de objetos.
+    Valores vazios do CSV são descartados, como campos não informados.
+    """
+    if import_format == "csv":
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, {key: value for key, value in row.items() if value}, None
+
+    elif import_format == "ndjson":
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield number, None, "JSON inválido."
+                continue
+            if isinstance(data, dict):
+                yield number, data, None
+            else:
+                yield number, None, "Cada linha deve ser um objeto JSON."
+
+    else:
+        try:
+            data = json.load(stream) if hasattr(stream, "read") else stream
+        except ValueError:
+            yield 1, None, "JSON inválido."
+            return
+        if not isinstance(data, list):
+            yield 1, None, "O arquivo JSON deve conter uma lista de funcionários."
+            return
+        for number, item in enumerate(data, start=1):
+            if isinstance(item, dict):
+                yield number, item, None
+            else:
+                yield number, None, "Cada item deve ser um objeto JSON."
+
+
+class ReferenceResolver:
+    """
+    Converte nomes de departamento, obra e setor em ids para uma importação.
+
+    Os nomes ainda não vistos no arquivo são resolvidos em lote pelo cache
+    de referências, com no máximo um upsert por modelo e bloco; os ids
+    ficam guardados até o fim da importação.
+    """
+
+    def __init__(self):
+        self.departments = {}
+        self.constructions = {}
+        self.sectors = {}
+
+    def resolve(self, rows):
+        self._update(
+            self.departments,
+            references.department_ids,
+            {row["department"] for row in rows},
+        )
+        self._update(
+            self.constructions,
+            references.construction_ids,
+            {row["construction"] for row in rows},
+        )
+        self._update(
+            self.sectors,
+            references.sector_ids,
+            {
+                (self.constructions[row["construction"]], row["construction_sector"])
+                for row in rows
+            },
+        )
+
+    def ids_for(self, row):
+        construction_id = self.constructions[row["construction"]]
+        return {
+            "department_id": self.departments[row["department"]],
+            "construction_id": construction_id,
+            "construction_sector_id": self.sectors[
+                (construction_id, row["construction_sector"])
+            ],
+        }
+
+    def clear(self):
+        self.departments.clear()
+        self.constructions.clear()
+        self.sectors.clear()
+
+    def _update(self, cache, resolve, keys):
+        missing = keys - set(cache)
+        if missing:
+            cache.update(resolve(missing))
+
+
+class EmployeeImport:
+    """Estado de uma importação: resultado, erros por linha e ids criados"""
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.resolver = ReferenceResolver()
+        self.seen_cpfs = set()
+        self.created_ids = []
+        self.errors = []
+
+    def as_dict(self):
+        return {
+            "created": len(self.created_ids),
+            "failed": len(self.errors),
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+        }
+
+    def run(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        return self
+
+    def _error(self, number, errors):
+        self.errors.append({"row": number, "errors": errors})
+
+    def _import_chunk(self, chunk):
+        valid = []
+        for number, data, error in chunk:
+            if error:
+                self._error(number, {"non_field_errors": [error]})
+                continue
+            serializer = EmployeeImportRowSerializer(data=data)
+            if serializer.is_valid():
+                valid.append((number, dict(serializer.validated_data)))
+            else:
+                self._error(number, serializer.errors)
+
+        cpfs = {data["cpf"] for _, data in valid if data.get("cpf")}
+        existing = (
+            set(Employee.objects.filter(cpf__in=cpfs).values_list("cpf", flat=True))
+            if cpfs
+            else set()
+        )
+
+        rows = []
+        for number, data in valid:
+            cpf = data.get("cpf")
+            if cpf in existing:
+                self._error(number, {"cpf": ["Já existe um funcionário com este CPF."]})
+            elif cpf and cpf in self.seen_cpfs:
+                self._error(number, {"cpf": ["CPF repetido no arquivo."]})
+            else:
+                if cpf:
+                    self.seen_cpfs.add(cpf)
+                rows.append((number, data))
+        if not rows:
+            return
+
+        # Se um id de referência do cache não existe mais, o bloco é refeito
+        # com os nomes resolvidos de novo
+        created, failed = references.save_with_references(
+            lambda: self._save_rows(rows), on_stale=self.resolver.clear
+        )
+        for number, errors in failed:
+            self._error(number, errors)
+        self.created_ids.extend(employee.pk for employee in created)
+
+    def _save_rows(self, rows):
+        self.resolver.resolve([data for _, data in rows])
+        employees = [(number, self._build(data)) for number, data in rows]
+        failed = []
+        try:
+            with transaction.atomic():
+                created = Employee.objects.bulk_create(
+                    [employee for _, employee in employees]
+                )
+        except IntegrityError:
+            # Conflito concorrente (ex.: CPF gravado por outra requisição):
+            # grava linha a linha para apontar qual falhou
+            created, failed = self._create_one_by_one(employees)
+
+        # INSERTs em lote não disparam sinais; o snapshot recebe os deltas aqui
+        snapshot.apply_transitions(
+            (None, employee.dashboard_state()) for employee in created
+        )
+        return created, failed
+
+    def _build(self, data):
+        fields = {
+            key: value for key, value in data.items() if key not in REFERENCE_FIELDS
+        }
+        return Employee(**fields, **self.resolver.ids_for(data))
+
+    def _create_one_by_one(self, employees):
+        """Grava linha a linha; devolve as criadas e ``(linha, erros)`` das demais"""
+        created, rejected = [], []
+        for number, employee in employees:
+            try:
+                with transaction.atomic():
+                    Employee.objects.bulk_create([employee])
+            except IntegrityError:
+                rejected.append((number, employee))
+            else:
+                created.append(employee)
+
+        # Só é CPF duplicado se o CPF agora existe; outras restrições (ex.: uma
+        # referência excluída ao mesmo tempo) recebem uma mensagem genérica
+        cpfs = {employee.cpf for _, employee in rejected if employee.cpf}
+        existing = (
+            set(Employee.objects.filter(cpf__in=cpfs).values_list("cpf", flat=True))
+            if cpfs
+            else set()
+        )
+        failed = [
+            (
+                number,
+                (
+                    {"cpf": ["Já existe um funcionário com este CPF."]}
+                    if employee.cpf in existing
+                    else {
+                        "non_field_errors": [
+                            "A linha viola uma restrição do banco de dados."
+                        ]
+                    }
+                ),
+            )
+            for number, employee in rejected
+        ]
+        return created, failed
@@ -0,0 +1,211 @@
+"""
+Livro de pagamentos dos funcionários.
+
+Todo pagamento gera um PaymentEntry (somente inclusão) no período aberto e
+soma o valor em PaymentPeriodTotal, de modo que "quanto já foi pago" é uma
+leitura pela chave única (funcionário, tipo, período). As colunas
+``*_amount_paid`` de Employee espelham esse total e alimentam o snapshot do
+dashboard e o fechamento da folha.
+"""
+
+from datetime import date
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from financials import rollups
+from financials.models import COST_GROUPS
+from .models import Employee, PaymentEntry, PaymentPeriodTotal, PayrollPeriod
+
+ZERO = Decimal("0.00")
+
+
+def open_period():
+    """
+    Primeiro dia do mês em aberto: o seguinte à última folha fechada ou,
+    se nenhuma folha foi fechada, o mês corrente.
+    """
+    last = (
+        PayrollPeriod.objects.order_by("-year", "-month")
+        .values_list("year", "month")
+        .first()
+    )
+    if last is None:
+        today = timezone.localdate()
+        return date(today.year, today.month, 1)
+    year, month = last
+    return date(year + month // 12, month % 12 + 1, 1)
+
+
+def payment_status(total, due):
+    """Status do pagamento a partir do total pago no período"""
+    if total <= ZERO:
+        return "pending"
+    return "paid" if total >= due else "partial"
+
+
+def remaining(employee, payment_type):
+    """Saldo ainda não pago do tipo, segundo o espelho em Employee"""
+    due_field, _, paid_field, _ = Employee.PAYMENT_TYPE_FIELDS[payment_type]
+    return max(getattr(employee, due_field) - getattr(employee, paid_field), ZERO)
+
+
+def apply_total(employee, payment_type, total, paid_on):
+    """Atualiza na instância o espelho do total pago (sem salvar)"""
+    due_field, status_field, paid_field, date_field = Employee.PAYMENT_TYPE_FIELDS[
+        payment_type
+    ]
+    setattr(employee, paid_field, total)
+    setattr(employee, status_field, payment_status(total, getattr(employee, due_field)))
+    setattr(employee, date_field, paid_on)
+
+
+def paid_so_far(employee_id, payment_type, period=None):
+    """Total pago no período (por padrão, o aberto) com uma leitura pela chave"""
+    total = (
+        PaymentPeriodTotal.objects.filter(
+            employee_id=employee_id,
+            payment_type=payment_type,
+            period=period or open_period(),
+        )
+        .values_list("amount_paid", flat=True)
+        .first()
+    )
+    return total if total is not None else ZERO
+
+
+def cost_state(entry):
+    """Contribuição de um lançamento para o cubo de custos por obra"""
+    return {
+        "month": entry.period,
+        "construction_id": entry.construction_id,
+        "construction_sector_id": entry.construction_sector_id,
+        "cost_type": entry.payment_type,
+        "cost_group": COST_GROUPS[entry.payment_type],
+        "total": entry.amount,
+        "entry_count": 1,
+    }
+
+
+def cost_source():
+    """Lançamentos como origem do cubo (registrada em EmployeesConfig.ready)"""
+    return PaymentEntry.objects.annotate(month=F("period"), cost_type=F("payment_type"))
+
+
+def record_entries(entries, period, kind="payment", paid_on=None):
+    """
+    Lança ``entries`` (funcionário, tipo, valor) no livro e acumula os
+    totais do período, com um número fixo de consultas por chamada.
+
+    Retorna ``{(funcionário, tipo): total pago}`` das chaves lançadas.
+    """
+    entries = [entry for entry in entries if entry[2]]
+    if not entries:
+        return {}
+
+    paid_on = paid_on or timezone.localdate()
+    now = timezone.now()
+    keys = sorted(
+        {(employee_id, payment_type) for employee_id, payment_type, _ in entries}
+    )
+
+    with transaction.atomic():
+        # Cria as linhas de total que faltam antes de bloqueá-las, para que
+        # pagamentos concorrentes do mesmo funcionário somem na mesma linha
+        PaymentPeriodTotal.objects.bulk_create(
+            [
+                PaymentPeriodTotal(
+                    employee_id=employee_id, payment_type=payment_type, period=period
+                )
+                for employee_id, payment_type in keys
+            ],
+            ignore_conflicts=True,
+        )
+        totals = {
+            (row.employee_id, row.payment_type): row
+            for row in PaymentPeriodTotal.objects.select_for_update()
+            .filter(
+                period=period,
+                employee_id__in={employee_id for employee_id, _ in keys},
+                payment_type__in={payment_type for _, payment_type in keys},
+            )
+            .order_by("pk")
+        }
+
+        # Obra e setor atuais de cada funcionário vão para o lançamento (e
+        # para o cubo de custos por obra)
+        assignments = {
+            pk: (construction_id, sector_id if construction_id else None)
+            for pk, construction_id, sector_id in Employee.objects.filter(
+                pk__in={employee_id for employee_id, _ in keys}
+            ).values_list("pk", "construction_id", "construction_sector_id")
+        }
+        ledger_entries = []
+        for employee_id, payment_type, amount in entries:
+            construction_id, sector_id = assignments.get(employee_id, (None, None))
+            ledger_entries.append(
+                PaymentEntry(
+                    employee_id=employee_id,
+                    payment_type=payment_type,
+                    period=period,
+                    kind=kind,
+                    amount=amount,
+                    paid_on=paid_on,
+                    construction_id=construction_id,
+                    construction_sector_id=sector_id,
+                )
+            )
+        PaymentEntry.objects.bulk_create(ledger_entries)
+        # INSERTs em lote não disparam sinais
+        rollups.apply_transitions(
+            rollups.COSTS,
+            [(None, cost_state(entry)) for entry in ledger_entries],
+        )
+        for employee_id, payment_type, amount in entries:
+            row = totals[(employee_id, payment_type)]
+            row.amount_paid += amount
+            row.entry_count += 1
+            row.updated_at = now
+        PaymentPeriodTotal.objects.bulk_update(
+            [totals[key] for key in keys], ["amount_paid", "entry_count", "updated_at"]
+        )
+
+    return {key: totals[key].amount_paid for key in keys}
+
+
+def record_payment(employee, payment_type, amount=None):
+    """Lança um pagamento do funcionário e salva o novo total na instância"""
+    with transaction.atomic():
+        amount = amount or remaining(employee, payment_type)
+        totals = record_entries([(employee.pk, payment_type, amount)], open_period())
+        total = totals.get(
+            (employee.pk, payment_type),
+            getattr(employee, Employee.PAYMENT_TYPE_FIELDS[payment_type][2]),
+        )
+        apply_total(employee, payment_type, total, timezone.localdate())
+        employee.save()
+
+
+def reverse_open_period(employee_ids=None):
+    """
+    Estorna os totais do período aberto dos funcionários informados (ou de
+    todos), zerando o valor pago sem apagar lançamentos.
+    """
+    with transaction.atomic():
+        period = open_period()
+        totals = (
+            PaymentPeriodTotal.objects.select_for_update()
+            .filter(period=period)
+            .exclude(amount_paid=ZERO)
+        )
+        if employee_ids is not None:
+            totals = totals.filter(employee_id__in=employee_ids)
+        rows = totals.values_list("employee_id", "payment_type", "amount_paid")
+        return record_entries(
+            [
+                (employee_id, payment_type, -amount)
+                for employee_id, payment_type, amount in rows
+            ],
+            period,
+            kind="reversal",
+        )
@@ -0,0 +1,134 @@
+"""
+Teste de carga do fan-out WebSocket dos funcionários, dentro do processo.
+
+Abre N clientes ``WebsocketCommunicator`` no EmployeeConsumer sobre a
+InMemoryChannelLayer, dispara uma sequência de notificações pelo mesmo
+caminho das views (``broadcaster.notify``) e mede, para cada quantidade de
+clientes, a latência de entrega ponta a ponta, as mensagens por segundo, as
+consultas SQL por evento e a memória por conexão.
+"""
+
+import asyncio
+import json
+import time
+import tracemalloc
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from gestao_api.benchmark import percentile
+from gestao_api.broadcast import CoalescingBroadcaster
+from gestao_api.fanout import payload_fanout
+from .consumers import EmployeeConsumer
+from .models import Employee
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+}
+
+# Último frame enviado aos clientes para uma alteração de funcionários
+FINAL_FRAME = "dashboard_update"
+
+
+@sync_to_async
+def logged_queries():
+    """Consultas registradas na conexão usada pelos consumers (thread principal)"""
+    return len(connection.queries_log)
+
+
+async def open_clients(count, timeout):
+    """Conecta ``count`` clientes e consome os dados iniciais de cada um"""
+    clients = []
+    for _ in range(count):
+        communicator = WebsocketCommunicator(
+            EmployeeConsumer.as_asgi(), "/ws/employees/"
+        )
+        connected, _ = await communicator.connect(timeout=timeout)
+        if not connected:
+            raise RuntimeError("Conexão WebSocket recusada.")
+        await communicator.receive_from(timeout=timeout)
+        clients.append(communicator)
+    return clients
+
+
+async def drain_event(client, timeout):
+    """Lê os frames de um evento até o último; retorna (chegada, frames)"""
+    frames = 0
+    while True:
+        message = json.loads(await client.receive_from(timeout=timeout))
+        frames += 1
+        if message["type"] == FINAL_FRAME:
+            return time.perf_counter(), frames
+
+
+async def run_stream(client_count, events, action, employee_ids, timeout):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        clients = await open_clients(client_count, timeout)
+        connection_memory = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    # Janela zero: cada notificação vira um evento, sem coalescência
+    notify = sync_to_async(CoalescingBroadcaster(window_ms=0).notify)
+    deliveries, broadcasts = [], []
+    frames = 0
+    try:
+        queries_before = await logged_queries()
+        started = time.perf_counter()
+        for index in range(events):
+            ids = [employee_ids[index % len(employee_ids)]] if employee_ids else ()
+            sent = time.perf_counter()
+            await notify(
+                "employees", "employee_message", "Employee data changed", action, ids
+            )
+            arrivals = await asyncio.gather(
+                *(drain_event(client, timeout) for client in clients)
+            )
+            latencies = [(arrival - sent) * 1000 for arrival, _ in arrivals]
+            deliveries.extend(latencies)
+            broadcasts.append(max(latencies))
+            frames += sum(count for _, count in arrivals)
+        elapsed = time.perf_counter() - started
+        queries = await logged_queries() - queries_before
+    finally:
+        for client in clients:
+            await client.disconnect()
+
+    return {
+        "clients": client_count,
+        "events": events,
+        "delivery_p50_ms": round(percentile(deliveries, 0.50), 3),
+        "delivery_p95_ms": round(percentile(deliveries, 0.95), 3),
+        "broadcast_p50_ms": round(percentile(broadcasts, 0.50), 3),
+        "broadcast_p95_ms": round(percentile(broadcasts, 0.95), 3),
+        "messages_per_second": round(frames / elapsed, 1),
+        "queries_per_event": round(queries / events, 2),
+        "memory_per_connection_kib": round(connection_memory / client_count / 1024, 1),
+    }
+
+
+def run_fanout(client_counts, events=20, action="employee_updated", timeout=30):
+    """
+    Executa a sequência de eventos para cada quantidade de clientes e
+    retorna os resultados na mesma ordem.
+
+    Os eventos carregam ids de funcionários existentes (envio de deltas); sem
+    funcionários, os clientes recebem a lista completa.
+    """
+    employee_ids = list(
+        Employee.objects.order_by("pk").values_list("pk", flat=True)[:100]
+    )
+    results = []
+    with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+        # O log de consultas só é preenchido com um contexto de captura ativo
+        with CaptureQueriesContext(connection):
+            for client_count in client_counts:
+                payload_fanout.clear()
+                results.append(
+                    async_to_sync(run_stream)(
+                        client_count, events, action, employee_ids, timeout
+                    )
+                )
+    return results
@@ -0,0 +1 @@
+# Arquivo __init__.py para o pacote commands
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gestao_api.broadcast import broadcaster
+from employees.payroll import (
+    PayrollPeriodClosed,
+    PayrollPeriodOutOfOrder,
+    close_payroll_period,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fecha a folha de pagamento do mês: congela os valores de cada "
+        "funcionário e reseta todos os status de pagamento"
+    )
+
+    def add_arguments(self, parser):
+        today = timezone.localdate()
+        parser.add_argument("--year", type=int, default=today.year)
+        parser.add_argument("--month", type=int, default=today.month)
+
+    def handle(self, *args, **options):
+        year, month = options["year"], options["month"]
+        if not 1 <= month <= 12:
+            raise CommandError("Mês inválido.")
+
+        try:
+            period = close_payroll_period(year, month)
+        except (PayrollPeriodClosed, PayrollPeriodOutOfOrder) as exc:
+            raise CommandError(str(exc))
+
+        broadcaster.notify(
+            "employees", "employee_message", "Payroll period closed", "payroll_closed"
+        )
+        broadcaster.flush_all()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{period} fechada com {period.employee_count} funcionários."
+            )
+        )
@@ -0,0 +1,55 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from gestao_api.broadcast import broadcaster
+from employees.importer import IMPORT_FORMATS, EmployeeImport, open_text, parse_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa funcionários em lote de um arquivo CSV, JSON ou NDJSON, "
+        "criando departamentos, obras e setores que ainda não existem"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Arquivo a importar")
+        parser.add_argument(
+            "--format",
+            dest="import_format",
+            choices=IMPORT_FORMATS,
+            help="Formato do arquivo (padrão: pela extensão)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        import_format = options["import_format"] or path.suffix.lstrip(".").lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(
+                f"Formato inválido. Use --format com: {', '.join(IMPORT_FORMATS)}"
+            )
+        if not path.is_file():
+            raise CommandError(f"Arquivo não encontrado: {path}")
+
+        with path.open("rb") as fileobj:
+            result = EmployeeImport(options["chunk_size"]).run(
+                parse_rows(open_text(fileobj), import_format)
+            )
+
+        if result.created_ids:
+            broadcaster.notify(
+                "employees",
+                "employee_message",
+                "Employee data changed",
+                "employees_imported",
+                ids=result.created_ids,
+            )
+            broadcaster.flush_all()
+
+        for error in result.as_dict()["errors"]:
+            self.stderr.write(f"Linha {error['row']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(result.created_ids)} funcionários importados, "
+                f"{len(result.errors)} linhas com erro."
+            )
+        )
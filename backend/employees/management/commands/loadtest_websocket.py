@@ -0,0 +1,45 @@
+import json
+from django.core.management.base import BaseCommand
+from gestao_api.benchmark import environment
+from employees.loadtest import run_fanout
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do fan-out WebSocket: abre N clientes em processo, "
+        "dispara notificações e mede latência, mensagens/s, consultas por "
+        "evento e memória por conexão para cada quantidade de clientes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clients", type=int, nargs="+", default=[1, 10, 50, 100, 250]
+        )
+        parser.add_argument("--events", type=int, default=20)
+        parser.add_argument("--action", default="employee_updated")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--output", help="Arquivo JSON para os resultados")
+
+    def handle(self, *args, **options):
+        results = run_fanout(
+            options["clients"],
+            events=options["events"],
+            action=options["action"],
+            timeout=options["timeout"],
+        )
+        for result in results:
+            self.stdout.write(
+                "{clients:>5} clientes  entrega p50 {delivery_p50_ms:>8.2f} ms  "
+                "p95 {delivery_p95_ms:>8.2f} ms  {messages_per_second:>9.1f} msg/s  "
+                "{queries_per_event:>5} consultas/evento  "
+                "{memory_per_connection_kib:>7.1f} KiB/conexão".format(**result)
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(
+                    {"environment": environment(), "results": results},
+                    output,
+                    indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(f"Resultados em {options['output']}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from employees import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o snapshot do dashboard a partir dos funcionários e "
+        "informa divergências entre os valores gravados e os reais"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Apenas verifica divergências, sem reconstruir "
+            "(termina com erro se houver drift)",
+        )
+
+    def handle(self, *args, **options):
+        live = snapshot.live_values()
+        drift = snapshot.diff_snapshot(live=live)
+
+        for scope, field, stored, actual in drift:
+            label = "geral" if scope == snapshot.GLOBAL else f"obra {scope}"
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Divergência ({label}) {field}: gravado={stored} real={actual}"
+                )
+            )
+
+        if options["check"]:
+            if drift:
+                raise CommandError(f"{len(drift)} divergência(s) encontrada(s).")
+            self.stdout.write(self.style.SUCCESS("Snapshot consistente."))
+            return
+
+        snapshot.rebuild_snapshot(live=live)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Snapshot reconstruído ({len(live)} escopos, "
+                f"{len(drift)} divergência(s) corrigida(s))."
+            )
+        )
@@ -0,0 +1,130 @@
+import json
+from itertools import cycle
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from gestao_api.benchmark import environment, measure
+from employees.consumers import EmployeeConsumer
+from employees.models import Construction, Employee
+from financials.models import Expense, Transaction
+
+SCENARIOS = (
+    "dashboard",
+    "employee_list",
+    "employee_list_cursor",
+    "register_payment",
+    "expense_list",
+    "transaction_list",
+    "websocket_initial_load",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede os endpoints principais (latência p50/p95, consultas e pico de "
+        "memória) na base atual e grava os resultados em JSON. Use antes o "
+        "seed_benchmark_data para obter volumes realistas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--output", default="benchmark-results.json")
+        parser.add_argument("--only", nargs="+", choices=SCENARIOS)
+
+    def handle(self, *args, **options):
+        self.client = Client()
+        names = options["only"] or SCENARIOS
+
+        results = {}
+        for name in names:
+            run = getattr(self, f"scenario_{name}")()
+            results[name] = measure(run, options["iterations"], options["warmup"])
+            self.stdout.write(
+                "{name:<24} p50 {p50_ms:>9.2f} ms  p95 {p95_ms:>9.2f} ms  "
+                "{queries:>4} consultas  {peak_memory_kib:>10.1f} KiB".format(
+                    name=name, **results[name]
+                )
+            )
+
+        report = {
+            "environment": environment(),
+            "dataset": {
+                "constructions": Construction.objects.count(),
+                "employees": Employee.objects.count(),
+                "expenses": Expense.objects.count(),
+                "transactions": Transaction.objects.count(),
+            },
+            "results": results,
+        }
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Resultados em {options['output']}"))
+
+    def get(self, url):
+        def run():
+            response = self.client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url} retornou {response.status_code}")
+
+        return run
+
+    def scenario_dashboard(self):
+        return self.get(reverse("dashboard"))
+
+    def scenario_employee_list(self):
+        return self.get(reverse("employee-list"))
+
+    def scenario_employee_list_cursor(self):
+        return self.get(
+            reverse("employee-list") + "?pagination=cursor&ordering=-salary"
+        )
+
+    def scenario_expense_list(self):
+        return self.get(reverse("expense-list"))
+
+    def scenario_transaction_list(self):
+        return self.get(reverse("transaction-list"))
+
+    def scenario_register_payment(self):
+        employee_ids = list(
+            Employee.objects.filter(salary_payment_status="pending")
+            .order_by("pk")
+            .values_list("pk", flat=True)[:200]
+        )
+        if not employee_ids:
+            raise CommandError("Nenhum funcionário com salário pendente.")
+        employee_ids = cycle(employee_ids)
+
+        def run():
+            # Cada pagamento é desfeito para que a base não mude entre execuções
+            with transaction.atomic():
+                response = self.client.post(
+                    reverse("employee-register-payment", args=[next(employee_ids)]),
+                    {"payment_type": "salary", "amount": "1.00"},
+                )
+                transaction.set_rollback(True)
+            if response.status_code != 200:
+                raise CommandError(f"register_payment retornou {response.status_code}")
+
+        return run
+
+    def scenario_websocket_initial_load(self):
+        async def load():
+            # Mesma sequência do frontend: dados iniciais, dashboard e lista
+            communicator = WebsocketCommunicator(
+                EmployeeConsumer.as_asgi(), "/ws/employees/"
+            )
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise CommandError("Conexão WebSocket recusada.")
+            await communicator.receive_from(timeout=60)
+            for message_type in ("get_dashboard", "get_employees"):
+                await communicator.send_to(json.dumps({"type": message_type}))
+                await communicator.receive_from(timeout=60)
+            await communicator.disconnect()
+
+        return async_to_sync(load)
@@ -0,0 +1,209 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from employees import snapshot
+from employees.models import Construction, ConstructionSector, Department, Employee
+from financials import rollups
+from financials.models import Expense, ExpenseCategory, Material, Transaction
+
+# Prefixo dos registros gerados; uma nova execução remove os anteriores
+PREFIX = "BENCH"
+
+PAYMENT_STATUSES = ["pending", "paid", "partial"]
+PAYMENT_STATUS_WEIGHTS = [6, 3, 1]
+SECTOR_NAMES = ["Fundação", "Estrutura", "Alvenaria", "Elétrica", "Acabamento"]
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def cents(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)) / 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos e determinísticos (mesma semente, mesmos dados) "
+        "para benchmarks: obras, setores, funcionários, despesas e transações"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--constructions", type=int, default=500)
+        parser.add_argument("--departments", type=int, default=20)
+        parser.add_argument("--employees", type=int, default=50_000)
+        parser.add_argument("--materials", type=int, default=1_000)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--expenses", type=int, default=500_000)
+        parser.add_argument("--transactions", type=int, default=2_000_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.start_date = date(2024, 1, 1)
+
+        self.clear()
+        with transaction.atomic():
+            departments = self.create_departments(options["departments"])
+            sectors = self.create_constructions(options["constructions"])
+            self.create_employees(options["employees"], departments, sectors)
+            snapshot.rebuild_snapshot()
+
+        materials = self.create_named(
+            Material,
+            "Material",
+            options["materials"],
+            lambda index: {"unit_price": cents(self.rng, 5, 500)},
+        )
+        categories = self.create_named(
+            ExpenseCategory, "Categoria", options["categories"], lambda index: {}
+        )
+        expense_ids = self.create_expenses(options["expenses"], materials, categories)
+        self.create_transactions(options["transactions"], categories, expense_ids)
+        # INSERTs em lote não disparam sinais; os totais mensais são recalculados
+        rollups.rebuild_all()
+
+        self.stdout.write(self.style.SUCCESS("Dados de benchmark gerados."))
+
+    def clear(self):
+        """Remove os dados gerados por execuções anteriores"""
+        self.stdout.write("Removendo dados de benchmark anteriores...")
+        # Transações e despesas têm sinais (totais mensais), o que faria o
+        # delete() carregar cada registro; a exclusão é direta e os totais são
+        # reconstruídos ao final
+        transactions = Transaction.objects.filter(description__startswith=PREFIX)
+        transactions._raw_delete(transactions.db)
+        expenses = Expense.objects.filter(description__startswith=PREFIX)
+        Transaction.objects.filter(expense__in=expenses).update(expense=None)
+        expenses._raw_delete(expenses.db)
+        Material.objects.filter(name__startswith=PREFIX).delete()
+        ExpenseCategory.objects.filter(name__startswith=PREFIX).delete()
+        Employee.objects.filter(name__startswith=PREFIX).delete()
+        Construction.objects.filter(name__startswith=PREFIX).delete()
+        Department.objects.filter(name__startswith=PREFIX).delete()
+
+    def bulk(self, model, objects, keep=True):
+        """
+        Grava em lotes; com ``keep=False`` devolve só os ids, para que
+        grandes volumes não fiquem inteiros na memória.
+        """
+        created = []
+        for batch in batches(objects, self.batch_size):
+            batch = model.objects.bulk_create(batch)
+            created.extend(batch if keep else [instance.pk for instance in batch])
+        self.stdout.write(f"{model._meta.verbose_name_plural}: {len(created)}")
+        return created
+
+    def create_named(self, model, label, count, extra):
+        return self.bulk(
+            model,
+            (
+                model(name=f"{PREFIX} {label} {index:05d}", **extra(index))
+                for index in range(count)
+            ),
+        )
+
+    def create_departments(self, count):
+        return self.create_named(Department, "Departamento", count, lambda index: {})
+
+    def create_constructions(self, count):
+        constructions = self.create_named(
+            Construction,
+            "Obra",
+            count,
+            lambda index: {
+                "address": f"Rua {index}, {self.rng.randint(1, 999)}",
+                "start_date": self.start_date
+                + timedelta(days=self.rng.randint(0, 600)),
+                "is_active": self.rng.random() < 0.8,
+            },
+        )
+        return self.bulk(
+            ConstructionSector,
+            (
+                ConstructionSector(name=name, construction=construction)
+                for construction in constructions
+                for name in SECTOR_NAMES[: self.rng.randint(1, len(SECTOR_NAMES))]
+            ),
+        )
+
+    def create_employees(self, count, departments, sectors):
+        def build(index):
+            sector = self.rng.choice(sectors)
+            salary = cents(self.rng, 1_500, 12_000)
+            status = self.rng.choices(PAYMENT_STATUSES, PAYMENT_STATUS_WEIGHTS)[0]
+            paid = {"pending": Decimal("0.00"), "paid": salary}.get(
+                status, (salary / 2).quantize(Decimal("0.01"))
+            )
+            return Employee(
+                name=f"{PREFIX} Funcionário {index:06d}",
+                cpf=f"{PREFIX}{index:09d}",
+                department=self.rng.choice(departments),
+                position=self.rng.choice(["Pedreiro", "Servente", "Eletricista"]),
+                construction_id=sector.construction_id,
+                construction_sector=sector,
+                salary=salary,
+                payment_day=self.rng.randint(1, 28),
+                salary_payment_status=status,
+                salary_amount_paid=paid,
+                meal_allowance=cents(self.rng, 200, 800),
+                transport_allowance=cents(self.rng, 100, 400),
+            )
+
+        self.bulk(Employee, (build(index) for index in range(count)), keep=False)
+
+    def create_expenses(self, count, materials, categories):
+        def build(index):
+            expense_type = self.rng.choice(["material", "service", "utility", "other"])
+            return Expense(
+                description=f"{PREFIX} Despesa {index:07d}",
+                expense_type=expense_type,
+                material=(
+                    self.rng.choice(materials)
+                    if expense_type == "material" and materials
+                    else None
+                ),
+                category=self.rng.choice(categories) if categories else None,
+                quantity=self.rng.randint(1, 50),
+                amount=cents(self.rng, 10, 20_000),
+                expense_date=self.start_date + timedelta(days=self.rng.randint(0, 729)),
+            )
+
+        return self.bulk(Expense, (build(index) for index in range(count)), keep=False)
+
+    def create_transactions(self, count, categories, expense_ids):
+        def build(index):
+            transaction_type = self.rng.choice(["income", "expense"])
+            return Transaction(
+                description=f"{PREFIX} Transação {index:07d}",
+                transaction_type=transaction_type,
+                amount=cents(self.rng, 10, 50_000),
+                transaction_date=self.start_date
+                + timedelta(days=self.rng.randint(0, 729)),
+                payment_method=self.rng.choice(
+                    [choice for choice, _ in Transaction.PAYMENT_METHOD_CHOICES]
+                ),
+                category=self.rng.choice(categories) if categories else None,
+                expense_id=(
+                    self.rng.choice(expense_ids)
+                    if transaction_type == "expense" and expense_ids
+                    else None
+                ),
+            )
+
+        # Sem guardar ids: milhões de transações não precisam ficar na memória
+        total = 0
+        for batch in batches((build(index) for index in range(count)), self.batch_size):
+            total += len(Transaction.objects.bulk_create(batch))
+        self.stdout.write(f"{Transaction._meta.verbose_name_plural}: {total}")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-17 00:09
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0002_construction_remove_employee_last_payment_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_global', models.BooleanField(default=False, verbose_name='Total Geral')),
+                ('employee_count', models.IntegerField(default=0)),
+                ('salary_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('salary_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('meal_allowance_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('meal_allowance_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('transport_allowance_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('transport_allowance_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('pending_salary_count', models.IntegerField(default=0)),
+                ('paid_salary_count', models.IntegerField(default=0)),
+                ('partial_salary_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('construction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_snapshot', to='employees.construction', verbose_name='Obra')),
+            ],
+            options={
+                'verbose_name': 'Snapshot do Dashboard',
+                'verbose_name_plural': 'Snapshots do Dashboard',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_global', True)), fields=('is_global',), name='unique_global_dashboard_snapshot')],
+            },
+        ),
+    ]
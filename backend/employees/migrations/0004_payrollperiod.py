@@ -0,0 +1,183 @@
+# Generated by Django 5.2 on 2026-10-17 00:18
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0003_dashboardsnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayrollPeriod",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField(verbose_name="Ano")),
+                ("month", models.PositiveSmallIntegerField(verbose_name="Mês")),
+                (
+                    "closed_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Fechada em"),
+                ),
+                ("employee_count", models.IntegerField(default=0)),
+                (
+                    "salary_total",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "salary_paid",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "meal_allowance_total",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "meal_allowance_paid",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "transport_allowance_total",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "transport_allowance_paid",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Folha Fechada",
+                "verbose_name_plural": "Folhas Fechadas",
+                "ordering": ["-year", "-month"],
+                "unique_together": {("year", "month")},
+            },
+        ),
+        migrations.CreateModel(
+            name="PayrollPeriodEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "employee_name",
+                    models.CharField(max_length=100, verbose_name="Nome"),
+                ),
+                ("salary", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "salary_payment_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("paid", "Pago"),
+                            ("partial", "Parcial"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "salary_amount_paid",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                ("meal_allowance", models.DecimalField(decimal_places=2, max_digits=8)),
+                (
+                    "meal_allowance_payment_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("paid", "Pago"),
+                            ("partial", "Parcial"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "meal_allowance_amount_paid",
+                    models.DecimalField(decimal_places=2, max_digits=8),
+                ),
+                (
+                    "transport_allowance",
+                    models.DecimalField(decimal_places=2, max_digits=8),
+                ),
+                (
+                    "transport_allowance_payment_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("paid", "Pago"),
+                            ("partial", "Parcial"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "transport_allowance_amount_paid",
+                    models.DecimalField(decimal_places=2, max_digits=8),
+                ),
+                (
+                    "construction",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="payroll_entries",
+                        to="employees.construction",
+                        verbose_name="Obra",
+                    ),
+                ),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="payroll_entries",
+                        to="employees.employee",
+                        verbose_name="Funcionário",
+                    ),
+                ),
+                (
+                    "period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="entries",
+                        to="employees.payrollperiod",
+                        verbose_name="Folha",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Lançamento da Folha",
+                "verbose_name_plural": "Lançamentos da Folha",
+                "ordering": ["period", "employee_name"],
+            },
+        ),
+    ]
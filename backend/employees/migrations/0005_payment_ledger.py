@@ -0,0 +1,212 @@
+# Generated by Django 5.2 on 2026-10-17 00:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from datetime import date
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+PAID_FIELDS = {
+    "salary": "salary_amount_paid",
+    "meal_allowance": "meal_allowance_amount_paid",
+    "transport_allowance": "transport_allowance_amount_paid",
+}
+
+
+def open_ledger(apps, schema_editor):
+    """Lança os valores já pagos como saldo inicial do período aberto"""
+    Employee = apps.get_model("employees", "Employee")
+    PayrollPeriod = apps.get_model("employees", "PayrollPeriod")
+    PaymentEntry = apps.get_model("employees", "PaymentEntry")
+    PaymentPeriodTotal = apps.get_model("employees", "PaymentPeriodTotal")
+
+    last = (
+        PayrollPeriod.objects.order_by("-year", "-month")
+        .values_list("year", "month")
+        .first()
+    )
+    if last is None:
+        today = timezone.localdate()
+        period = date(today.year, today.month, 1)
+    else:
+        period = date(last[0] + last[1] // 12, last[1] % 12 + 1, 1)
+
+    entries, totals = [], []
+    rows = Employee.objects.values_list("pk", *PAID_FIELDS.values())
+    for pk, *amounts in rows.iterator():
+        for payment_type, amount in zip(PAID_FIELDS, amounts):
+            if not amount:
+                continue
+            entries.append(
+                PaymentEntry(
+                    employee_id=pk,
+                    payment_type=payment_type,
+                    period=period,
+                    kind="opening",
+                    amount=amount,
+                )
+            )
+            totals.append(
+                PaymentPeriodTotal(
+                    employee_id=pk,
+                    payment_type=payment_type,
+                    period=period,
+                    amount_paid=amount,
+                    entry_count=1,
+                )
+            )
+    PaymentEntry.objects.bulk_create(entries, batch_size=1000)
+    PaymentPeriodTotal.objects.bulk_create(totals, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0004_payrollperiod"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "payment_type",
+                    models.CharField(
+                        choices=[
+                            ("salary", "Salário"),
+                            ("meal_allowance", "Vale Refeição"),
+                            ("transport_allowance", "Vale Transporte"),
+                        ],
+                        max_length=20,
+                        verbose_name="Tipo de Pagamento",
+                    ),
+                ),
+                ("period", models.DateField(verbose_name="Período")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("payment", "Pagamento"),
+                            ("reversal", "Estorno"),
+                            ("opening", "Saldo Inicial"),
+                        ],
+                        default="payment",
+                        max_length=10,
+                        verbose_name="Tipo",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Valor"
+                    ),
+                ),
+                (
+                    "paid_on",
+                    models.DateField(
+                        default=django.utils.timezone.localdate, verbose_name="Data"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="payment_entries",
+                        to="employees.employee",
+                        verbose_name="Funcionário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Lançamento de Pagamento",
+                "verbose_name_plural": "Lançamentos de Pagamento",
+                "ordering": ["-created_at", "-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["employee", "payment_type", "period"],
+                        name="payment_entry_employee_idx",
+                    ),
+                    models.Index(
+                        fields=["period", "payment_type"],
+                        name="payment_entry_period_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PaymentPeriodTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "payment_type",
+                    models.CharField(
+                        choices=[
+                            ("salary", "Salário"),
+                            ("meal_allowance", "Vale Refeição"),
+                            ("transport_allowance", "Vale Transporte"),
+                        ],
+                        max_length=20,
+                        verbose_name="Tipo de Pagamento",
+                    ),
+                ),
+                ("period", models.DateField(verbose_name="Período")),
+                (
+                    "amount_paid",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=10
+                    ),
+                ),
+                ("entry_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="payment_totals",
+                        to="employees.employee",
+                        verbose_name="Funcionário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Total Pago no Período",
+                "verbose_name_plural": "Totais Pagos no Período",
+                "indexes": [
+                    models.Index(
+                        fields=["period", "payment_type"],
+                        name="payment_total_period_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("employee", "payment_type", "period"),
+                        name="unique_payment_period_total",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 00:25
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicates(apps, schema_editor):
+    """Renomeia nomes repetidos (exceto o mais antigo) antes da restrição"""
+    for model_name in ("Department", "Construction"):
+        model = apps.get_model("employees", model_name)
+        max_length = model._meta.get_field("name").max_length
+        repeated = (
+            model.objects.values("name")
+            .annotate(total=Count("pk"))
+            .filter(total__gt=1)
+            .values_list("name", flat=True)
+        )
+        for name in list(repeated):
+            for instance in model.objects.filter(name=name).order_by("pk")[1:]:
+                suffix = f" ({instance.pk})"
+                instance.name = name[: max_length - len(suffix)] + suffix
+                instance.save(update_fields=["name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0005_payment_ledger"),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="construction",
+            name="name",
+            field=models.CharField(
+                max_length=200, unique=True, verbose_name="Nome da Obra"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="department",
+            name="name",
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-17 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0006_unique_reference_names"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="construction",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["name"],
+                name="construction_active_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(fields=["name", "id"], name="employee_name_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["construction", "salary_payment_status"],
+                name="employee_constr_salary_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["salary_payment_status"], name="employee_salary_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["meal_allowance_payment_status"],
+                name="employee_meal_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["transport_allowance_payment_status"],
+                name="employee_transport_status_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0007_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(fields=["updated_at"], name="employee_updated_at_idx"),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-17 01:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_assignments(apps, schema_editor):
+    """Lançamentos existentes recebem a obra e o setor atuais do funcionário"""
+    Employee = apps.get_model("employees", "Employee")
+    PaymentEntry = apps.get_model("employees", "PaymentEntry")
+    employee = Employee.objects.filter(
+        pk=OuterRef("employee_id"), construction__isnull=False
+    )
+    PaymentEntry.objects.update(
+        construction_id=Subquery(employee.values("construction_id")[:1]),
+        construction_sector_id=Subquery(employee.values("construction_sector_id")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0008_projection_version_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymententry",
+            name="construction",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="payment_entries",
+                to="employees.construction",
+                verbose_name="Obra",
+            ),
+        ),
+        migrations.AddField(
+            model_name="paymententry",
+            name="construction_sector",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="payment_entries",
+                to="employees.constructionsector",
+                verbose_name="Setor da Obra",
+            ),
+        ),
+        migrations.RunPython(copy_assignments, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from decimal import Decimal
 
@@ -6,7 +6,7 @@ from decimal import Decimal
 class Construction(models.Model):
     """Modelo para representar as obras"""
 
-    name = models.CharField(max_length=200, verbose_name="Nome da Obra")
+    name = models.CharField(max_length=200, unique=True, verbose_name="Nome da Obra")
     address = models.TextField(verbose_name="Endereço")
     start_date = models.DateField(verbose_name="Data de Início")
     end_date = models.DateField(null=True, blank=True, verbose_name="Data de Término")
@@ -21,6 +21,14 @@ class Construction(models.Model):
         ordering = ["-is_active", "name"]
         verbose_name = "Obra"
         verbose_name_plural = "Obras"
+        indexes = [
+            # O dashboard lista apenas as obras ativas, ordenadas pelo nome
+            models.Index(
+                fields=["name"],
+                condition=models.Q(is_active=True),
+                name="construction_active_name_idx",
+            ),
+        ]
 
 
 class ConstructionSector(models.Model):
@@ -48,7 +56,7 @@ class ConstructionSector(models.Model):
 
 
 class Department(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
 
     def __str__(self):
@@ -62,6 +70,34 @@ class Employee(models.Model):
         ("partial", "Parcial"),
     ]
 
+    PAYMENT_TYPE_CHOICES = [
+        ("salary", "Salário"),
+        ("meal_allowance", "Vale Refeição"),
+        ("transport_allowance", "Vale Transporte"),
+    ]
+
+    # Campos (valor devido, status, valor pago, data) de cada tipo de pagamento
+    PAYMENT_TYPE_FIELDS = {
+        "salary": (
+            "salary",
+            "salary_payment_status",
+            "salary_amount_paid",
+            "last_salary_payment_date",
+        ),
+        "meal_allowance": (
+            "meal_allowance",
+            "meal_allowance_payment_status",
+            "meal_allowance_amount_paid",
+            "last_meal_allowance_payment_date",
+        ),
+        "transport_allowance": (
+            "transport_allowance",
+            "transport_allowance_payment_status",
+            "transport_allowance_amount_paid",
+            "last_transport_allowance_payment_date",
+        ),
+    }
+
     # Informações básicas
     name = models.CharField(max_length=100, verbose_name="Nome")
     cpf = models.CharField(
@@ -172,36 +208,67 @@ class Employee(models.Model):
             return f"{self.name} - {self.construction.name}"
         return self.name
 
+    def register_payment(self, payment_type, amount=None):
+        """
+        Lança um pagamento no livro de pagamentos do período aberto.
+
+        Pagamentos parciais se acumulam: o valor pago passa a ser o total
+        lançado no período e o status fica "partial" até cobrir o devido.
+        Sem valor, é lançado o saldo restante.
+        """
+        from .ledger import record_payment
+
+        record_payment(self, payment_type, amount)
+
     def mark_salary_as_paid(self, amount=None):
-        """Marca o salário como pago"""
-        self.salary_payment_status = "paid"
-        self.salary_amount_paid = amount or self.salary
-        self.last_salary_payment_date = timezone.now().date()
-        self.save()
+        """Registra um pagamento do salário"""
+        self.register_payment("salary", amount)
 
     def mark_meal_allowance_as_paid(self, amount=None):
-        """Marca o vale refeição como pago"""
-        self.meal_allowance_payment_status = "paid"
-        self.meal_allowance_amount_paid = amount or self.meal_allowance
-        self.last_meal_allowance_payment_date = timezone.now().date()
-        self.save()
+        """Registra um pagamento do vale refeição"""
+        self.register_payment("meal_allowance", amount)
 
     def mark_transport_allowance_as_paid(self, amount=None):
-        """Marca o vale transporte como pago"""
-        self.transport_allowance_payment_status = "paid"
-        self.transport_allowance_amount_paid = amount or self.transport_allowance
-        self.last_transport_allowance_payment_date = timezone.now().date()
-        self.save()
+        """Registra um pagamento do vale transporte"""
+        self.register_payment("transport_allowance", amount)
 
     def reset_all_payment_status(self):
-        """Reseta todos os status de pagamento"""
-        self.salary_payment_status = "pending"
-        self.meal_allowance_payment_status = "pending"
-        self.transport_allowance_payment_status = "pending"
-        self.salary_amount_paid = Decimal("0.00")
-        self.meal_allowance_amount_paid = Decimal("0.00")
-        self.transport_allowance_amount_paid = Decimal("0.00")
-        self.save()
+        """Reseta todos os status de pagamento, estornando o período aberto"""
+        from .ledger import reverse_open_period
+
+        with transaction.atomic():
+            reverse_open_period([self.pk])
+            self.salary_payment_status = "pending"
+            self.meal_allowance_payment_status = "pending"
+            self.transport_allowance_payment_status = "pending"
+            self.salary_amount_paid = Decimal("0.00")
+            self.meal_allowance_amount_paid = Decimal("0.00")
+            self.transport_allowance_amount_paid = Decimal("0.00")
+            self.save()
+
+    def dashboard_state(self):
+        """Contribuição do funcionário para os totais do dashboard"""
+        return {
+            "construction_id": self.construction_id,
+            "employee_count": 1,
+            "salary_total": self.salary,
+            "salary_paid": self.salary_amount_paid,
+            "meal_allowance_total": self.meal_allowance,
+            "meal_allowance_paid": self.meal_allowance_amount_paid,
+            "transport_allowance_total": self.transport_allowance,
+            "transport_allowance_paid": self.transport_allowance_amount_paid,
+            "pending_salary_count": int(self.salary_payment_status == "pending"),
+            "paid_salary_count": int(self.salary_payment_status == "paid"),
+            "partial_salary_count": int(self.salary_payment_status == "partial"),
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o estado carregado para calcular deltas do snapshot ao salvar
+        if not instance.get_deferred_fields():
+            instance._dashboard_state = instance.dashboard_state()
+        return instance
 
     @property
     def total_to_receive(self):
@@ -221,3 +288,292 @@ class Employee(models.Model):
         ordering = ["name"]
         verbose_name = "Funcionário"
         verbose_name_plural = "Funcionários"
+        indexes = [
+            # Listagem padrão e paginação por cursor: (name, id)
+            models.Index(fields=["name", "id"], name="employee_name_id_idx"),
+            # Filtros da API e totais por obra
+            models.Index(
+                fields=["construction", "salary_payment_status"],
+                name="employee_constr_salary_idx",
+            ),
+            models.Index(
+                fields=["salary_payment_status"], name="employee_salary_status_idx"
+            ),
+            models.Index(
+                fields=["meal_allowance_payment_status"],
+                name="employee_meal_status_idx",
+            ),
+            models.Index(
+                fields=["transport_allowance_payment_status"],
+                name="employee_transport_status_idx",
+            ),
+            # Versão dos dados da projeção de caixa (maior updated_at)
+            models.Index(fields=["updated_at"], name="employee_updated_at_idx"),
+        ]
+
+
+class DashboardSnapshot(models.Model):
+    """Totais do dashboard mantidos incrementalmente (linha global e por obra)"""
+
+    construction = models.OneToOneField(
+        Construction,
+        on_delete=models.CASCADE,
+        related_name="dashboard_snapshot",
+        null=True,
+        blank=True,
+        verbose_name="Obra",
+    )
+    is_global = models.BooleanField(default=False, verbose_name="Total Geral")
+    employee_count = models.IntegerField(default=0)
+    salary_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    salary_paid = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    meal_allowance_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    meal_allowance_paid = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    transport_allowance_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    transport_allowance_paid = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    pending_salary_count = models.IntegerField(default=0)
+    paid_salary_count = models.IntegerField(default=0)
+    partial_salary_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    METRIC_FIELDS = (
+        "employee_count",
+        "salary_total",
+        "salary_paid",
+        "meal_allowance_total",
+        "meal_allowance_paid",
+        "transport_allowance_total",
+        "transport_allowance_paid",
+        "pending_salary_count",
+        "paid_salary_count",
+        "partial_salary_count",
+    )
+
+    def __str__(self):
+        if self.is_global:
+            return "Snapshot geral"
+        return f"Snapshot - {self.construction_id}"
+
+    class Meta:
+        verbose_name = "Snapshot do Dashboard"
+        verbose_name_plural = "Snapshots do Dashboard"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["is_global"],
+                condition=models.Q(is_global=True),
+                name="unique_global_dashboard_snapshot",
+            ),
+        ]
+
+
+class PayrollPeriod(models.Model):
+    """Folha de pagamento fechada de um mês, com os totais congelados"""
+
+    year = models.PositiveSmallIntegerField(verbose_name="Ano")
+    month = models.PositiveSmallIntegerField(verbose_name="Mês")
+    closed_at = models.DateTimeField(auto_now_add=True, verbose_name="Fechada em")
+    employee_count = models.IntegerField(default=0)
+    salary_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    salary_paid = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    meal_allowance_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    meal_allowance_paid = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    transport_allowance_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+    transport_allowance_paid = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00")
+    )
+
+    def __str__(self):
+        return f"Folha {self.month:02d}/{self.year}"
+
+    class Meta:
+        ordering = ["-year", "-month"]
+        verbose_name = "Folha Fechada"
+        verbose_name_plural = "Folhas Fechadas"
+        unique_together = ["year", "month"]
+
+
+class PayrollPeriodEntry(models.Model):
+    """Situação de pagamento de um funcionário no fechamento da folha"""
+
+    period = models.ForeignKey(
+        PayrollPeriod,
+        on_delete=models.CASCADE,
+        related_name="entries",
+        verbose_name="Folha",
+    )
+    employee = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payroll_entries",
+        verbose_name="Funcionário",
+    )
+    employee_name = models.CharField(max_length=100, verbose_name="Nome")
+    construction = models.ForeignKey(
+        Construction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payroll_entries",
+        verbose_name="Obra",
+    )
+    salary = models.DecimalField(max_digits=10, decimal_places=2)
+    salary_payment_status = models.CharField(
+        max_length=10, choices=Employee.PAYMENT_STATUS_CHOICES
+    )
+    salary_amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
+    meal_allowance = models.DecimalField(max_digits=8, decimal_places=2)
+    meal_allowance_payment_status = models.CharField(
+        max_length=10, choices=Employee.PAYMENT_STATUS_CHOICES
+    )
+    meal_allowance_amount_paid = models.DecimalField(max_digits=8, decimal_places=2)
+    transport_allowance = models.DecimalField(max_digits=8, decimal_places=2)
+    transport_allowance_payment_status = models.CharField(
+        max_length=10, choices=Employee.PAYMENT_STATUS_CHOICES
+    )
+    transport_allowance_amount_paid = models.DecimalField(
+        max_digits=8, decimal_places=2
+    )
+
+    def __str__(self):
+        return f"{self.employee_name} - {self.period}"
+
+    class Meta:
+        ordering = ["period", "employee_name"]
+        verbose_name = "Lançamento da Folha"
+        verbose_name_plural = "Lançamentos da Folha"
+
+
+class PaymentEntry(models.Model):
+    """
+    Lançamento do livro de pagamentos (somente inclusão).
+
+    Cada pagamento, parcial ou integral, gera um lançamento; resets geram
+    estornos com valor negativo, preservando o histórico.
+    """
+
+    KIND_CHOICES = [
+        ("payment", "Pagamento"),
+        ("reversal", "Estorno"),
+        ("opening", "Saldo Inicial"),
+    ]
+
+    employee = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payment_entries",
+        verbose_name="Funcionário",
+    )
+    payment_type = models.CharField(
+        max_length=20,
+        choices=Employee.PAYMENT_TYPE_CHOICES,
+        verbose_name="Tipo de Pagamento",
+    )
+    period = models.DateField(verbose_name="Período")
+    kind = models.CharField(
+        max_length=10, choices=KIND_CHOICES, default="payment", verbose_name="Tipo"
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
+    paid_on = models.DateField(default=timezone.localdate, verbose_name="Data")
+    # Obra e setor do funcionário no lançamento, para o custo por obra
+    construction = models.ForeignKey(
+        Construction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payment_entries",
+        verbose_name="Obra",
+    )
+    construction_sector = models.ForeignKey(
+        ConstructionSector,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payment_entries",
+        verbose_name="Setor da Obra",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return (
+            f"{self.get_payment_type_display()} - {self.amount} ({self.period:%m/%Y})"
+        )
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        verbose_name = "Lançamento de Pagamento"
+        verbose_name_plural = "Lançamentos de Pagamento"
+        indexes = [
+            models.Index(
+                fields=["employee", "payment_type", "period"],
+                name="payment_entry_employee_idx",
+            ),
+            models.Index(
+                fields=["period", "payment_type"], name="payment_entry_period_idx"
+            ),
+        ]
+
+
+class PaymentPeriodTotal(models.Model):
+    """Total pago acumulado por funcionário, tipo e período (cache do livro)"""
+
+    employee = models.ForeignKey(
+        Employee,
+        on_delete=models.CASCADE,
+        related_name="payment_totals",
+        verbose_name="Funcionário",
+    )
+    payment_type = models.CharField(
+        max_length=20,
+        choices=Employee.PAYMENT_TYPE_CHOICES,
+        verbose_name="Tipo de Pagamento",
+    )
+    period = models.DateField(verbose_name="Período")
+    amount_paid = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0.00")
+    )
+    entry_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.payment_type} ({self.period:%m/%Y})"
+
+    class Meta:
+        verbose_name = "Total Pago no Período"
+        verbose_name_plural = "Totais Pagos no Período"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["employee", "payment_type", "period"],
+                name="unique_payment_period_total",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["period", "payment_type"], name="payment_total_period_idx"
+            ),
+        ]
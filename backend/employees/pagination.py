@@ -0,0 +1,175 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class EmployeePageNumberPagination(PageNumberPagination):
+    """Paginação por página com tamanho negociável pelo cliente"""
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) com ordenação escolhida pelo cliente.
+
+    O cursor guarda o valor do campo de ordenação e o id do último item, e a
+    página seguinte é buscada com ``(campo, id) > (valor, id)``. Assim cada
+    página custa O(tamanho da página) em qualquer profundidade, sem OFFSET,
+    e o resultado é estável mesmo com valores repetidos no campo ordenado.
+    """
+
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    page_size_query_param = "page_size"
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    ordering_fields = ()
+    default_ordering = "id"
+    invalid_cursor_message = "Cursor inválido."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request)
+        cursor = self.decode_cursor(request)
+
+        backwards = cursor is not None and cursor["reverse"]
+        # A busca para trás percorre a ordem invertida e depois desinverte
+        descending = self.descending != backwards
+        prefix = "-" if descending else ""
+        queryset = queryset.order_by(f"{prefix}{self.field}", f"{prefix}pk")
+
+        position = None
+        if cursor is not None:
+            value = self.to_python(queryset.model, cursor["value"])
+            position = (value, cursor["pk"])
+            lookup = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": value})
+                | Q(**{self.field: value, f"pk__{lookup}": cursor["pk"]})
+            )
+
+        queryset = self.annotate_page(queryset, position, descending)
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if backwards:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def annotate_page(self, queryset, position, descending):
+        """
+        Ponto de extensão para anotar a página já filtrada pelo cursor;
+        ``position`` é ``(valor, id)`` do cursor (None na primeira página) e
+        ``descending`` o sentido em que a página é percorrida.
+        """
+        return queryset
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if requested <= 0:
+            return self.page_size
+        return min(requested, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(
+            self.ordering_query_param, self.default_ordering
+        )
+        field = ordering.lstrip("-")
+        if field not in self.ordering_fields:
+            field, ordering = self.default_ordering.lstrip("-"), self.default_ordering
+        return field, ordering.startswith("-")
+
+    def to_python(self, model, value):
+        try:
+            return model._meta.get_field(self.field).to_python(value)
+        except DjangoValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode("ascii")).decode("utf-8"))
+            return {
+                "value": data["v"],
+                "pk": int(data["pk"]),
+                "reverse": bool(data.get("r", False)),
+            }
+        except (TypeError, ValueError, KeyError, BinasciiError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        value = getattr(instance, self.field)
+        data = {"v": str(value) if value is not None else None, "pk": instance.pk}
+        if reverse:
+            data["r"] = True
+        encoded = b64encode(json.dumps(data).encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class EmployeeCursorPagination(KeysetPagination):
+    ordering_fields = (
+        "name",
+        "salary",
+        "salary_payment_status",
+        "meal_allowance_payment_status",
+        "transport_allowance_payment_status",
+        "updated_at",
+        "id",
+    )
+    default_ordering = "name"
@@ -0,0 +1,127 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+from .models import Employee
+from .serializers import EmployeeBatchPaymentSerializer, EmployeePaymentSerializer
+from . import ledger, snapshot
+
+
+def register_payments(items):
+    """
+    Valida e aplica uma lista de pagamentos em uma única transação.
+
+    Os funcionários são carregados em uma consulta e cada item é validado
+    com as regras de EmployeePaymentSerializer, considerando os itens
+    anteriores do mesmo lote. Os pagamentos válidos viram lançamentos no
+    livro e o espelho em Employee é gravado com um UPDATE por tipo. Itens
+    sem valor cujo saldo já foi pago são ignorados (``skipped``). Retorna o
+    resultado de cada item e os ids dos funcionários alterados.
+    """
+    results = [None] * len(items)
+    parsed = []
+
+    for index, item in enumerate(items):
+        serializer = EmployeeBatchPaymentSerializer(data=item)
+        if serializer.is_valid():
+            parsed.append((index, serializer.validated_data))
+        else:
+            results[index] = {
+                "index": index,
+                "status": "error",
+                "errors": serializer.errors,
+            }
+
+    employees = Employee.objects.in_bulk({data["employee_id"] for _, data in parsed})
+    before_states = {
+        pk: employee.dashboard_state() for pk, employee in employees.items()
+    }
+    entries = []
+    today = timezone.localdate()
+
+    for index, data in parsed:
+        employee_id = data["employee_id"]
+        employee = employees.get(employee_id)
+        result = {"index": index, "employee_id": employee_id}
+        if employee is None:
+            result.update(
+                status="error", errors={"employee_id": ["Funcionário não encontrado."]}
+            )
+        else:
+            serializer = EmployeePaymentSerializer(
+                data={
+                    key: item
+                    for key, item in items[index].items()
+                    if key != "employee_id"
+                },
+                context={"employee": employee},
+            )
+            if serializer.is_valid():
+                payment_type = data["payment_type"]
+                amount = data.get("amount") or ledger.remaining(employee, payment_type)
+                if not amount:
+                    result.update(
+                        status="skipped",
+                        payment_type=payment_type,
+                        reason="Nada a pagar: o saldo do período já foi pago.",
+                    )
+                    results[index] = result
+                    continue
+                entries.append((employee_id, payment_type, amount))
+                # Os próximos itens do lote validam contra o saldo já reduzido
+                paid_field = Employee.PAYMENT_TYPE_FIELDS[payment_type][2]
+                ledger.apply_total(
+                    employee,
+                    payment_type,
+                    getattr(employee, paid_field) + amount,
+                    today,
+                )
+                result.update(status="ok", payment_type=payment_type, amount=amount)
+            else:
+                result.update(status="error", errors=serializer.errors)
+        results[index] = result
+
+    changed = defaultdict(list)
+    for employee_id, payment_type, _ in entries:
+        if employee_id not in changed[payment_type]:
+            changed[payment_type].append(employee_id)
+
+    with transaction.atomic():
+        totals = ledger.record_entries(entries, ledger.open_period(), paid_on=today)
+
+        # O total do livro prevalece sobre o valor calculado em memória
+        for (employee_id, payment_type), total in totals.items():
+            ledger.apply_total(employees[employee_id], payment_type, total, today)
+
+        now = timezone.now()
+        for payment_type, employee_ids in changed.items():
+            _, status_field, paid_field, date_field = Employee.PAYMENT_TYPE_FIELDS[
+                payment_type
+            ]
+            Employee.objects.filter(pk__in=employee_ids).update(
+                **{
+                    status_field: _case(employees, employee_ids, status_field),
+                    paid_field: _case(employees, employee_ids, paid_field),
+                    date_field: today,
+                    "updated_at": now,
+                }
+            )
+
+        changed_ids = sorted({employee_id for employee_id, _, _ in entries})
+        # UPDATEs em lote não disparam sinais; o snapshot recebe os deltas aqui
+        snapshot.apply_transitions(
+            (before_states[pk], employees[pk].dashboard_state()) for pk in changed_ids
+        )
+
+    return results, changed_ids
+
+
+def _case(employees, employee_ids, field):
+    """CASE com o valor de cada funcionário, para gravar todos em um UPDATE"""
+    return Case(
+        *[
+            When(pk=employee_id, then=Value(getattr(employees[employee_id], field)))
+            for employee_id in employee_ids
+        ],
+        output_field=Employee._meta.get_field(field),
+    )
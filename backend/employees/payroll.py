@@ -0,0 +1,174 @@
+from datetime import date
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+from .models import (
+    DashboardSnapshot,
+    Employee,
+    PaymentEntry,
+    PayrollPeriod,
+    PayrollPeriodEntry,
+)
+from . import ledger, snapshot
+
+# Colunas copiadas de Employee para PayrollPeriodEntry no fechamento
+FROZEN_FIELDS = (
+    "salary",
+    "salary_payment_status",
+    "salary_amount_paid",
+    "meal_allowance",
+    "meal_allowance_payment_status",
+    "meal_allowance_amount_paid",
+    "transport_allowance",
+    "transport_allowance_payment_status",
+    "transport_allowance_amount_paid",
+)
+
+# Colunas de Employee somadas nos totais de PayrollPeriod
+PERIOD_TOTALS = {
+    "salary": "salary_total",
+    "salary_amount_paid": "salary_paid",
+    "meal_allowance": "meal_allowance_total",
+    "meal_allowance_amount_paid": "meal_allowance_paid",
+    "transport_allowance": "transport_allowance_total",
+    "transport_allowance_amount_paid": "transport_allowance_paid",
+}
+
+# Valores de um funcionário com todos os pagamentos em aberto
+RESET_VALUES = {
+    "salary_payment_status": "pending",
+    "meal_allowance_payment_status": "pending",
+    "transport_allowance_payment_status": "pending",
+    "salary_amount_paid": Decimal("0.00"),
+    "meal_allowance_amount_paid": Decimal("0.00"),
+    "transport_allowance_amount_paid": Decimal("0.00"),
+}
+
+
+class PayrollPeriodClosed(Exception):
+    """A folha do mês informado já foi fechada"""
+
+
+class PayrollPeriodOutOfOrder(Exception):
+    """O mês informado não é o período em aberto"""
+
+
+def reset_payment_status(queryset):
+    """
+    Reseta os pagamentos dos funcionários do queryset com um único UPDATE.
+
+    Equivale a chamar reset_all_payment_status em cada funcionário, mas sem
+    um save() por linha; o livro recebe os estornos e o snapshot do
+    dashboard os deltas, ambos em lote.
+    """
+    employees = list(queryset.select_for_update())
+    ledger.reverse_open_period([employee.pk for employee in employees])
+    transitions = []
+    for employee in employees:
+        before = employee.dashboard_state()
+        for field, value in RESET_VALUES.items():
+            setattr(employee, field, value)
+        transitions.append((before, employee.dashboard_state()))
+
+    Employee.objects.filter(pk__in=[employee.pk for employee in employees]).update(
+        updated_at=timezone.now(), **RESET_VALUES
+    )
+    snapshot.apply_transitions(transitions)
+    return [employee.pk for employee in employees]
+
+
+def _reset_snapshot():
+    # Após o reset geral os totais devidos e as contagens de funcionários não
+    # mudam; só os valores pagos e os status precisam ser zerados
+    DashboardSnapshot.objects.update(
+        salary_paid=Decimal("0.00"),
+        meal_allowance_paid=Decimal("0.00"),
+        transport_allowance_paid=Decimal("0.00"),
+        pending_salary_count=F("employee_count"),
+        paid_salary_count=0,
+        partial_salary_count=0,
+    )
+
+
+def closable_periods():
+    """
+    Meses que podem ser fechados: o período em aberto e, antes do primeiro
+    fechamento, também o mês do lançamento em aberto mais antigo (os
+    lançamentos seguem o mês corrente até lá)
+    """
+    periods = {ledger.open_period()}
+    if not PayrollPeriod.objects.exists():
+        earliest = PaymentEntry.objects.aggregate(first=Min("period"))["first"]
+        if earliest is not None:
+            periods.add(earliest)
+    return sorted(periods)
+
+
+@transaction.atomic
+def close_payroll_period(year, month, batch_size=5000):
+    """
+    Fecha a folha do mês: congela a situação de cada funcionário e os totais
+    em PayrollPeriod/PayrollPeriodEntry e reseta os pagamentos de todos os
+    funcionários com um único UPDATE.
+
+    Só o período em aberto pode ser fechado: a situação dos funcionários e
+    os lançamentos do livro pertencem a ele (ver ``closable_periods``).
+    """
+    allowed = closable_periods()
+    try:
+        with transaction.atomic():
+            period = PayrollPeriod.objects.create(year=year, month=month)
+    except IntegrityError:
+        raise PayrollPeriodClosed(f"A folha de {month:02d}/{year} já foi fechada.")
+    if date(year, month, 1) not in allowed:
+        periods = " ou ".join(f"{day.month:02d}/{day.year}" for day in allowed)
+        raise PayrollPeriodOutOfOrder(
+            f"A folha de {month:02d}/{year} não pode ser fechada: o período em "
+            f"aberto é {periods}."
+        )
+
+    # Bloqueia as linhas para que nenhum pagamento entre a cópia e o reset
+    rows = (
+        Employee.objects.select_for_update()
+        .order_by("pk")
+        .values_list("pk", "name", "construction_id", *FROZEN_FIELDS)
+        .iterator(chunk_size=batch_size)
+    )
+
+    # Os totais do mês são somados na mesma passada que copia as linhas
+    totals = {field: Decimal("0.00") for field in PERIOD_TOTALS.values()}
+    employee_count = 0
+    batch = []
+    for pk, name, construction_id, *values in rows:
+        frozen = dict(zip(FROZEN_FIELDS, values))
+        employee_count += 1
+        for source, target in PERIOD_TOTALS.items():
+            totals[target] += frozen[source]
+
+        batch.append(
+            PayrollPeriodEntry(
+                period=period,
+                employee_id=pk,
+                employee_name=name,
+                construction_id=construction_id,
+                **frozen,
+            )
+        )
+        if len(batch) >= batch_size:
+            PayrollPeriodEntry.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        PayrollPeriodEntry.objects.bulk_create(batch)
+
+    period.employee_count = employee_count
+    for field, value in totals.items():
+        setattr(period, field, value)
+    period.save()
+
+    Employee.objects.update(updated_at=timezone.now(), **RESET_VALUES)
+    _reset_snapshot()
+    # O período aberto passa a ser o mês seguinte à folha fechada; se ele já
+    # tiver lançamentos, são estornados para acompanhar o reset acima
+    ledger.reverse_open_period()
+    return period
@@ -0,0 +1,296 @@
+"""
+Projeção de caixa da folha: quanto cada obra precisa em cada dia à frente.
+
+As colunas de pagamento dos funcionários (obra, dia do pagamento, valores
+devidos e já pagos) são carregadas uma vez em arrays NumPy, em centavos, e
+a projeção de todos os funcionários é feita em uma passagem vetorizada por
+mês: cada (funcionário, mês) vira um vencimento e ``np.bincount`` soma os
+valores na grade (dia, obra). O mês em aberto usa o saldo ainda não pago;
+os meses seguintes, os valores cheios. Vencimentos já passados e não pagos
+entram no primeiro dia da projeção.
+
+Despesas recorrentes (transações com a mesma descrição e obra em todos os
+últimos meses completos) entram como saídas da obra, no dia da última
+ocorrência.
+
+Arrays e resultados ficam em cache pela versão dos dados (``data_version``),
+lida com poucas consultas por índice e alterada por qualquer gravação de
+funcionários ou transações, inclusive as atualizações em lote.
+"""
+
+import calendar
+from datetime import date, timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from gestao_api.cache import VersionedLRUCache
+from financials.models import Transaction, TransactionMonthlyRollup
+from .models import Construction, Employee
+from . import ledger, snapshot
+
+DEFAULT_DAYS = 90
+MAX_DAYS = 366
+
+# Meses completos observados para reconhecer uma despesa recorrente
+RECURRING_LOOKBACK_MONTHS = 3
+
+# Id usado para as saídas sem obra
+NO_CONSTRUCTION = -1
+
+# Colunas carregadas por versão (grandes) e resultados por período (pequenos)
+column_cache = VersionedLRUCache(max_entries=2, ttl=3600)
+projection_cache = VersionedLRUCache(
+    max_entries=getattr(settings, "PROJECTION_CACHE_MAX_ENTRIES", 64), ttl=3600
+)
+
+
+def data_version():
+    """
+    Impressão digital dos dados usados na projeção. Alterações mudam o maior
+    ``updated_at`` (também mantido nas atualizações em lote) e exclusões
+    mudam as contagens mantidas no snapshot e nos totais mensais.
+    """
+    return (
+        Employee.objects.aggregate(changed=Max("updated_at"))["changed"],
+        snapshot.get_global_snapshot().employee_count,
+        Transaction.objects.aggregate(changed=Max("updated_at"))["changed"],
+        TransactionMonthlyRollup.objects.aggregate(count=Sum("entry_count"))["count"],
+    )
+
+
+def _cents(values):
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class PayrollColumns:
+    """Colunas dos funcionários em arrays alinhados, valores em centavos"""
+
+    def __init__(self, rows):
+        fields = list(zip(*rows)) or [()] * (2 + 3 * len(Employee.PAYMENT_TYPE_FIELDS))
+        raw_constructions = np.array(
+            [NO_CONSTRUCTION if pk is None else pk for pk in fields[0]], dtype=np.int64
+        )
+        # Ids ordenados das obras; a sem obra sempre existe
+        self.construction_ids = np.unique(np.append(raw_constructions, NO_CONSTRUCTION))
+        self.construction = np.searchsorted(self.construction_ids, raw_constructions)
+        self.payment_day = np.asarray(fields[1], dtype=np.int64)
+
+        self.due_full = np.zeros(len(raw_constructions), dtype=np.int64)
+        self.due_open = np.zeros(len(raw_constructions), dtype=np.int64)
+        for offset in range(2, len(fields), 3):
+            amount = _cents(fields[offset])
+            paid = _cents(fields[offset + 1])
+            settled = np.asarray(fields[offset + 2], dtype=object) == "paid"
+            self.due_full += amount
+            self.due_open += np.where(settled, 0, np.maximum(amount - paid, 0))
+
+    @classmethod
+    def load(cls):
+        fields = ["construction_id", "payment_day"]
+        for amount, status, paid, _ in Employee.PAYMENT_TYPE_FIELDS.values():
+            fields += [amount, paid, status]
+        return cls(Employee.objects.values_list(*fields))
+
+    def __len__(self):
+        return len(self.payment_day)
+
+
+def recurring_expenses(current_month):
+    """
+    Despesas com a mesma descrição e obra em cada um dos últimos meses
+    completos: ``(descrição, obra, valor médio, dia da última ocorrência, já
+    ocorreu no mês)``.
+    """
+    start = _add_months(current_month, -RECURRING_LOOKBACK_MONTHS)
+    complete = Q(transaction_date__lt=current_month)
+    rows = (
+        Transaction.objects.filter(
+            transaction_type="expense", transaction_date__gte=start
+        )
+        .values("description", "construction")
+        .annotate(
+            months=Count(
+                TruncMonth("transaction_date"), distinct=True, filter=complete
+            ),
+            amount=Avg("amount", filter=complete),
+            last_complete=Max("transaction_date", filter=complete),
+            last=Max("transaction_date"),
+        )
+        .filter(months=RECURRING_LOOKBACK_MONTHS)
+        .order_by("description", "construction")
+    )
+    return [
+        (
+            row["description"],
+            row["construction"],
+            row["amount"],
+            row["last_complete"].day,
+            row["last"] >= current_month,
+        )
+        for row in rows
+    ]
+
+
+def _due_offsets(month, payment_day, start):
+    """Dias entre ``start`` e o vencimento de cada dia de pagamento no mês"""
+    month_days = calendar.monthrange(month.year, month.month)[1]
+    first = (month - start).days
+    return first + np.clip(payment_day, 1, month_days) - 1
+
+
+def _construction_ids(recurring):
+    return np.array(
+        [NO_CONSTRUCTION if pk is None else pk for _, pk, _, _, _ in recurring],
+        dtype=np.int64,
+    )
+
+
+def project(columns, recurring, start, days, open_month):
+    """
+    Grade de saídas em centavos e os ids das obras: ``grid[dia, obra]`` com
+    as obras na ordem dos ids (as dos funcionários e as das recorrentes).
+    """
+    construction_ids = np.union1d(
+        columns.construction_ids, _construction_ids(recurring)
+    )
+    employee_buckets = np.searchsorted(
+        construction_ids, columns.construction_ids[columns.construction]
+    )
+    count = len(construction_ids)
+    grid = np.zeros(days * count, dtype=np.float64)
+    last_month = (start + timedelta(days=days - 1)).replace(day=1)
+
+    def add(offsets, amounts, buckets):
+        # Atrasados vencem no primeiro dia; fora do horizonte são descartados
+        offsets = np.maximum(offsets, 0)
+        mask = (offsets < days) & (amounts > 0)
+        grid[:] += np.bincount(
+            offsets[mask] * count + buckets[mask],
+            weights=amounts[mask],
+            minlength=days * count,
+        )
+
+    # Meses anteriores ao período em aberto já foram fechados na folha
+    month = open_month
+    while month <= last_month:
+        amounts = columns.due_open if month == open_month else columns.due_full
+        add(
+            _due_offsets(month, columns.payment_day, start),
+            amounts,
+            employee_buckets,
+        )
+        month = _add_months(month, 1)
+
+    if recurring:
+        amounts = _cents([amount for _, _, amount, _, _ in recurring])
+        recurring_days = np.array(
+            [day for _, _, _, day, _ in recurring], dtype=np.int64
+        )
+        occurred = np.array([done for _, _, _, _, done in recurring], dtype=bool)
+        bucket = np.searchsorted(construction_ids, _construction_ids(recurring))
+        month = start.replace(day=1)
+        while month <= last_month:
+            current = month == start.replace(day=1)
+            add(
+                _due_offsets(month, recurring_days, start),
+                np.where(occurred, 0, amounts) if current else amounts,
+                bucket,
+            )
+            month = _add_months(month, 1)
+
+    return np.rint(grid).astype(np.int64).reshape(days, count), construction_ids
+
+
+def money(cents):
+    """Centavos em texto decimal (``"1234.50"``), como os DecimalField do DRF"""
+    sign = "-" if cents < 0 else ""
+    cents = abs(int(cents))
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+def _result(columns, recurring, grid, construction_ids, start, days):
+    daily = grid.sum(axis=1)
+    cumulative = np.cumsum(daily)
+    totals = grid.sum(axis=0)
+    constructions = [
+        {
+            "construction": None if pk == NO_CONSTRUCTION else int(pk),
+            "total": money(totals[index]),
+            "daily": [money(value) for value in grid[:, index].tolist()],
+        }
+        for index, pk in enumerate(construction_ids.tolist())
+        if totals[index]
+    ]
+    return {
+        "start": start.isoformat(),
+        "days": days,
+        "employees": len(columns),
+        "total": money(daily.sum()),
+        "daily": [
+            {
+                "date": (start + timedelta(days=offset)).isoformat(),
+                "total": money(daily[offset]),
+                "cumulative": money(cumulative[offset]),
+            }
+            for offset in range(days)
+        ],
+        "constructions": constructions,
+        "recurring": [
+            {
+                "description": description,
+                "construction": construction,
+                "amount": money(cents),
+                "day": day,
+            }
+            for (description, construction, _, day, _), cents in zip(
+                recurring, _cents([row[2] for row in recurring]).tolist()
+            )
+        ],
+    }
+
+
+def get_projection(start=None, days=DEFAULT_DAYS):
+    """
+    Projeção dos ``days`` dias a partir de ``start`` (hoje, por padrão). Com
+    os dados inalterados, a leitura custa só as consultas de ``data_version``.
+    """
+    start = start or timezone.localdate()
+    version = data_version()
+    key = (version, start, days)
+    result = projection_cache.get("projection", key)
+    if result is not None:
+        return result
+
+    columns = column_cache.get("columns", version)
+    if columns is None:
+        columns = PayrollColumns.load()
+        column_cache.set("columns", version, columns)
+    recurring = recurring_expenses(start.replace(day=1))
+    grid, construction_ids = project(
+        columns, recurring, start, days, ledger.open_period()
+    )
+    result = _result(columns, recurring, grid, construction_ids, start, days)
+    projection_cache.set("projection", key, result)
+    return result
+
+
+def with_construction_names(result):
+    """Cópia do resultado com o nome de cada obra (uma consulta)"""
+    ids = [
+        row["construction"] for row in result["constructions"] if row["construction"]
+    ]
+    names = dict(Construction.objects.filter(pk__in=ids).values_list("pk", "name"))
+    return {
+        **result,
+        "constructions": [
+            {**row, "construction_name": names.get(row["construction"])}
+            for row in result["constructions"]
+        ],
+    }
@@ -0,0 +1,147 @@
+"""
+Resolução dos nomes livres de departamento, obra e setor em ids.
+
+Os ids ficam em um cache LRU local ao processo, com TTL e invalidado pelos
+sinais de alteração dos modelos, então em regime estável gravar um
+funcionário não faz consultas de referência. Nomes desconhecidos são
+resolvidos com um único INSERT ... ON CONFLICT apoiado nas restrições de
+unicidade, sem a corrida de get_or_create entre requisições concorrentes.
+
+O cache é por processo e os sinais só o invalidam no processo que alterou o
+registro: após uma exclusão ou renomeação em outro worker, um nome pode
+apontar para um id que não existe mais (ou já tem outro nome) até o TTL
+expirar. Id inexistente é detectado por ``save_with_references``, que confere
+as FKs logo após a gravação e, se falharem, descarta o cache e refaz a
+gravação com os nomes resolvidos pelo upsert. Um nome renomeado em outro
+processo continua apontando para o registro renomeado até o TTL.
+"""
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from gestao_api.cache import VersionedLRUCache
+from .models import Construction, ConstructionSector, Department, Employee
+
+reference_cache = VersionedLRUCache(
+    max_entries=getattr(settings, "REFERENCE_CACHE_MAX_ENTRIES", 4096),
+    ttl=getattr(settings, "REFERENCE_CACHE_TTL_SECONDS", 300),
+)
+
+
+def _resolve(model, keys, build, unique_fields):
+    """Retorna ``{chave: id}``, criando em uma única consulta as que faltam"""
+    namespace = model._meta.label
+    ids, missing = {}, []
+    for key in dict.fromkeys(keys):
+        pk = reference_cache.get(namespace, key)
+        if pk is None:
+            missing.append(key)
+        else:
+            ids[key] = pk
+    if not missing:
+        return ids
+
+    # O UPDATE sem efeito no conflito faz o RETURNING trazer o id existente
+    instances = model.objects.bulk_create(
+        [build(key) for key in missing],
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=["name"],
+    )
+    resolved = {key: instance.pk for key, instance in zip(missing, instances)}
+    ids.update(resolved)
+
+    # Ids criados em uma transação desfeita não podem ficar no cache
+    def remember():
+        for key, pk in resolved.items():
+            reference_cache.set(namespace, key, pk)
+
+    transaction.on_commit(remember)
+    return ids
+
+
+def department_ids(names):
+    return _resolve(
+        Department,
+        names,
+        lambda name: Department(
+            name=name, description=f"Departamento criado automaticamente: {name}"
+        ),
+        ["name"],
+    )
+
+
+def construction_ids(names):
+    today = timezone.localdate()
+    return _resolve(
+        Construction,
+        names,
+        lambda name: Construction(
+            name=name,
+            address="Endereço a ser definido",
+            start_date=today,
+            is_active=True,
+        ),
+        ["name"],
+    )
+
+
+def sector_ids(keys):
+    """``keys`` são pares (id da obra, nome do setor)"""
+    return _resolve(
+        ConstructionSector,
+        keys,
+        lambda key: ConstructionSector(
+            construction_id=key[0],
+            name=key[1],
+            description=f"Setor criado automaticamente: {key[1]}",
+        ),
+        ["construction", "name"],
+    )
+
+
+# As funções abaixo devolvem instâncias mínimas (id e nome), suficientes para
+# atribuir às FKs de Employee e exibir o nome sem consultar o banco
+
+
+def department(name):
+    return Department(pk=department_ids([name])[name], name=name)
+
+
+def construction(name):
+    return Construction(pk=construction_ids([name])[name], name=name)
+
+
+def sector(construction, name):
+    key = (construction.pk, name)
+    return ConstructionSector(
+        pk=sector_ids([key])[key], name=name, construction=construction
+    )
+
+
+def invalidate(model):
+    reference_cache.invalidate(model._meta.label)
+
+
+def save_with_references(save, on_stale=None):
+    """
+    Executa ``save`` (que resolve os nomes e grava) conferindo as FKs antes
+    do fim da transação, já que são verificadas só no COMMIT. Se um id do
+    cache não existe mais, o cache é descartado, ``on_stale`` limpa o estado
+    guardado pelo chamador e ``save`` é executado mais uma vez.
+    """
+    tables = [Employee._meta.db_table, ConstructionSector._meta.db_table]
+
+    def attempt():
+        with transaction.atomic():
+            result = save()
+            connection.check_constraints(table_names=tables)
+        return result
+
+    try:
+        return attempt()
+    except IntegrityError:
+        reference_cache.clear()
+        if on_stale:
+            on_stale()
+        return attempt()
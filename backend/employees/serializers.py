@@ -1,6 +1,16 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import Employee, Department, Construction, ConstructionSector
-from django.utils import timezone
+from .models import (
+    Employee,
+    Department,
+    Construction,
+    ConstructionSector,
+    PayrollPeriod,
+    PayrollPeriodEntry,
+    PaymentEntry,
+)
+from .ledger import remaining
+from . import references
 
 
 class ConstructionSerializer(serializers.ModelSerializer):
@@ -102,83 +112,57 @@ class EmployeeCreateUpdateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """Cria funcionário criando automaticamente departamento, obra e setor se necessário"""
+        # Uma nova tentativa (id do cache excluído) parte dos dados originais
+        return references.save_with_references(
+            lambda: self._create(dict(validated_data))
+        )
 
+    def _create(self, validated_data):
         # Extrair os nomes dos campos
         department_name = validated_data.pop("department")
         construction_name = validated_data.pop("construction")
         construction_sector_name = validated_data.pop("construction_sector")
 
-        # Criar ou buscar o departamento
-        department, created = Department.objects.get_or_create(
-            name=department_name,
-            defaults={
-                "description": f"Departamento criado automaticamente: {department_name}"
-            },
-        )
-
-        # Criar ou buscar a obra
-        construction, created = Construction.objects.get_or_create(
-            name=construction_name,
-            defaults={
-                "address": "Endereço a ser definido",
-                "start_date": timezone.now().date(),
-                "is_active": True,
-            },
-        )
-
-        # Criar ou buscar o setor da obra
-        construction_sector, created = ConstructionSector.objects.get_or_create(
-            name=construction_sector_name,
-            construction=construction,
-            defaults={
-                "description": f"Setor criado automaticamente: {construction_sector_name}"
-            },
-        )
-
-        # Criar o funcionário com os objetos
-        validated_data["department"] = department
+        # Resolver os nomes (cache ou upsert em uma única consulta)
+        construction = references.construction(construction_name)
+        validated_data["department"] = references.department(department_name)
         validated_data["construction"] = construction
-        validated_data["construction_sector"] = construction_sector
+        validated_data["construction_sector"] = references.sector(
+            construction, construction_sector_name
+        )
 
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
         """Atualiza funcionário criando automaticamente departamento, obra e setor se necessário"""
 
+        def forget_saved_state():
+            # A gravação desfeita deixou na instância o estado do snapshot
+            # posterior a ela; o pre_save volta a lê-lo do banco
+            instance.__dict__.pop("_dashboard_state", None)
+
+        return references.save_with_references(
+            lambda: self._update(instance, dict(validated_data)),
+            on_stale=forget_saved_state,
+        )
+
+    def _update(self, instance, validated_data):
         # Se há campos de departamento, obra ou setor para atualizar
         if "department" in validated_data:
-            department_name = validated_data.pop("department")
-            department, created = Department.objects.get_or_create(
-                name=department_name,
-                defaults={
-                    "description": f"Departamento criado automaticamente: {department_name}"
-                },
+            validated_data["department"] = references.department(
+                validated_data["department"]
             )
-            validated_data["department"] = department
 
         if "construction" in validated_data:
-            construction_name = validated_data.pop("construction")
-            construction, created = Construction.objects.get_or_create(
-                name=construction_name,
-                defaults={
-                    "address": "Endereço a ser definido",
-                    "start_date": timezone.now().date(),
-                    "is_active": True,
-                },
+            validated_data["construction"] = references.construction(
+                validated_data["construction"]
             )
-            validated_data["construction"] = construction
 
         if "construction_sector" in validated_data:
-            construction_sector_name = validated_data.pop("construction_sector")
             construction = validated_data.get("construction", instance.construction)
-            construction_sector, created = ConstructionSector.objects.get_or_create(
-                name=construction_sector_name,
-                construction=construction,
-                defaults={
-                    "description": f"Setor criado automaticamente: {construction_sector_name}"
-                },
+            validated_data["construction_sector"] = references.sector(
+                construction, validated_data["construction_sector"]
             )
-            validated_data["construction_sector"] = construction_sector
 
         return super().update(instance, validated_data)
 
@@ -188,13 +172,25 @@ class EmployeeCreateUpdateSerializer(serializers.ModelSerializer):
         return data
 
 
+class EmployeeImportRowSerializer(EmployeeCreateUpdateSerializer):
+    """
+    Valida uma linha da importação em lote sem consultar o banco: CPFs
+    duplicados e nomes de departamento, obra e setor são resolvidos por lote.
+    """
+
+    class Meta(EmployeeCreateUpdateSerializer.Meta):
+        extra_kwargs = {"cpf": {"validators": []}}
+
+
 class EmployeePaymentSerializer(serializers.Serializer):
     """Serializer para registrar pagamentos"""
 
     payment_type = serializers.ChoiceField(
         choices=["salary", "meal_allowance", "transport_allowance"]
     )
-    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    amount = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, min_value=Decimal("0.01")
+    )
 
     def validate(self, data):
         employee = self.context.get("employee")
@@ -204,31 +200,32 @@ class EmployeePaymentSerializer(serializers.Serializer):
         payment_type = data.get("payment_type")
         amount = data.get("amount")
 
-        # Valida o valor do pagamento
-        if payment_type == "salary" and amount and amount > employee.salary:
-            raise serializers.ValidationError(
-                "O valor do pagamento não pode ser maior que o salário."
-            )
-        elif (
-            payment_type == "meal_allowance"
-            and amount
-            and amount > employee.meal_allowance
-        ):
+        # O valor não pode passar do saldo ainda não pago no período
+        labels = {
+            "salary": "do salário",
+            "meal_allowance": "do vale refeição",
+            "transport_allowance": "do vale transporte",
+        }
+        if amount and amount > remaining(employee, payment_type):
             raise serializers.ValidationError(
-                "O valor do pagamento não pode ser maior que o vale refeição."
-            )
-        elif (
-            payment_type == "transport_allowance"
-            and amount
-            and amount > employee.transport_allowance
-        ):
-            raise serializers.ValidationError(
-                "O valor do pagamento não pode ser maior que o vale transporte."
+                f"O valor do pagamento não pode ser maior que o saldo restante {labels[payment_type]}."
             )
 
         return data
 
 
+class EmployeeBatchPaymentSerializer(serializers.Serializer):
+    """Serializer para um item do registro de pagamentos em lote"""
+
+    employee_id = serializers.IntegerField()
+    payment_type = serializers.ChoiceField(
+        choices=["salary", "meal_allowance", "transport_allowance"]
+    )
+    amount = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, min_value=Decimal("0.01")
+    )
+
+
 class DashboardSerializer(serializers.Serializer):
     """Serializer para dados do dashboard"""
 
@@ -260,3 +257,30 @@ class DashboardSerializer(serializers.Serializer):
     # Por obra
     employees_by_construction = serializers.ListField(child=serializers.DictField())
     payments_by_construction = serializers.ListField(child=serializers.DictField())
+
+
+class PayrollPeriodSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PayrollPeriod
+        fields = "__all__"
+
+
+class PayrollPeriodEntrySerializer(serializers.ModelSerializer):
+    construction_name = serializers.ReadOnlyField(source="construction.name")
+
+    class Meta:
+        model = PayrollPeriodEntry
+        fields = "__all__"
+
+
+class PaymentEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentEntry
+        fields = "__all__"
+
+
+class PayrollPeriodCloseSerializer(serializers.Serializer):
+    """Serializer para o fechamento da folha de um mês"""
+
+    year = serializers.IntegerField(min_value=2000, max_value=9999)
+    month = serializers.IntegerField(min_value=1, max_value=12)
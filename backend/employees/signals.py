@@ -0,0 +1,38 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Construction, ConstructionSector, Department, Employee
+from . import references, snapshot
+
+
+@receiver(pre_save, sender=Employee)
+def capture_previous_state(sender, instance, **kwargs):
+    # Instâncias sem estado conhecido (ex.: carregadas com .only()) buscam o
+    # estado persistido para que o delta do snapshot seja exato
+    if not instance._state.adding and not hasattr(instance, "_dashboard_state"):
+        instance._dashboard_state = snapshot.load_employee_state(instance)
+
+
+@receiver(post_save, sender=Employee)
+def update_snapshot_on_save(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, "_dashboard_state", None)
+    after = instance.dashboard_state()
+    snapshot.apply_transitions([(before, after)])
+    instance._dashboard_state = after
+
+
+@receiver(post_delete, sender=Employee)
+def update_snapshot_on_delete(sender, instance, **kwargs):
+    before = getattr(instance, "_dashboard_state", None) or instance.dashboard_state()
+    snapshot.apply_transitions([(before, None)])
+    instance._dashboard_state = None
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Construction)
+@receiver(post_save, sender=ConstructionSector)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Construction)
+@receiver(post_delete, sender=ConstructionSector)
+def invalidate_reference_cache(sender, **kwargs):
+    # Renomear ou excluir invalida os ids de nome guardados no cache
+    references.invalidate(sender)
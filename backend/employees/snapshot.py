@@ -0,0 +1,160 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum, Count, Q
+from .models import Employee, DashboardSnapshot
+
+METRIC_FIELDS = DashboardSnapshot.METRIC_FIELDS
+
+# Agregações que reproduzem as métricas do snapshot a partir da tabela viva
+LIVE_AGGREGATES = {
+    "employee_count": Count("id"),
+    "salary_total": Sum("salary"),
+    "salary_paid": Sum("salary_amount_paid"),
+    "meal_allowance_total": Sum("meal_allowance"),
+    "meal_allowance_paid": Sum("meal_allowance_amount_paid"),
+    "transport_allowance_total": Sum("transport_allowance"),
+    "transport_allowance_paid": Sum("transport_allowance_amount_paid"),
+    "pending_salary_count": Count("id", filter=Q(salary_payment_status="pending")),
+    "paid_salary_count": Count("id", filter=Q(salary_payment_status="paid")),
+    "partial_salary_count": Count("id", filter=Q(salary_payment_status="partial")),
+}
+
+GLOBAL = "global"
+
+
+def _empty_metrics():
+    return {
+        field: Decimal("0.00") if field.endswith(("_total", "_paid")) else 0
+        for field in METRIC_FIELDS
+    }
+
+
+def _normalize(values):
+    metrics = _empty_metrics()
+    for field in METRIC_FIELDS:
+        if values.get(field) is not None:
+            metrics[field] = values[field]
+    return metrics
+
+
+def load_employee_state(employee):
+    """Lê do banco o estado persistido de um funcionário (None se não existir)"""
+    current = Employee.objects.filter(pk=employee.pk).first()
+    return current.dashboard_state() if current else None
+
+
+def apply_transitions(transitions):
+    """
+    Aplica ao snapshot os deltas de uma sequência de (estado_anterior, estado_novo).
+
+    Estados são dicionários de Employee.dashboard_state(); None representa um
+    funcionário inexistente (criação ou exclusão). As diferenças são somadas
+    por escopo e gravadas com expressões F(), uma atualização por escopo.
+    """
+    deltas = defaultdict(_empty_metrics)
+
+    for before, after in transitions:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None:
+                continue
+            for scope in (GLOBAL, state["construction_id"]):
+                if scope is None:
+                    continue
+                for field in METRIC_FIELDS:
+                    deltas[scope][field] += sign * state[field]
+
+    changed = {scope: delta for scope, delta in deltas.items() if any(delta.values())}
+    if not changed:
+        return
+
+    with transaction.atomic():
+        # Sem linha global o snapshot ainda não foi construído; a próxima
+        # leitura fará a reconstrução completa
+        if not DashboardSnapshot.objects.filter(is_global=True).exists():
+            return
+
+        for scope, delta in changed.items():
+            expressions = {
+                field: F(field) + value for field, value in delta.items() if value
+            }
+            if scope == GLOBAL:
+                DashboardSnapshot.objects.filter(is_global=True).update(**expressions)
+                continue
+
+            updated = DashboardSnapshot.objects.filter(construction_id=scope).update(
+                **expressions
+            )
+            if not updated:
+                # Primeira movimentação da obra: o delta é o próprio total
+                DashboardSnapshot.objects.create(construction_id=scope, **delta)
+
+
+def live_values():
+    """Calcula os totais por escopo diretamente da tabela de funcionários"""
+    values = {GLOBAL: _normalize(Employee.objects.aggregate(**LIVE_AGGREGATES))}
+
+    grouped = (
+        Employee.objects.filter(construction__isnull=False)
+        .values("construction_id")
+        .annotate(**LIVE_AGGREGATES)
+        .order_by()
+    )
+    for row in grouped:
+        values[row["construction_id"]] = _normalize(row)
+
+    return values
+
+
+def stored_values():
+    """Lê os totais gravados no snapshot, indexados por escopo"""
+    values = {}
+    for row in DashboardSnapshot.objects.values(
+        "is_global", "construction_id", *METRIC_FIELDS
+    ):
+        scope = GLOBAL if row["is_global"] else row["construction_id"]
+        values[scope] = _normalize(row)
+    return values
+
+
+def diff_snapshot(stored=None, live=None):
+    """Lista as divergências (escopo, campo, gravado, real) entre snapshot e banco"""
+    stored = stored_values() if stored is None else stored
+    live = live_values() if live is None else live
+
+    drift = []
+    for scope in sorted(set(stored) | set(live), key=str):
+        stored_metrics = stored.get(scope, _empty_metrics())
+        live_metrics = live.get(scope, _empty_metrics())
+        for field in METRIC_FIELDS:
+            if stored_metrics[field] != live_metrics[field]:
+                drift.append((scope, field, stored_metrics[field], live_metrics[field]))
+    return drift
+
+
+@transaction.atomic
+def rebuild_snapshot(live=None):
+    """Reconstrói todo o snapshot a partir dos valores reais"""
+    live = live_values() if live is None else live
+
+    DashboardSnapshot.objects.all().delete()
+    DashboardSnapshot.objects.bulk_create(
+        [
+            DashboardSnapshot(
+                is_global=scope == GLOBAL,
+                construction_id=None if scope == GLOBAL else scope,
+                **metrics,
+            )
+            for scope, metrics in live.items()
+        ]
+    )
+    return live
+
+
+def get_global_snapshot():
+    """Retorna a linha global, reconstruindo o snapshot se ainda não existir"""
+    snapshot = DashboardSnapshot.objects.filter(is_global=True).first()
+    if snapshot is None:
+        rebuild_snapshot()
+        snapshot = DashboardSnapshot.objects.get(is_global=True)
+    return snapshot
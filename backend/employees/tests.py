@@ -1,3 +1,1607 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.db.models import Sum, Count, Q
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from gestao_api.broadcast import CoalescingBroadcaster
+from gestao_api.cache import VersionedLRUCache
+from gestao_api.testing import PlanCheckMixin, QueryBudgetMixin
+from gestao_api.fanout import new_version, payload_fanout
+from gestao_api.instrumentation import RollingHistogram, histograms
+from gestao_api.metrics import registry
+from financials.models import Transaction
+from .consumers import EmployeeConsumer
+from .views import EmployeeViewSet
+from . import dashboard, projection
+from .dashboard import get_dashboard_data
+from .models import (
+    Employee,
+    Department,
+    Construction,
+    ConstructionSector,
+    DashboardSnapshot,
+    PayrollPeriod,
+    PayrollPeriodEntry,
+    PaymentEntry,
+    PaymentPeriodTotal,
+)
+from . import ledger, loadtest, references, snapshot
+from .importer import EmployeeImport
+from .payments import register_payments
+from .payroll import close_payroll_period
+from .serializers import DashboardSerializer
 
-# Create your tests here.
+
+def legacy_dashboard_data():
+    """Implementação original (uma consulta por obra) usada como referência"""
+    employees = Employee.objects.all()
+    salary_aggregates = employees.aggregate(
+        total_salary=Sum("salary"),
+        total_salary_paid=Sum("salary_amount_paid"),
+        total_meal_allowance=Sum("meal_allowance"),
+        total_meal_allowance_paid=Sum("meal_allowance_amount_paid"),
+        total_transport_allowance=Sum("transport_allowance"),
+        total_transport_allowance_paid=Sum("transport_allowance_amount_paid"),
+    )
+    payment_status = employees.aggregate(
+        pending_salary=Count("id", filter=Q(salary_payment_status="pending")),
+        paid_salary=Count("id", filter=Q(salary_payment_status="paid")),
+        partial_salary=Count("id", filter=Q(salary_payment_status="partial")),
+    )
+
+    employees_by_construction = []
+    payments_by_construction = []
+    for construction in Construction.objects.filter(is_active=True):
+        aggregates = employees.filter(construction=construction).aggregate(
+            salary_to_pay=Sum("salary"),
+            salary_paid=Sum("salary_amount_paid"),
+            meal_to_pay=Sum("meal_allowance"),
+            meal_paid=Sum("meal_allowance_amount_paid"),
+            transport_to_pay=Sum("transport_allowance"),
+            transport_paid=Sum("transport_allowance_amount_paid"),
+        )
+        total_paid = Decimal("0")
+        total_to_pay = Decimal("0")
+        for key in ("salary_paid", "meal_paid", "transport_paid"):
+            if aggregates[key]:
+                total_paid += aggregates[key]
+        for key in ("salary_to_pay", "meal_to_pay", "transport_to_pay"):
+            if aggregates[key]:
+                total_to_pay += aggregates[key]
+
+        employees_by_construction.append(
+            {
+                "construction_id": construction.pk,
+                "construction_name": construction.name,
+                "total_employees": employees.filter(construction=construction).count(),
+                "total_salary": aggregates["salary_to_pay"] or Decimal("0"),
+                "total_paid": total_paid,
+            }
+        )
+        payments_by_construction.append(
+            {
+                "construction_id": construction.pk,
+                "construction_name": construction.name,
+                "total_to_pay": total_to_pay,
+                "total_paid": total_paid,
+            }
+        )
+
+    data = {
+        "total_employees": employees.count(),
+        "total_constructions": Construction.objects.filter(is_active=True).count(),
+        "total_departments": Department.objects.count(),
+        "total_salary_to_pay": salary_aggregates["total_salary"] or Decimal("0"),
+        "total_salary_paid": salary_aggregates["total_salary_paid"] or Decimal("0"),
+        "total_meal_allowance_to_pay": salary_aggregates["total_meal_allowance"]
+        or Decimal("0"),
+        "total_meal_allowance_paid": salary_aggregates["total_meal_allowance_paid"]
+        or Decimal("0"),
+        "total_transport_allowance_to_pay": salary_aggregates[
+            "total_transport_allowance"
+        ]
+        or Decimal("0"),
+        "total_transport_allowance_paid": salary_aggregates[
+            "total_transport_allowance_paid"
+        ]
+        or Decimal("0"),
+        "employees_with_pending_salary": payment_status["pending_salary"],
+        "employees_with_paid_salary": payment_status["paid_salary"],
+        "employees_with_partial_salary": payment_status["partial_salary"],
+        "employees_by_construction": employees_by_construction,
+        "payments_by_construction": payments_by_construction,
+    }
+    return DashboardSerializer(data).data
+
+
+class EmployeeFixturesMixin:
+    """Cria obras, setores e funcionários para os testes"""
+
+    def set_today(self, day):
+        """Fixa a data local (mês dos lançamentos em aberto) até o fim do teste"""
+        patcher = mock.patch("django.utils.timezone.localdate", return_value=day)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_construction(self, name, is_active=True):
+        return Construction.objects.create(
+            name=name,
+            address="Rua Teste, 1",
+            start_date=date(2025, 1, 1),
+            is_active=is_active,
+        )
+
+    def create_employee(self, name, construction=None, **kwargs):
+        department = Department.objects.get_or_create(name="Obras")[0]
+        sector = None
+        if construction is not None:
+            sector = ConstructionSector.objects.get_or_create(
+                name="Estrutura", construction=construction
+            )[0]
+        values = {
+            "salary": Decimal("2500.00"),
+            "payment_day": 5,
+            "meal_allowance": Decimal("400.00"),
+            "transport_allowance": Decimal("220.00"),
+        }
+        values.update(kwargs)
+        return Employee.objects.create(
+            name=name,
+            department=department,
+            position="Pedreiro",
+            construction=construction,
+            construction_sector=sector,
+            **values,
+        )
+
+
+class DashboardMetricsTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        snapshot.rebuild_snapshot()
+        self.first = self.create_construction("Residencial Alfa")
+        self.second = self.create_construction("Comercial Beta")
+        self.create_construction("Obra Vazia")
+        self.create_construction("Obra Encerrada", is_active=False)
+
+        paid = self.create_employee("Ana", self.first)
+        paid.mark_salary_as_paid()
+        partial = self.create_employee("Bruno", self.first, salary=Decimal("3100.50"))
+        partial.mark_meal_allowance_as_paid(Decimal("150.00"))
+        self.create_employee("Carla", self.second, salary_payment_status="partial")
+        self.create_employee("Diego")
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_matches_legacy_payload(self):
+        self.assertEqual(
+            self.render(get_dashboard_data()), self.render(legacy_dashboard_data())
+        )
+
+    def test_constant_query_count(self):
+        with self.assertNumQueries(3):
+            get_dashboard_data()
+
+        for index in range(25):
+            construction = self.create_construction(f"Obra {index:02d}")
+            self.create_employee(f"Funcionário {index}", construction)
+
+        with self.assertNumQueries(3):
+            data = get_dashboard_data()
+
+        self.assertEqual(data["total_constructions"], 28)
+        self.assertEqual(self.render(data), self.render(legacy_dashboard_data()))
+
+    def test_dashboard_view(self):
+        response = self.client.get(reverse("dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.render(legacy_dashboard_data()))
+
+
+class DashboardSnapshotTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        snapshot.rebuild_snapshot()
+        self.first = self.create_construction("Residencial Alfa")
+        self.second = self.create_construction("Comercial Beta")
+
+    def assertSnapshotConsistent(self):
+        self.assertEqual(snapshot.diff_snapshot(), [])
+
+    def test_tracks_saves_payments_and_deletes(self):
+        ana = self.create_employee("Ana", self.first)
+        bruno = self.create_employee("Bruno", self.second)
+        self.create_employee("Carla")
+        self.assertSnapshotConsistent()
+
+        ana.mark_salary_as_paid()
+        ana.mark_transport_allowance_as_paid(Decimal("100.00"))
+        bruno.salary = Decimal("4000.00")
+        bruno.construction = self.first
+        bruno.save()
+        self.assertSnapshotConsistent()
+
+        Employee.objects.get(pk=ana.pk).reset_all_payment_status()
+        self.assertSnapshotConsistent()
+
+        bruno.delete()
+        Employee.objects.only("id", "name").get(name="Carla").save()
+        self.assertSnapshotConsistent()
+
+        totals = DashboardSnapshot.objects.get(is_global=True)
+        self.assertEqual(totals.employee_count, 2)
+        self.assertEqual(totals.salary_paid, Decimal("0.00"))
+
+    def test_reads_do_not_scan_employees(self):
+        self.create_employee("Ana", self.first)
+
+        with self.assertNumQueries(3):
+            data = get_dashboard_data()
+
+        self.assertEqual(data["total_employees"], 1)
+        self.assertEqual(data["employees_by_construction"][1]["total_employees"], 1)
+
+    def test_missing_snapshot_is_rebuilt_on_read(self):
+        self.create_employee("Ana", self.first)
+        DashboardSnapshot.objects.all().delete()
+
+        self.assertEqual(get_dashboard_data()["total_employees"], 1)
+        self.assertSnapshotConsistent()
+
+    def test_command_reports_and_fixes_drift(self):
+        self.create_employee("Ana", self.first)
+        Employee.objects.update(salary=Decimal("9999.00"))
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_dashboard_snapshot", "--check", stdout=StringIO())
+
+        output = StringIO()
+        call_command("rebuild_dashboard_snapshot", stdout=output)
+        self.assertIn("salary_total", output.getvalue())
+        self.assertSnapshotConsistent()
+
+
+@override_settings(REALTIME_BROADCAST_WINDOW_MS=0)
+class EmployeeDeltaPushTests(EmployeeFixturesMixin, TransactionTestCase):
+    def setUp(self):
+        self.construction = self.create_construction("Residencial Alfa")
+        self.employees = [
+            self.create_employee(f"Funcionário {index}", self.construction)
+            for index in range(5)
+        ]
+
+    def test_notify_update_carries_affected_ids(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)("employees", channel_name)
+
+        employee = self.employees[0]
+        self.client.post(
+            reverse("employee-register-payment", args=[employee.pk]),
+            {"payment_type": "salary"},
+        )
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(event["action"], "payment_registered")
+        self.assertEqual(event["ids"], [employee.pk])
+
+        self.client.delete(reverse("employee-detail", args=[employee.pk]))
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(event["deleted_ids"], [employee.pk])
+
+    async def test_consumer_pushes_only_changed_rows(self):
+        communicator = WebsocketCommunicator(
+            EmployeeConsumer.as_asgi(), "/ws/employees/"
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(
+            (await communicator.receive_json_from())["type"], "initial_data"
+        )
+
+        changed = self.employees[1]
+        await database_sync_to_async(changed.mark_salary_as_paid)()
+        await get_channel_layer().group_send(
+            "employees",
+            {
+                "type": "employee_message",
+                "message": "Employee data changed",
+                "action": "payment_registered",
+                "ids": [changed.pk],
+                "deleted_ids": [self.employees[2].pk],
+            },
+        )
+
+        self.assertEqual((await communicator.receive_json_from())["type"], "update")
+        upsert = await communicator.receive_json_from()
+        self.assertEqual(upsert["type"], "employee_upsert")
+        self.assertEqual([row["id"] for row in upsert["data"]], [changed.pk])
+        self.assertEqual(upsert["data"][0]["salary_payment_status"], "paid")
+        delete = await communicator.receive_json_from()
+        self.assertEqual(
+            delete, {"type": "employee_delete", "data": [self.employees[2].pk]}
+        )
+        self.assertEqual(
+            (await communicator.receive_json_from())["type"], "dashboard_update"
+        )
+
+        await communicator.disconnect()
+
+    async def test_event_payload_is_built_once_for_all_consumers(self):
+        communicators = []
+        for _ in range(3):
+            communicator = WebsocketCommunicator(
+                EmployeeConsumer.as_asgi(), "/ws/employees/"
+            )
+            await communicator.connect()
+            await communicator.receive_json_from()
+            communicators.append(communicator)
+
+        event = {
+            "type": "employee_message",
+            "message": "Employee data changed",
+            "action": "employee_updated",
+            "ids": [self.employees[0].pk],
+            "deleted_ids": [],
+            "version": new_version(),
+        }
+        with mock.patch.object(
+            dashboard, "get_dashboard_data", wraps=dashboard.get_dashboard_data
+        ) as get_dashboard:
+            await get_channel_layer().group_send("employees", event)
+            received = [
+                [await communicator.receive_from() for _ in range(3)]
+                for communicator in communicators
+            ]
+
+        self.assertEqual(get_dashboard.call_count, 1)
+        self.assertEqual(received[0], received[1])
+        self.assertEqual(received[0], received[2])
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        payload_fanout.clear()
+
+
+class CoalescingBroadcasterTests(TransactionTestCase):
+    def setUp(self):
+        self.channel_layer = get_channel_layer()
+        self.channel_name = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)("employees", self.channel_name)
+
+    def receive(self):
+        return async_to_sync(self.channel_layer.receive)(self.channel_name)
+
+    def notify(self, broadcaster, action, **kwargs):
+        broadcaster.notify(
+            "employees", "employee_message", "Employee data changed", action, **kwargs
+        )
+
+    def test_burst_is_merged_into_one_event(self):
+        broadcaster = CoalescingBroadcaster(window_ms=60_000)
+
+        for pk in range(1, 201):
+            self.notify(broadcaster, "payment_registered", ids=[pk])
+        self.notify(broadcaster, "employee_deleted", deleted_ids=[7])
+        self.notify(broadcaster, "employee_created", ids=[300])
+
+        events = broadcaster.flush_all()
+        self.assertEqual(len(events), 1)
+
+        event = self.receive()
+        self.assertEqual(
+            event["actions"],
+            ["payment_registered", "employee_deleted", "employee_created"],
+        )
+        self.assertEqual(event["action"], "employee_created")
+        self.assertEqual(len(event["ids"]), 200)
+        self.assertNotIn(7, event["ids"])
+        self.assertEqual(event["deleted_ids"], [7])
+        self.assertEqual(broadcaster.flush_all(), [])
+
+    def test_zero_window_sends_immediately(self):
+        broadcaster = CoalescingBroadcaster(window_ms=0)
+
+        self.notify(broadcaster, "employee_updated", ids=[1])
+        self.notify(broadcaster, "employee_updated", ids=[2])
+
+        self.assertEqual(self.receive()["ids"], [1])
+        self.assertEqual(self.receive()["ids"], [2])
+
+
+class EmployeeCursorPaginationTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        construction = self.create_construction("Residencial Alfa")
+        for index in range(25):
+            self.create_employee(
+                f"Funcionário {index:02d}",
+                construction,
+                salary=Decimal("2000.00") + (index % 4) * 500,
+            )
+        self.url = reverse("employee-list")
+
+    def walk(self, params):
+        ids, url, pages = [], self.url, 0
+        response = self.client.get(url, params)
+        while True:
+            pages += 1
+            ids.extend(row["id"] for row in response.data["results"])
+            if not response.data["next"]:
+                return ids, pages, response
+            response = self.client.get(response.data["next"])
+
+    def test_walks_every_row_once_in_requested_order(self):
+        ids, pages, _ = self.walk(
+            {"pagination": "cursor", "ordering": "-salary", "page_size": 7}
+        )
+
+        expected = list(
+            Employee.objects.order_by("-salary", "-pk").values_list("pk", flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_previous_link_returns_prior_page(self):
+        params = {"pagination": "cursor", "ordering": "updated_at", "page_size": 5}
+        first = self.client.get(self.url, params)
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+
+        self.assertIsNone(first.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        params = {"pagination": "cursor", "page_size": 5}
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(self.url, params)
+        for _ in range(3):
+            response = self.client.get(response.data["next"])
+
+        with CaptureQueriesContext(connection) as deep_page:
+            self.client.get(response.data["next"])
+
+        self.assertEqual(len(deep_page), len(first_page))
+        self.assertNotIn("OFFSET", deep_page[0]["sql"])
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(
+            self.url, {"pagination": "cursor", "page_size": 1000}
+        )
+        self.assertEqual(len(response.data["results"]), 25)
+
+        response = self.client.get(self.url, {"page_size": 3, "ordering": "salary"})
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(response.data["count"], 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "inválido"})
+        self.assertEqual(response.status_code, 404)
+
+
+class EmployeeExportTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        construction = self.create_construction("Residencial Alfa")
+        self.create_employee("Ana", construction, salary_payment_status="paid")
+        self.create_employee("Bruno", construction)
+        self.create_employee("Carla")
+
+    def export(self, **params):
+        response = self.client.get(reverse("employee-export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_csv_export_applies_list_filters(self):
+        content = self.export(salary_payment_status="pending")
+        lines = content.strip().splitlines()
+
+        self.assertTrue(lines[0].startswith("id,name,cpf"))
+        self.assertEqual(len(lines), 3)
+        self.assertIn("Residencial Alfa", lines[1])
+
+    def test_ndjson_export(self):
+        rows = [
+            json.loads(line)
+            for line in self.export(export_format="ndjson").splitlines()
+        ]
+
+        self.assertEqual([row["name"] for row in rows], ["Ana", "Bruno", "Carla"])
+        self.assertEqual(rows[0]["salary"], "2500.00")
+        self.assertIsNone(rows[2]["construction_name"])
+
+    def test_rejects_unknown_format(self):
+        response = self.client.get(reverse("employee-export"), {"export_format": "xls"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchPaymentTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        snapshot.rebuild_snapshot()
+        construction = self.create_construction("Residencial Alfa")
+        self.employees = [
+            self.create_employee(f"Funcionário {index:02d}", construction)
+            for index in range(20)
+        ]
+        self.url = reverse("employee-register-payments")
+
+    def pay(self, payments):
+        with mock.patch("employees.views.EmployeeViewSet._notify_update") as notify:
+            response = self.client.post(
+                self.url, payments, content_type="application/json"
+            )
+        return response, notify
+
+    def test_applies_valid_items_and_reports_errors(self):
+        first, second = self.employees[:2]
+        response, notify = self.pay(
+            [
+                {"employee_id": first.pk, "payment_type": "salary"},
+                {
+                    "employee_id": second.pk,
+                    "payment_type": "meal_allowance",
+                    "amount": "150.00",
+                },
+                {"employee_id": second.pk, "payment_type": "salary", "amount": "9999"},
+                {"employee_id": 999999, "payment_type": "salary"},
+                {"employee_id": first.pk, "payment_type": "bonus"},
+                {
+                    "employee_id": first.pk,
+                    "payment_type": "meal_allowance",
+                    "amount": "-100.00",
+                },
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["applied"], response.data["failed"]), (2, 4))
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["ok", "ok", "error", "error", "error", "error"],
+        )
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.salary_payment_status, "paid")
+        self.assertEqual(first.salary_amount_paid, first.salary)
+        self.assertEqual(second.meal_allowance_amount_paid, Decimal("150.00"))
+        self.assertEqual(second.salary_payment_status, "pending")
+        notify.assert_called_once_with(
+            "payment_registered", ids=sorted([first.pk, second.pk])
+        )
+        self.assertEqual(snapshot.diff_snapshot(), [])
+
+    def test_already_paid_items_are_skipped(self):
+        first, second = self.employees[:2]
+        first.mark_salary_as_paid()
+        response, notify = self.pay(
+            [
+                {"employee_id": first.pk, "payment_type": "salary"},
+                {"employee_id": second.pk, "payment_type": "salary"},
+            ]
+        )
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["skipped", "ok"],
+        )
+        self.assertEqual((response.data["applied"], response.data["skipped"]), (1, 1))
+        notify.assert_called_once_with("payment_registered", ids=[second.pk])
+        self.assertEqual(PaymentEntry.objects.filter(employee=first).count(), 1)
+
+        _, changed_ids = register_payments(
+            [{"employee_id": first.pk, "payment_type": "salary"}]
+        )
+        self.assertEqual(changed_ids, [])
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def payments(employees):
+            return [
+                {"employee_id": employee.pk, "payment_type": "salary"}
+                for employee in employees
+            ]
+
+        # O primeiro pagamento cria a célula de custo da obra
+        self.pay(payments(self.employees[:1]))
+        with CaptureQueriesContext(connection) as small:
+            self.pay(payments(self.employees[1:3]))
+        with CaptureQueriesContext(connection) as large:
+            self.pay(payments(self.employees[3:]))
+
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(
+            Employee.objects.filter(salary_payment_status="paid").count(), 20
+        )
+
+    def test_rejects_empty_payload(self):
+        response, _ = self.pay({"payments": []})
+        self.assertEqual(response.status_code, 400)
+
+
+class PayrollPeriodCloseTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        self.set_today(date(2025, 6, 20))
+        snapshot.rebuild_snapshot()
+        self.construction = self.create_construction("Residencial Alfa")
+        self.paid = self.create_employee("Ana", self.construction)
+        self.paid.mark_salary_as_paid()
+        self.paid.mark_meal_allowance_as_paid(Decimal("100.00"))
+        self.create_employee("Bruno")
+
+    def test_close_freezes_month_and_resets_payments(self):
+        response = self.client.post(
+            reverse("payrollperiod-close"), {"year": 2025, "month": 6}
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["employee_count"], 2)
+        self.assertEqual(response.data["salary_total"], "5000.00")
+        self.assertEqual(response.data["salary_paid"], "2500.00")
+        self.assertEqual(response.data["meal_allowance_paid"], "100.00")
+
+        entry = PayrollPeriodEntry.objects.get(employee=self.paid)
+        self.assertEqual(entry.salary_payment_status, "paid")
+        self.assertEqual(entry.construction, self.construction)
+
+        self.paid.refresh_from_db()
+        self.assertEqual(self.paid.salary_payment_status, "pending")
+        self.assertEqual(self.paid.total_paid, Decimal("0.00"))
+        self.assertEqual(snapshot.diff_snapshot(), [])
+
+        entries = self.client.get(
+            reverse("payrollperiod-entries", args=[response.data["id"]]),
+            {"construction": self.construction.pk},
+        )
+        self.assertEqual(entries.data["count"], 1)
+
+        again = self.client.post(
+            reverse("payrollperiod-close"), {"year": 2025, "month": 6}
+        )
+        self.assertEqual(again.status_code, 400)
+
+    def test_query_count_does_not_grow_with_employees(self):
+        close_payroll_period(2025, 6)
+        with CaptureQueriesContext(connection) as small:
+            close_payroll_period(2025, 7)
+        for index in range(30):
+            self.create_employee(f"Funcionário {index}", self.construction)
+        with CaptureQueriesContext(connection) as large:
+            close_payroll_period(2025, 8)
+
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(PayrollPeriod.objects.get(month=8).employee_count, 32)
+
+    def test_only_the_open_period_can_be_closed(self):
+        close_payroll_period(2025, 6)
+        self.paid.refresh_from_db()
+        self.paid.mark_salary_as_paid(Decimal("700.00"))
+
+        url = reverse("payrollperiod-close")
+        for year, month in ((2025, 5), (2025, 8), (2024, 7)):
+            response = self.client.post(url, {"year": year, "month": month})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("07/2025", str(response.data))
+
+        # Os pagamentos do período em aberto não foram estornados
+        self.assertEqual(ledger.paid_so_far(self.paid.pk, "salary"), Decimal("700.00"))
+        self.assertEqual(PayrollPeriod.objects.count(), 1)
+        self.assertEqual(
+            self.client.post(url, {"year": 2025, "month": 7}).status_code, 201
+        )
+
+    def test_first_close_follows_the_open_entries(self):
+        # Sem folhas fechadas, os lançamentos de junho continuam em aberto
+        self.set_today(date(2025, 9, 10))
+        url = reverse("payrollperiod-close")
+        for year, month in ((2025, 1), (2025, 8)):
+            response = self.client.post(url, {"year": year, "month": month})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("06/2025 ou 09/2025", str(response.data))
+
+        self.assertEqual(
+            self.client.post(url, {"year": 2025, "month": 6}).status_code, 201
+        )
+        self.assertEqual(ledger.open_period(), date(2025, 7, 1))
+
+    def test_command_rejects_closed_month(self):
+        call_command("close_payroll_period", year=2025, month=6, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("close_payroll_period", year=2025, month=6, stdout=StringIO())
+
+
+class PaymentLedgerTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        snapshot.rebuild_snapshot()
+        self.employee = self.create_employee("Ana", self.create_construction("Alfa"))
+
+    def pay(self, payment_type, amount=None):
+        data = {"payment_type": payment_type}
+        if amount is not None:
+            data["amount"] = amount
+        with mock.patch("employees.views.EmployeeViewSet._notify_update"):
+            return self.client.post(
+                reverse("employee-register-payment", args=[self.employee.pk]), data
+            )
+
+    def test_partial_payments_accumulate(self):
+        self.assertEqual(
+            self.pay("salary", "1000.00").data["salary_payment_status"], "partial"
+        )
+        response = self.pay("salary", "1500.00")
+
+        self.assertEqual(response.data["salary_payment_status"], "paid")
+        self.assertEqual(response.data["salary_amount_paid"], "2500.00")
+        self.assertEqual(
+            ledger.paid_so_far(self.employee.pk, "salary"), Decimal("2500.00")
+        )
+        self.assertEqual(
+            list(
+                PaymentEntry.objects.filter(employee=self.employee)
+                .order_by("pk")
+                .values_list("amount", flat=True)
+            ),
+            [Decimal("1000.00"), Decimal("1500.00")],
+        )
+        self.assertEqual(snapshot.diff_snapshot(), [])
+
+    def test_rejects_amount_above_remaining(self):
+        self.pay("meal_allowance", "300.00")
+        self.assertEqual(self.pay("meal_allowance", "150.00").status_code, 400)
+
+        # Sem valor, é lançado apenas o saldo restante
+        self.pay("meal_allowance")
+        self.assertEqual(
+            PaymentEntry.objects.filter(payment_type="meal_allowance")
+            .order_by("-pk")
+            .values_list("amount", flat=True)
+            .first(),
+            Decimal("100.00"),
+        )
+
+    def test_rejects_non_positive_amount(self):
+        response = self.pay("salary", "-500.00")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("amount", response.data)
+        self.assertEqual(self.pay("salary", "0.00").status_code, 400)
+        self.assertFalse(PaymentEntry.objects.exists())
+
+    def test_reset_appends_reversal(self):
+        self.employee.mark_salary_as_paid(Decimal("800.00"))
+        self.employee.reset_all_payment_status()
+
+        self.assertEqual(PaymentEntry.objects.count(), 2)
+        reversal = PaymentEntry.objects.get(kind="reversal")
+        self.assertEqual(reversal.amount, Decimal("-800.00"))
+        self.assertEqual(ledger.paid_so_far(self.employee.pk, "salary"), Decimal("0"))
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.salary_payment_status, "pending")
+
+    def test_closing_payroll_opens_next_period(self):
+        self.set_today(date(2025, 6, 20))
+        self.employee.mark_salary_as_paid()
+        close_payroll_period(2025, 6)
+        self.assertEqual(ledger.open_period(), date(2025, 7, 1))
+
+        self.employee.refresh_from_db()
+        self.employee.mark_salary_as_paid(Decimal("500.00"))
+
+        totals = dict(
+            PaymentPeriodTotal.objects.filter(employee=self.employee).values_list(
+                "period", "amount_paid"
+            )
+        )
+        self.assertEqual(totals[date(2025, 7, 1)], Decimal("500.00"))
+        self.assertEqual(self.employee.salary_payment_status, "partial")
+
+        history = self.client.get(
+            reverse("employee-payments", args=[self.employee.pk]),
+            {"period": "2025-07"},
+        )
+        self.assertEqual(history.data["count"], 1)
+
+    def test_batch_items_accumulate_in_order(self):
+        url = reverse("employee-register-payments")
+        items = [
+            {
+                "employee_id": self.employee.pk,
+                "payment_type": "salary",
+                "amount": "2000",
+            },
+            {
+                "employee_id": self.employee.pk,
+                "payment_type": "salary",
+                "amount": "600",
+            },
+            {"employee_id": self.employee.pk, "payment_type": "salary"},
+        ]
+        with mock.patch("employees.views.EmployeeViewSet._notify_update"):
+            response = self.client.post(url, items, content_type="application/json")
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["ok", "error", "ok"],
+        )
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.salary_amount_paid, Decimal("2500.00"))
+        self.assertEqual(self.employee.salary_payment_status, "paid")
+        self.assertEqual(
+            PaymentPeriodTotal.objects.get(employee=self.employee).entry_count, 2
+        )
+        self.assertEqual(snapshot.diff_snapshot(), [])
+
+
+class EmployeeImportTests(EmployeeFixturesMixin, TestCase):
+    HEADER = "name,cpf,department,position,construction,construction_sector,salary,payment_day\n"
+
+    def setUp(self):
+        snapshot.rebuild_snapshot()
+        self.existing = self.create_employee(
+            "Ana", self.create_construction("Residencial Alfa"), cpf="111.111.111-11"
+        )
+        self.url = reverse("employee-import-employees")
+
+    def csv_file(self, lines):
+        content = self.HEADER + "".join(line + "\n" for line in lines)
+        return SimpleUploadedFile("funcionarios.csv", content.encode("utf-8"))
+
+    def upload(self, lines):
+        with mock.patch("employees.views.EmployeeViewSet._notify_update") as notify:
+            response = self.client.post(self.url, {"file": self.csv_file(lines)})
+        return response, notify
+
+    def rows(self, start, count):
+        return [
+            f"Pedreiro {index},,Obras,Pedreiro,Obra Nova,Fundação,2000.00,5"
+            for index in range(start, start + count)
+        ]
+
+    def test_imports_rows_and_reports_errors(self):
+        response, notify = self.upload(
+            [
+                "Bruno,222.222.222-22,Obras,Pedreiro,Residencial Alfa,Estrutura,2500.00,5",
+                "Carla,333.333.333-33,Elétrica,Eletricista,Obra Nova,Fundação,3000.00,10",
+                "Duplicado,111.111.111-11,Obras,Pedreiro,Residencial Alfa,Estrutura,2500.00,5",
+                "Repetido,333.333.333-33,Obras,Pedreiro,Obra Nova,Fundação,2500.00,5",
+                "Sem Salário,,Obras,Pedreiro,Obra Nova,Fundação,abc,5",
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["failed"]), (2, 3))
+        self.assertEqual([error["row"] for error in response.data["errors"]], [4, 5, 6])
+        self.assertIn("cpf", response.data["errors"][0]["errors"])
+        self.assertIn("salary", response.data["errors"][2]["errors"])
+
+        bruno = Employee.objects.get(name="Bruno")
+        self.assertEqual(bruno.construction, self.existing.construction)
+        self.assertEqual(bruno.construction_sector, self.existing.construction_sector)
+        self.assertEqual(Construction.objects.filter(name="Obra Nova").count(), 1)
+        self.assertTrue(Department.objects.filter(name="Elétrica").exists())
+
+        notify.assert_called_once()
+        self.assertEqual(notify.call_args.args, ("employees_imported",))
+        self.assertEqual(len(notify.call_args.kwargs["ids"]), 2)
+        self.assertEqual(snapshot.diff_snapshot(), [])
+
+    def test_row_by_row_fallback_reports_errors_by_cause(self):
+        # Linhas que passaram pela conferência de CPFs, mas cujo INSERT falhou
+        # (CPF gravado por outra requisição ou referência excluída)
+        def employee(name, cpf):
+            return Employee(
+                name=name,
+                cpf=cpf,
+                department=self.existing.department,
+                position="Pedreiro",
+                construction=self.existing.construction,
+                salary=Decimal("2000.00"),
+                payment_day=5,
+            )
+
+        bulk_create = Employee.objects.bulk_create
+
+        def failing_bulk_create(employees, *args, **kwargs):
+            if employees[0].name == "Bruno":
+                raise IntegrityError("FOREIGN KEY constraint failed")
+            return bulk_create(employees, *args, **kwargs)
+
+        with mock.patch.object(
+            Employee.objects, "bulk_create", side_effect=failing_bulk_create
+        ):
+            created, failed = EmployeeImport()._create_one_by_one(
+                [
+                    (2, employee("Bruno", "222.222.222-22")),
+                    (3, employee("Carla", self.existing.cpf)),
+                    (4, employee("Davi", None)),
+                ]
+            )
+
+        self.assertEqual([row.name for row in created], ["Davi"])
+        self.assertEqual(
+            [(number, list(errors)) for number, errors in failed],
+            [(2, ["non_field_errors"]), (3, ["cpf"])],
+        )
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            self.upload(self.rows(0, 3))
+        with CaptureQueriesContext(connection) as large:
+            self.upload(self.rows(3, 60))
+
+        # A segunda importação já encontra obra, setor e departamento criados
+        self.assertLessEqual(len(large), len(small))
+        self.assertEqual(Employee.objects.count(), 64)
+
+    def test_json_body_and_command(self):
+        with mock.patch("employees.views.EmployeeViewSet._notify_update"):
+            response = self.client.post(
+                self.url,
+                [
+                    {
+                        "name": "Eva",
+                        "department": "Obras",
+                        "position": "Servente",
+                        "construction": "Residencial Alfa",
+                        "construction_sector": "Estrutura",
+                        "salary": "1800.00",
+                        "payment_day": 5,
+                    }
+                ],
+                content_type="application/json",
+            )
+        self.assertEqual(response.data["created"], 1)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as file:
+            file.write(
+                json.dumps(
+                    {
+                        "name": "Fábio",
+                        "department": "Obras",
+                        "position": "Servente",
+                        "construction": "Obra Nova",
+                        "construction_sector": "Acabamento",
+                        "salary": "1800.00",
+                        "payment_day": 5,
+                    }
+                )
+                + "\n{quebrado\n"
+            )
+        self.addCleanup(os.unlink, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_employees", file.name, stdout=stdout, stderr=stderr)
+
+        self.assertIn("1 funcionários importados, 1 linhas com erro", stdout.getvalue())
+        self.assertIn("Linha 2", stderr.getvalue())
+        self.assertTrue(Employee.objects.filter(name="Fábio").exists())
+
+
+class ReferenceCacheTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        snapshot.rebuild_snapshot()
+        references.reference_cache.clear()
+        self.addCleanup(references.reference_cache.clear)
+
+    def create(self, name, department="Obras", construction="Residencial Alfa"):
+        with mock.patch("employees.views.EmployeeViewSet._notify_update"):
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(
+                    reverse("employee-list"),
+                    {
+                        "name": name,
+                        "department": department,
+                        "position": "Pedreiro",
+                        "construction": construction,
+                        "construction_sector": "Estrutura",
+                        "salary": "2000.00",
+                        "payment_day": 5,
+                    },
+                )
+
+    def test_steady_state_writes_skip_reference_queries(self):
+        self.assertEqual(self.create("Ana").status_code, 201)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.create("Bruno").status_code, 201)
+
+        reference_tables = (
+            Department._meta.db_table,
+            Construction._meta.db_table,
+            ConstructionSector._meta.db_table,
+        )
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                if query["sql"].startswith("INSERT")
+                and any(f'"{table}"' in query["sql"] for table in reference_tables)
+            ]
+        )
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                if query["sql"].startswith("SELECT")
+                and any(f'FROM "{table}"' in query["sql"] for table in reference_tables)
+            ]
+        )
+        self.assertEqual(Department.objects.count(), 1)
+        self.assertEqual(ConstructionSector.objects.count(), 1)
+
+    def test_existing_names_resolve_with_upsert(self):
+        construction = self.create_construction("Residencial Alfa")
+        self.create("Ana")
+
+        ana = Employee.objects.get(name="Ana")
+        self.assertEqual(ana.construction, construction)
+        self.assertEqual(Construction.objects.count(), 1)
+
+    def test_rename_invalidates_cached_name(self):
+        self.create("Ana")
+        department = Department.objects.get(name="Obras")
+        department.name = "Engenharia"
+        department.save()
+
+        self.create("Bruno")
+
+        bruno = Employee.objects.get(name="Bruno")
+        self.assertEqual(bruno.department.name, "Obras")
+        self.assertNotEqual(bruno.department_id, department.pk)
+
+    def test_reference_deleted_by_another_process_is_resolved_again(self):
+        self.create("Ana")
+        self.client.delete(
+            reverse("employee-detail", args=[Employee.objects.get(name="Ana").pk])
+        )
+        # Outro worker ainda guarda o id do departamento órfão excluído
+        references.reference_cache.set(Department._meta.label, "Obras", 999999)
+
+        self.assertEqual(self.create("Bruno").status_code, 201)
+
+        bruno = Employee.objects.get(name="Bruno")
+        self.assertEqual(bruno.department, Department.objects.get(name="Obras"))
+        self.assertEqual(snapshot.get_global_snapshot().employee_count, 1)
+
+    def test_duplicate_construction_name_is_rejected(self):
+        self.create_construction("Residencial Alfa")
+        response = self.client.post(
+            reverse("construction-list"),
+            {
+                "name": "Residencial Alfa",
+                "address": "Rua Teste, 2",
+                "start_date": "2025-01-01",
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class VersionedLRUCacheTests(TestCase):
+    def test_expiry_eviction_and_invalidation(self):
+        now = [0.0]
+        cache = VersionedLRUCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.set("a", 1, "um")
+        cache.set("a", 2, "dois")
+        cache.get("a", 1)
+        cache.set("b", 3, "três")
+
+        # A chave menos usada recentemente sai primeiro
+        self.assertIsNone(cache.get("a", 2))
+        self.assertEqual(cache.get("a", 1), "um")
+
+        cache.invalidate("a")
+        self.assertIsNone(cache.get("a", 1))
+        self.assertEqual(cache.get("b", 3), "três")
+
+        now[0] = 11
+        self.assertIsNone(cache.get("b", 3))
+
+
+class EmployeeIndexPlanTests(PlanCheckMixin, EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        constructions = [
+            self.create_construction(f"Obra {index}", is_active=index % 4 != 0)
+            for index in range(20)
+        ]
+        department = Department.objects.create(name="Obras")
+        statuses = ["pending", "paid", "partial"]
+        Employee.objects.bulk_create(
+            Employee(
+                name=f"Funcionário {index:04d}",
+                department=department,
+                position="Pedreiro",
+                construction=constructions[index % 20],
+                salary=Decimal("2000.00"),
+                payment_day=5,
+                salary_payment_status=statuses[index % 3],
+                meal_allowance_payment_status=statuses[index % 2],
+                transport_allowance_payment_status=statuses[index % 3],
+            )
+            for index in range(2000)
+        )
+        self.construction = constructions[1]
+
+    def test_key_queries_use_indexes(self):
+        for queryset in (
+            Construction.objects.filter(is_active=True).order_by(
+                *Construction._meta.ordering
+            ),
+            Employee.objects.filter(
+                construction=self.construction, salary_payment_status="paid"
+            ),
+            Employee.objects.filter(salary_payment_status="pending"),
+            Employee.objects.filter(meal_allowance_payment_status="paid"),
+            Employee.objects.filter(transport_allowance_payment_status="partial"),
+            Employee.objects.filter(name__gt="Funcionário 1500").order_by("name", "pk")[
+                :20
+            ],
+        ):
+            with self.subTest(query=str(queryset.query)):
+                self.assertUsesIndex(queryset)
+
+
+class EmployeeQueryBudgetTests(QueryBudgetMixin, EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        snapshot.rebuild_snapshot()
+        self.period = PayrollPeriod.objects.create(year=2025, month=1)
+        self.first = self.create_employee("Ana", self.create_construction("Alfa"))
+        self.first.mark_salary_as_paid(Decimal("100.00"))
+        self.first.mark_salary_as_paid(Decimal("100.00"))
+
+    def seed(self, count):
+        offset = Employee.objects.count()
+        department = Department.objects.create(name=f"Departamento {offset}")
+        constructions = Construction.objects.bulk_create(
+            Construction(
+                name=f"Obra {offset + index}",
+                address="Rua Teste, 1",
+                start_date=date(2025, 1, 1),
+            )
+            for index in range(max(count // 10, 1))
+        )
+        sectors = ConstructionSector.objects.bulk_create(
+            ConstructionSector(name="Estrutura", construction=construction)
+            for construction in constructions
+        )
+        employees = Employee.objects.bulk_create(
+            Employee(
+                name=f"Funcionário {offset + index:05d}",
+                department=department,
+                position="Pedreiro",
+                construction=sectors[index % len(sectors)].construction,
+                construction_sector=sectors[index % len(sectors)],
+                salary=Decimal("2000.00"),
+                payment_day=5,
+            )
+            for index in range(count)
+        )
+        PayrollPeriodEntry.objects.bulk_create(
+            PayrollPeriodEntry(
+                period=self.period,
+                employee=employee,
+                employee_name=employee.name,
+                construction=employee.construction,
+                salary=employee.salary,
+                salary_payment_status="pending",
+                salary_amount_paid=Decimal("0.00"),
+                meal_allowance=employee.meal_allowance,
+                meal_allowance_payment_status="pending",
+                meal_allowance_amount_paid=Decimal("0.00"),
+                transport_allowance=employee.transport_allowance,
+                transport_allowance_payment_status="pending",
+                transport_allowance_amount_paid=Decimal("0.00"),
+            )
+            for employee in employees
+        )
+
+    def urls(self):
+        construction = self.first.construction
+        return [
+            reverse("employee-list"),
+            reverse("employee-list") + "?page_size=100",
+            reverse("employee-list") + "?pagination=cursor&ordering=-salary",
+            reverse("employee-detail", args=[self.first.pk]),
+            reverse("employee-payments", args=[self.first.pk]),
+            reverse("construction-list"),
+            reverse("construction-detail", args=[construction.pk]),
+            reverse("constructionsector-list"),
+            reverse(
+                "constructionsector-detail", args=[self.first.construction_sector_id]
+            ),
+            reverse("department-list"),
+            reverse("department-detail", args=[self.first.department_id]),
+            reverse("payrollperiod-list"),
+            reverse("payrollperiod-detail", args=[self.period.pk]),
+            reverse("payrollperiod-entries", args=[self.period.pk]),
+            reverse("dashboard"),
+            reverse("cash-flow-projection"),
+        ]
+
+    def test_endpoints_stay_within_budget(self):
+        self.assertEndpointsWithinBudget(self.seed, self.urls)
+
+    @override_settings(DEBUG=True)
+    def test_debug_middleware_logs_violations(self):
+        with mock.patch.object(
+            EmployeeViewSet, "query_budget", {"list": 1, "retrieve": 1}
+        ):
+            with self.assertLogs("gestao_api.querybudget", "WARNING") as logs:
+                self.client.get(reverse("employee-list"))
+
+        self.assertIn("GET /api/employees/employees/", logs.output[0])
+
+
+class CashFlowProjectionTests(EmployeeFixturesMixin, TestCase):
+    def setUp(self):
+        for cache in (projection.column_cache, projection.projection_cache):
+            cache.clear()
+            self.addCleanup(cache.clear)
+        # Fevereiro fechado: março é o mês em aberto
+        PayrollPeriod.objects.create(year=2026, month=2)
+        self.construction = self.create_construction("Alfa")
+        self.ana = self.create_employee("Ana", self.construction)
+        self.ana.mark_salary_as_paid(Decimal("1000.00"))
+        self.bruno = self.create_employee("Bruno", payment_day=31)
+        for month in (12, 1, 2):
+            Transaction.objects.create(
+                description="Aluguel",
+                transaction_type="expense",
+                amount=Decimal("1500.00"),
+                transaction_date=date(2026 if month < 12 else 2025, month, 15),
+            )
+        Transaction.objects.create(
+            description="Cimento",
+            transaction_type="expense",
+            amount=Decimal("900.00"),
+            transaction_date=date(2026, 2, 10),
+        )
+        self.start = date(2026, 3, 10)
+
+    def get(self, **params):
+        params = {"start": self.start.isoformat(), "days": 60, **params}
+        return self.client.get(reverse("cash-flow-projection"), params)
+
+    def daily(self, data):
+        return {
+            row["date"]: row["total"] for row in data["daily"] if row["total"] != "0.00"
+        }
+
+    def test_projects_open_balance_then_full_months(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data["employees"], 2)
+        self.assertEqual(
+            self.daily(data),
+            {
+                # Saldo atrasado de março da Ana no primeiro dia
+                "2026-03-10": "2120.00",
+                "2026-03-15": "1500.00",
+                "2026-03-31": "3120.00",
+                "2026-04-05": "3120.00",
+                "2026-04-15": "1500.00",
+                # Dia 31 vence no último dia de abril
+                "2026-04-30": "3120.00",
+                "2026-05-05": "3120.00",
+            },
+        )
+        self.assertEqual(data["total"], "17600.00")
+        self.assertEqual(data["daily"][-1]["cumulative"], "17600.00")
+        self.assertEqual(
+            [
+                (row["construction"], row["construction_name"], row["total"])
+                for row in data["constructions"]
+            ],
+            [(None, None, "9240.00"), (self.construction.pk, "Alfa", "8360.00")],
+        )
+        self.assertEqual(
+            data["recurring"],
+            [
+                {
+                    "description": "Aluguel",
+                    "construction": None,
+                    "amount": "1500.00",
+                    "day": 15,
+                }
+            ],
+        )
+
+    def test_recurring_expense_already_paid_this_month(self):
+        Transaction.objects.create(
+            description="Aluguel",
+            transaction_type="expense",
+            amount=Decimal("1500.00"),
+            transaction_date=date(2026, 3, 9),
+        )
+
+        daily = self.daily(self.get().data)
+
+        self.assertNotIn("2026-03-15", daily)
+        self.assertEqual(daily["2026-04-15"], "1500.00")
+
+    def test_paid_employee_starts_next_month(self):
+        self.bruno.mark_salary_as_paid()
+        self.bruno.mark_meal_allowance_as_paid()
+        self.bruno.mark_transport_allowance_as_paid()
+
+        daily = self.daily(self.get().data)
+
+        self.assertNotIn("2026-03-31", daily)
+        self.assertEqual(daily["2026-04-30"], "3120.00")
+
+    def test_cached_until_data_changes(self):
+        self.get()
+        with CaptureQueriesContext(connection) as queries:
+            self.get()
+        # Só a versão dos dados e os nomes das obras
+        self.assertEqual(len(queries), 5)
+
+        self.bruno.salary = Decimal("3500.00")
+        self.bruno.save()
+        self.assertEqual(self.daily(self.get().data)["2026-03-31"], "4120.00")
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get(days=0).status_code, 400)
+        self.assertEqual(self.get(days="x").status_code, 400)
+        self.assertEqual(self.get(start="10/03/2026").status_code, 400)
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    SEED_OPTIONS = {
+        "constructions": 3,
+        "departments": 2,
+        "employees": 12,
+        "materials": 2,
+        "categories": 2,
+        "expenses": 5,
+        "transactions": 8,
+        "stdout": StringIO(),
+    }
+
+    def seed(self, seed=7):
+        call_command("seed_benchmark_data", seed=seed, **self.SEED_OPTIONS)
+        return list(
+            Employee.objects.order_by("cpf").values_list(
+                "cpf", "salary", "salary_payment_status", "construction__name"
+            )
+        )
+
+    def test_seed_is_deterministic_and_replaces_previous_run(self):
+        first = self.seed()
+        second = self.seed()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(second), 12)
+        self.assertEqual(Construction.objects.count(), 3)
+        self.assertNotEqual(self.seed(seed=8), first)
+
+    def test_run_benchmarks_writes_json_report(self):
+        self.seed()
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        salaries = list(Employee.objects.values_list("salary_amount_paid", flat=True))
+
+        call_command(
+            "run_benchmarks",
+            iterations=2,
+            warmup=0,
+            output=path,
+            stdout=StringIO(),
+        )
+
+        with open(path, encoding="utf-8") as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["dataset"]["employees"], 12)
+        self.assertEqual(
+            set(report["results"]),
+            {
+                "dashboard",
+                "employee_list",
+                "employee_list_cursor",
+                "register_payment",
+                "expense_list",
+                "transaction_list",
+                "websocket_initial_load",
+            },
+        )
+        for result in report["results"].values():
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertGreater(result["queries"], 0)
+        # Os pagamentos do benchmark são desfeitos
+        self.assertEqual(
+            list(Employee.objects.values_list("salary_amount_paid", flat=True)),
+            salaries,
+        )
+        self.assertFalse(PaymentEntry.objects.exists())
+
+
+class WebsocketFanoutLoadTests(EmployeeFixturesMixin, TransactionTestCase):
+    def setUp(self):
+        construction = self.create_construction("Residencial Alfa")
+        for index in range(3):
+            self.create_employee(f"Funcionário {index}", construction)
+
+    def test_reports_results_per_client_count(self):
+        results = loadtest.run_fanout([1, 4], events=3)
+
+        self.assertEqual([result["clients"] for result in results], [1, 4])
+        for result in results:
+            self.assertEqual(result["events"], 3)
+            self.assertLessEqual(result["delivery_p50_ms"], result["delivery_p95_ms"])
+            self.assertGreater(result["messages_per_second"], 0)
+            self.assertGreater(result["memory_per_connection_kib"], 0)
+        # O payload é montado uma vez por evento, independente dos clientes
+        self.assertGreater(results[1]["queries_per_event"], 0)
+        self.assertLessEqual(
+            results[1]["queries_per_event"], results[0]["queries_per_event"]
+        )
+
+    def test_command_writes_json_report(self):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        call_command(
+            "loadtest_websocket",
+            clients=[2],
+            events=2,
+            output=path,
+            stdout=StringIO(),
+        )
+
+        with open(path, encoding="utf-8") as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["results"][0]["clients"], 2)
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True)
+class InstrumentationTests(EmployeeFixturesMixin, TransactionTestCase):
+    def setUp(self):
+        construction = self.create_construction("Residencial Alfa")
+        for index in range(3):
+            self.create_employee(f"Funcionário {index}", construction)
+        histograms.clear()
+        self.addCleanup(histograms.clear)
+
+    def test_http_request_gets_server_timing_log_and_histogram(self):
+        with self.assertLogs("gestao_api.instrumentation", "INFO") as logs:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse("employee-list"))
+
+        self.assertEqual(response.status_code, 200)
+        header = response["Server-Timing"]
+        self.assertIn(f'desc="{len(captured)} queries"', header)
+        self.assertIn("serialize;dur=", header)
+        self.assertIn("total;dur=", header)
+        self.assertIn("endpoint=GET employee-list", logs.output[0])
+
+        stats = histograms.snapshot()["GET employee-list"]
+        self.assertEqual(stats["total_ms"]["count"], 1)
+        self.assertEqual(stats["queries"]["p50"], len(captured))
+
+    @override_settings(REQUEST_INSTRUMENTATION=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("employee-list"))
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(histograms.snapshot(), {})
+
+    async def test_websocket_messages_are_measured(self):
+        communicator = WebsocketCommunicator(
+            EmployeeConsumer.as_asgi(), "/ws/employees/"
+        )
+        await communicator.connect()
+        await communicator.receive_from()
+        await communicator.send_to(json.dumps({"type": "get_employees"}))
+        await communicator.receive_from()
+        await communicator.disconnect()
+
+        stats = histograms.snapshot()["WS /ws/employees/ websocket.receive"]
+        self.assertEqual(stats["total_ms"]["count"], 1)
+        self.assertGreater(stats["queries"]["p50"], 0)
+        self.assertGreater(stats["serialize_ms"]["p50"], 0)
+
+    def test_rolling_histogram_keeps_cumulative_buckets_and_recent_window(self):
+        histogram = RollingHistogram(bounds=(10, 100), window=2)
+        for value in (5, 50, 500):
+            histogram.observe(value)
+
+        self.assertEqual(
+            histogram.cumulative_counts(), [(10, 1), (100, 2), (float("inf"), 3)]
+        )
+        self.assertEqual(histogram.sum, 555)
+        self.assertEqual(histogram.percentile(0.5), 500)
+        self.assertEqual(list(histogram.recent), [50, 500])
+
+
+@override_settings(REALTIME_BROADCAST_WINDOW_MS=0)
+class MetricsEndpointTests(EmployeeFixturesMixin, TransactionTestCase):
+    def setUp(self):
+        construction = self.create_construction("Residencial Alfa")
+        self.employee = self.create_employee("Funcionário", construction)
+
+    def sample(self, name, default=None):
+        for line in registry.expose().splitlines():
+            if line.startswith(name + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return default
+
+    def test_exposes_prometheus_text_with_http_latency(self):
+        self.client.get(reverse("employee-list"))
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("# TYPE gestao_http_request_seconds histogram", body)
+        self.assertIn(
+            'gestao_http_request_seconds_bucket{endpoint="GET employee-list",le="+Inf"}',
+            body,
+        )
+
+    def test_counts_group_send_per_action(self):
+        sample = (
+            'gestao_group_send_total{group="employees",action="payment_registered"}'
+        )
+        before = self.sample(sample, 0)
+
+        self.client.post(
+            reverse("employee-register-payment", args=[self.employee.pk]),
+            {"payment_type": "salary"},
+        )
+
+        self.assertEqual(self.sample(sample), before + 1)
+        self.assertIsNotNone(
+            self.sample(
+                'gestao_group_send_seconds_count{group="employees",'
+                'action="payment_registered"}'
+            )
+        )
+
+    async def test_reports_group_consumers_queues_and_db_pool(self):
+        waits_before = self.sample("gestao_db_sync_wait_seconds_count", 0)
+        consumers = 'gestao_ws_group_consumers{group="employees"}'
+        consumers_before = self.sample(consumers, 0)
+        communicator = WebsocketCommunicator(
+            EmployeeConsumer.as_asgi(), "/ws/employees/"
+        )
+        await communicator.connect()
+        await communicator.receive_from()
+
+        # Canal sem leitor: os eventos ficam na fila
+        channel_layer = get_channel_layer()
+        idle = await channel_layer.new_channel()
+        await channel_layer.group_add("employees", idle)
+        for _ in range(2):
+            await channel_layer.send(idle, {"type": "noop"})
+
+        self.assertEqual(self.sample(consumers), consumers_before + 2)
+        self.assertEqual(
+            self.sample(
+                f'gestao_channel_queue_depth{{group="employees",channel="{idle}"}}'
+            ),
+            2,
+        )
+        self.assertGreaterEqual(
+            self.sample('gestao_channel_queue_depth_max{group="employees"}'), 2
+        )
+        self.assertGreater(
+            self.sample("gestao_db_sync_wait_seconds_count"), waits_before
+        )
+        self.assertEqual(self.sample("gestao_db_sync_in_flight"), 0)
+
+        await channel_layer.group_discard("employees", idle)
+        await communicator.disconnect()
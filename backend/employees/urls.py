@@ -6,6 +6,8 @@ from .views import (
     ConstructionViewSet,
     ConstructionSectorViewSet,
     DashboardView,
+    CashFlowProjectionView,
+    PayrollPeriodViewSet,
 )
 
 router = DefaultRouter()
@@ -13,8 +15,14 @@ router.register(r"employees", EmployeeViewSet)
 router.register(r"departments", DepartmentViewSet)
 router.register(r"constructions", ConstructionViewSet)
 router.register(r"construction-sectors", ConstructionSectorViewSet)
+router.register(r"payroll-periods", PayrollPeriodViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
     path("dashboard/", DashboardView.as_view(), name="dashboard"),
+    path(
+        "cash-flow-projection/",
+        CashFlowProjectionView.as_view(),
+        name="cash-flow-projection",
+    ),
 ]
@@ -3,13 +3,20 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from django.db.models import Sum, Count, Q
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from decimal import Decimal
+from datetime import datetime
 from typing import Dict, Any, cast
-from .models import Employee, Department, Construction, ConstructionSector
+from .models import (
+    Employee,
+    Department,
+    Construction,
+    ConstructionSector,
+    PayrollPeriod,
+    PayrollPeriodEntry,
+    PaymentEntry,
+)
 from .serializers import (
     EmployeeSerializer,
     EmployeeCreateUpdateSerializer,
@@ -17,14 +24,44 @@ from .serializers import (
     DepartmentSerializer,
     ConstructionSerializer,
     ConstructionSectorSerializer,
-    DashboardSerializer,
+    PayrollPeriodSerializer,
+    PayrollPeriodEntrySerializer,
+    PayrollPeriodCloseSerializer,
+    PaymentEntrySerializer,
+)
+from .dashboard import get_dashboard_data
+from . import projection
+from .payments import register_payments
+from .importer import IMPORT_FORMATS, EmployeeImport, open_text, parse_rows
+from .payroll import (
+    PayrollPeriodClosed,
+    PayrollPeriodOutOfOrder,
+    close_payroll_period,
 )
+from .pagination import EmployeeCursorPagination, EmployeePageNumberPagination
+from gestao_api.broadcast import broadcaster
+from gestao_api.exports import ExportMixin
 from rest_framework.exceptions import ValidationError
 
 
+def check_financial_links(instance, label):
+    """
+    Obras e setores com despesas ou transações vinculadas não podem ser
+    excluídos (os vínculos são protegidos no banco)
+    """
+    expenses_count = instance.expenses.count()
+    transactions_count = instance.transactions.count()
+    if expenses_count or transactions_count:
+        raise ValidationError(
+            f"Não é possível excluir {label} pois há {expenses_count} despesa(s) "
+            f"e {transactions_count} transação(ões) vinculada(s)."
+        )
+
+
 class ConstructionViewSet(viewsets.ModelViewSet):
     queryset = Construction.objects.all()
     serializer_class = ConstructionSerializer
+    query_budget = {"list": 2, "retrieve": 1}
 
     def perform_create(self, serializer):
         instance = serializer.save()
@@ -43,25 +80,22 @@ class ConstructionViewSet(viewsets.ModelViewSet):
                 f"Não é possível excluir esta obra pois há {employees_count} funcionário(s) vinculado(s) a ela."
             )
 
-        # Se não há funcionários, prosseguir com a exclusão
+        check_financial_links(instance, "esta obra")
+
+        # Se não há vínculos, prosseguir com a exclusão
         instance.delete()
         self._notify_update("construction_deleted")
 
     def _notify_update(self, action):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
-            "employees",
-            {
-                "type": "employee_message",
-                "message": "Construction data changed",
-                "action": action,
-            },
+        broadcaster.notify(
+            "employees", "employee_message", "Construction data changed", action
         )
 
 
 class ConstructionSectorViewSet(viewsets.ModelViewSet):
-    queryset = ConstructionSector.objects.all()
+    queryset = ConstructionSector.objects.select_related("construction")
     serializer_class = ConstructionSectorSerializer
+    query_budget = {"list": 2, "retrieve": 1}
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -74,32 +108,34 @@ class ConstructionSectorViewSet(viewsets.ModelViewSet):
         instance = serializer.save()
         self._notify_update("construction_sector_created")
 
+    def perform_destroy(self, instance):
+        employees_count = instance.employees.count()
+        if employees_count > 0:
+            raise ValidationError(
+                f"Não é possível excluir este setor pois há {employees_count} funcionário(s) vinculado(s) a ele."
+            )
+        check_financial_links(instance, "este setor")
+        instance.delete()
+        self._notify_update("construction_sector_deleted")
+
     def _notify_update(self, action):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
-            "employees",
-            {
-                "type": "employee_message",
-                "message": "Construction sector data changed",
-                "action": action,
-            },
+        broadcaster.notify(
+            "employees", "employee_message", "Construction sector data changed", action
         )
 
 
 class DepartmentViewSet(viewsets.ModelViewSet):
-    queryset = Department.objects.all()
+    queryset = Department.objects.order_by("name")
     serializer_class = DepartmentSerializer
+    query_budget = {"list": 2, "retrieve": 1}
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
+        broadcaster.notify(
             "employees",
-            {
-                "type": "employee_message",
-                "message": "Department created/updated",
-                "action": "department_update",
-            },
+            "employee_message",
+            "Department created/updated",
+            "department_update",
         )
 
     @action(detail=False, methods=["post"])
@@ -118,14 +154,11 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         # Deletar departamentos órfãos
         orphan_departments.delete()
 
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
+        broadcaster.notify(
             "employees",
-            {
-                "type": "employee_message",
-                "message": "Orphan departments cleaned up",
-                "action": "departments_cleaned",
-            },
+            "employee_message",
+            "Orphan departments cleaned up",
+            "departments_cleaned",
         )
 
         return Response(
@@ -136,9 +169,45 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         )
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
-    queryset = Employee.objects.all()
+class EmployeeViewSet(ExportMixin, viewsets.ModelViewSet):
+    queryset = Employee.objects.select_related(
+        "department", "construction", "construction_sector"
+    )
     serializer_class = EmployeeSerializer
+    query_budget = {"list": 2, "retrieve": 1, "payments": 3}
+    export_filename = "funcionarios"
+    export_fields = (
+        ("id", "id"),
+        ("name", "name"),
+        ("cpf", "cpf"),
+        ("phone", "phone"),
+        ("email", "email"),
+        ("department", "department_id"),
+        ("department_name", "department__name"),
+        ("position", "position"),
+        ("construction", "construction_id"),
+        ("construction_name", "construction__name"),
+        ("construction_sector", "construction_sector_id"),
+        ("construction_sector_name", "construction_sector__name"),
+        ("salary", "salary"),
+        ("payment_day", "payment_day"),
+        ("salary_payment_status", "salary_payment_status"),
+        ("salary_amount_paid", "salary_amount_paid"),
+        ("last_salary_payment_date", "last_salary_payment_date"),
+        ("meal_allowance", "meal_allowance"),
+        ("meal_allowance_payment_status", "meal_allowance_payment_status"),
+        ("meal_allowance_amount_paid", "meal_allowance_amount_paid"),
+        ("last_meal_allowance_payment_date", "last_meal_allowance_payment_date"),
+        ("transport_allowance", "transport_allowance"),
+        ("transport_allowance_payment_status", "transport_allowance_payment_status"),
+        ("transport_allowance_amount_paid", "transport_allowance_amount_paid"),
+        (
+            "last_transport_allowance_payment_date",
+            "last_transport_allowance_payment_date",
+        ),
+        ("created_at", "created_at"),
+        ("updated_at", "updated_at"),
+    )
     filterset_fields = [
         "department",
         "construction",
@@ -147,6 +216,20 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         "meal_allowance_payment_status",
         "transport_allowance_payment_status",
     ]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    ordering_fields = EmployeeCursorPagination.ordering_fields
+    pagination_class = EmployeePageNumberPagination
+
+    @property
+    def paginator(self):
+        """Usa paginação por cursor quando o cliente pede (?pagination=cursor)"""
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params if self.request else {}
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = EmployeeCursorPagination()
+            else:
+                return super().paginator
+        return self._paginator
 
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
@@ -155,15 +238,16 @@ class EmployeeViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        self._notify_update("employee_created")
+        self._notify_update("employee_created", ids=[instance.pk])
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        self._notify_update("employee_updated")
+        self._notify_update("employee_updated", ids=[instance.pk])
 
     def perform_destroy(self, instance):
-        # Capturar o departamento antes da exclusão
+        # Capturar o departamento e o id antes da exclusão
         department_to_check = instance.department
+        employee_id = instance.pk
 
         # Excluir o funcionário
         instance.delete()
@@ -180,7 +264,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
                     f"🧹 Departamento órfão removido automaticamente: {department_name}"
                 )
 
-        self._notify_update("employee_deleted")
+        self._notify_update("employee_deleted", deleted_ids=[employee_id])
 
     @action(detail=True, methods=["post"])
     def register_payment(self, request, pk=None):
@@ -210,172 +294,181 @@ class EmployeeViewSet(viewsets.ModelViewSet):
             elif payment_type == "transport_allowance":
                 employee.mark_transport_allowance_as_paid(amount)
 
-            self._notify_update("payment_registered")
+            self._notify_update("payment_registered", ids=[employee.pk])
             return Response(EmployeeSerializer(employee).data)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["post"])
+    def register_payments(self, request):
+        """Registra pagamentos de vários funcionários em uma única transação"""
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get("payments")
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "Envie uma lista de pagamentos não vazia."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results, changed_ids = register_payments(items)
+        if changed_ids:
+            self._notify_update("payment_registered", ids=changed_ids)
+
+        return Response(
+            {
+                "applied": sum(result["status"] == "ok" for result in results),
+                "skipped": sum(result["status"] == "skipped" for result in results),
+                "failed": sum(result["status"] == "error" for result in results),
+                "results": results,
+            }
+        )
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_employees(self, request):
+        """
+        Importa funcionários em lote a partir de um arquivo (campo ``file``)
+        CSV, JSON ou NDJSON, ou de uma lista JSON no corpo da requisição.
+        """
+        upload = request.FILES.get("file")
+        if upload is not None:
+            import_format = request.query_params.get(
+                "import_format", upload.name.rsplit(".", 1)[-1].lower()
+            )
+            if import_format not in IMPORT_FORMATS:
+                raise ValidationError(
+                    {
+                        "import_format": f"Formato inválido. Use: {', '.join(IMPORT_FORMATS)}"
+                    }
+                )
+            rows = parse_rows(open_text(upload.file), import_format)
+        elif isinstance(request.data, list) and request.data:
+            rows = parse_rows(request.data, "json")
+        else:
+            return Response(
+                {"error": "Envie um arquivo ou uma lista de funcionários."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = EmployeeImport().run(rows)
+        if result.created_ids:
+            self._notify_update("employees_imported", ids=result.created_ids)
+        return Response(result.as_dict())
+
     @action(detail=True, methods=["post"])
     def reset_payments(self, request, pk=None):
         """Reseta todos os pagamentos do funcionário"""
         employee = self.get_object()
         employee.reset_all_payment_status()
         serializer = self.get_serializer(employee)
-        self._notify_update("payments_reset")
+        self._notify_update("payments_reset", ids=[employee.pk])
         return Response(serializer.data)
 
-    def _notify_update(self, action):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
+    @action(detail=True, methods=["get"])
+    def payments(self, request, pk=None):
+        """Histórico de lançamentos do funcionário (``?period=AAAA-MM``)"""
+        entries = PaymentEntry.objects.filter(employee=self.get_object())
+        period = request.query_params.get("period")
+        if period:
+            try:
+                period = datetime.strptime(period, "%Y-%m").date()
+            except ValueError:
+                raise ValidationError({"period": "Use o formato AAAA-MM."})
+            entries = entries.filter(period=period)
+
+        page = self.paginate_queryset(entries)
+        serializer = PaymentEntrySerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def _notify_update(self, action, ids=(), deleted_ids=()):
+        # Os ids afetados permitem que os consumers enviem apenas as linhas alteradas
+        broadcaster.notify(
             "employees",
-            {
-                "type": "employee_message",
-                "message": "Employee data changed",
-                "action": action,
-            },
+            "employee_message",
+            "Employee data changed",
+            action,
+            ids=ids,
+            deleted_ids=deleted_ids,
         )
 
 
-class DashboardView(APIView):
-    """View para fornecer dados do dashboard"""
+class PayrollPeriodViewSet(viewsets.ReadOnlyModelViewSet):
+    """Folhas fechadas: consulta de meses anteriores sem recálculo"""
 
-    def get(self, request):
-        employees = Employee.objects.all()
-
-        # Dados gerais
-        total_employees = employees.count()
-        total_constructions = Construction.objects.filter(is_active=True).count()
-        total_departments = Department.objects.count()
-
-        # Cálculos de pagamentos
-        salary_aggregates = employees.aggregate(
-            total_salary=Sum("salary"),
-            total_salary_paid=Sum("salary_amount_paid"),
-            total_meal_allowance=Sum("meal_allowance"),
-            total_meal_allowance_paid=Sum("meal_allowance_amount_paid"),
-            total_transport_allowance=Sum("transport_allowance"),
-            total_transport_allowance_paid=Sum("transport_allowance_amount_paid"),
-        )
+    queryset = PayrollPeriod.objects.all()
+    serializer_class = PayrollPeriodSerializer
+    query_budget = {"list": 2, "retrieve": 1, "entries": 3}
+    filterset_fields = ["year", "month"]
+
+    @action(detail=False, methods=["post"])
+    def close(self, request):
+        """Fecha a folha do mês e reseta os pagamentos de todos os funcionários"""
+        serializer = PayrollPeriodCloseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        validated_data = cast(Dict[str, Any], serializer.validated_data)
+
+        try:
+            period = close_payroll_period(
+                validated_data["year"], validated_data["month"]
+            )
+        except (PayrollPeriodClosed, PayrollPeriodOutOfOrder) as exc:
+            raise ValidationError(str(exc))
 
-        # Status de pagamentos
-        payment_status = employees.aggregate(
-            pending_salary=Count("id", filter=Q(salary_payment_status="pending")),
-            paid_salary=Count("id", filter=Q(salary_payment_status="paid")),
-            partial_salary=Count("id", filter=Q(salary_payment_status="partial")),
+        broadcaster.notify(
+            "employees",
+            "employee_message",
+            "Payroll period closed",
+            "payroll_closed",
+        )
+        return Response(
+            PayrollPeriodSerializer(period).data, status=status.HTTP_201_CREATED
         )
 
-        # Funcionários por obra
-        employees_by_construction = []
-        constructions = Construction.objects.filter(is_active=True)
-
-        for construction in constructions:
-            construction_employees = employees.filter(construction=construction)
-            salary_sum = construction_employees.aggregate(salary_total=Sum("salary"))
-            paid_sum = construction_employees.aggregate(
-                salary_paid=Sum("salary_amount_paid"),
-                meal_paid=Sum("meal_allowance_amount_paid"),
-                transport_paid=Sum("transport_allowance_amount_paid"),
-            )
+    @action(detail=True, methods=["get"])
+    def entries(self, request, pk=None):
+        """Lista a situação de cada funcionário no fechamento"""
+        entries = PayrollPeriodEntry.objects.filter(period=self.get_object())
+        construction_id = request.query_params.get("construction")
+        if construction_id:
+            entries = entries.filter(construction_id=construction_id)
 
-            total_paid = Decimal("0")
-            if paid_sum:
-                salary_paid = paid_sum.get("salary_paid")
-                meal_paid = paid_sum.get("meal_paid")
-                transport_paid = paid_sum.get("transport_paid")
-
-                if salary_paid:
-                    total_paid += salary_paid
-                if meal_paid:
-                    total_paid += meal_paid
-                if transport_paid:
-                    total_paid += transport_paid
-
-            employees_by_construction.append(
-                {
-                    "construction_id": construction.pk,
-                    "construction_name": construction.name,
-                    "total_employees": construction_employees.count(),
-                    "total_salary": salary_sum.get("salary_total") or Decimal("0"),
-                    "total_paid": total_paid,
-                }
-            )
+        page = self.paginate_queryset(entries.select_related("construction"))
+        serializer = PayrollPeriodEntrySerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        # Pagamentos por obra
-        payments_by_construction = []
-        for construction in constructions:
-            construction_employees = employees.filter(construction=construction)
-            aggregates = construction_employees.aggregate(
-                total_salary_to_pay=Sum("salary"),
-                total_salary_paid=Sum("salary_amount_paid"),
-                total_meal_to_pay=Sum("meal_allowance"),
-                total_meal_paid=Sum("meal_allowance_amount_paid"),
-                total_transport_to_pay=Sum("transport_allowance"),
-                total_transport_paid=Sum("transport_allowance_amount_paid"),
-            )
 
-            total_to_pay = Decimal("0")
-            total_paid = Decimal("0")
-
-            # Verificação segura para evitar erros de tipo
-            if aggregates and isinstance(aggregates, dict):
-                total_salary_to_pay = aggregates.get("total_salary_to_pay")
-                total_meal_to_pay = aggregates.get("total_meal_to_pay")
-                total_transport_to_pay = aggregates.get("total_transport_to_pay")
-                total_salary_paid_val = aggregates.get("total_salary_paid")
-                total_meal_paid_val = aggregates.get("total_meal_paid")
-                total_transport_paid_val = aggregates.get("total_transport_paid")
-
-                if total_salary_to_pay:
-                    total_to_pay += total_salary_to_pay
-                if total_meal_to_pay:
-                    total_to_pay += total_meal_to_pay
-                if total_transport_to_pay:
-                    total_to_pay += total_transport_to_pay
-
-                if total_salary_paid_val:
-                    total_paid += total_salary_paid_val
-                if total_meal_paid_val:
-                    total_paid += total_meal_paid_val
-                if total_transport_paid_val:
-                    total_paid += total_transport_paid_val
-
-            payments_by_construction.append(
-                {
-                    "construction_id": construction.pk,
-                    "construction_name": construction.name,
-                    "total_to_pay": total_to_pay,
-                    "total_paid": total_paid,
-                }
-            )
+class DashboardView(APIView):
+    """View para fornecer dados do dashboard"""
 
-        data = {
-            "total_employees": total_employees,
-            "total_constructions": total_constructions,
-            "total_departments": total_departments,
-            "total_salary_to_pay": salary_aggregates.get("total_salary")
-            or Decimal("0"),
-            "total_salary_paid": salary_aggregates.get("total_salary_paid")
-            or Decimal("0"),
-            "total_meal_allowance_to_pay": salary_aggregates.get("total_meal_allowance")
-            or Decimal("0"),
-            "total_meal_allowance_paid": salary_aggregates.get(
-                "total_meal_allowance_paid"
-            )
-            or Decimal("0"),
-            "total_transport_allowance_to_pay": salary_aggregates.get(
-                "total_transport_allowance"
-            )
-            or Decimal("0"),
-            "total_transport_allowance_paid": salary_aggregates.get(
-                "total_transport_allowance_paid"
-            )
-            or Decimal("0"),
-            "employees_with_pending_salary": payment_status.get("pending_salary", 0),
-            "employees_with_paid_salary": payment_status.get("paid_salary", 0),
-            "employees_with_partial_salary": payment_status.get("partial_salary", 0),
-            "employees_by_construction": employees_by_construction,
-            "payments_by_construction": payments_by_construction,
-        }
-
-        serializer = DashboardSerializer(data)
-        return Response(serializer.data)
+    query_budget = {"get": 3}
+
+    def get(self, request):
+        return Response(get_dashboard_data())
+
+
+class CashFlowProjectionView(APIView):
+    """
+    Saídas de caixa previstas por dia e por obra: folha (salário e vales) e
+    despesas recorrentes, para ``?days=`` dias (padrão 90) a partir de
+    ``?start=`` (AAAA-MM-DD, padrão hoje).
+    """
+
+    query_budget = {"get": 8}
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            days = int(params.get("days", projection.DEFAULT_DAYS))
+        except ValueError:
+            raise ValidationError({"days": "Informe um número de dias."})
+        if not 1 <= days <= projection.MAX_DAYS:
+            raise ValidationError({"days": f"Use de 1 a {projection.MAX_DAYS} dias."})
+        start = None
+        if params.get("start"):
+            try:
+                start = datetime.strptime(params["start"], "%Y-%m-%d").date()
+            except ValueError:
+                raise ValidationError({"start": "Use o formato AAAA-MM-DD."})
+
+        result = projection.get_projection(start, days)
+        return Response(projection.with_construction_names(result))
@@ -1,11 +1,55 @@
 from django.contrib import admin
-from .models import Material, Expense, ExpenseCategory, Transaction
+from .models import Material, Expense, ExpenseCategory, StockMovement, Transaction
+from . import stock
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = (
+        "material",
+        "kind",
+        "quantity",
+        "expense",
+        "construction",
+        "created_at",
+    )
+    list_filter = ("kind",)
+    search_fields = ("material__name", "note")
+
+    # O livro é somente inclusão: correções geram novas movimentações
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class StockMovementInline(admin.TabularInline):
+    model = StockMovement
+    fields = ("kind", "quantity", "expense", "construction", "note", "created_at")
+    readonly_fields = fields
+    ordering = ("-id",)
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Material)
 class MaterialAdmin(admin.ModelAdmin):
     list_display = ("name", "unit_price", "stock_quantity")
     search_fields = ("name",)
+    inlines = [StockMovementInline]
+
+    def get_readonly_fields(self, request, obj=None):
+        # Depois do cadastro o saldo só muda por movimentações
+        if obj is not None:
+            return ("stock_quantity",)
+        return ()
 
 
 @admin.register(ExpenseCategory)
@@ -21,14 +65,32 @@ class ExpenseAdmin(admin.ModelAdmin):
         "expense_type",
         "material",
         "category",
+        "construction",
         "quantity",
         "amount",
         "expense_date",
     )
-    list_filter = ("expense_type", "expense_date", "category")
+    list_filter = ("expense_type", "expense_date", "category", "construction")
     search_fields = ("description",)
     date_hierarchy = "expense_date"
 
+    def get_deleted_objects(self, objs, request):
+        # Exclusões que estornariam entradas já consumidas aparecem como
+        # protegidas, e o admin recusa a exclusão
+        deleted, model_count, perms_needed, protected = super().get_deleted_objects(
+            objs, request
+        )
+        movements = [
+            movement
+            for expense in objs
+            for movement in stock.expense_movements(None, expense.stock_state(), None)
+        ]
+        try:
+            stock.check_movements(movements)
+        except stock.InsufficientStock as error:
+            protected = [*protected, *error.messages]
+        return deleted, model_count, perms_needed, protected
+
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
@@ -39,7 +101,14 @@ class TransactionAdmin(admin.ModelAdmin):
         "payment_method",
         "transaction_date",
         "category",
+        "construction",
+    )
+    list_filter = (
+        "transaction_type",
+        "payment_method",
+        "transaction_date",
+        "category",
+        "construction",
     )
-    list_filter = ("transaction_type", "payment_method", "transaction_date", "category")
     search_fields = ("description", "notes")
     date_hierarchy = "transaction_date"
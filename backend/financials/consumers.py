@@ -1,45 +1,126 @@
 import json
-from typing import Any
 from channels.generic.websocket import AsyncWebsocketConsumer
-from asgiref.sync import sync_to_async
-from .models import Material, Expense
+from gestao_api.fanout import encode, payload_fanout
+from gestao_api.metrics import database_sync_to_async
+from gestao_api.instrumentation import InstrumentedConsumerMixin, timed_serialization
+from . import live
 
+# Ações que alteram os totais (saldo, mês corrente e categorias)
+SUMMARY_ACTIONS = [
+    "transaction_created",
+    "transaction_updated",
+    "transaction_deleted",
+    "transactions_imported",
+    "expense_created",
+    "expense_updated",
+    "expense_deleted",
+    # Nomes de categoria aparecem no resumo
+    "category_created",
+    "category_updated",
+    "category_deleted",
+]
 
-class FinancialConsumer(AsyncWebsocketConsumer):
-    channel_layer: Any  # Define tipagem para o channel_layer
+
+class FinancialConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Envia o resumo financeiro calculado no servidor e, a cada alteração, só
+    as linhas afetadas de transações, despesas e materiais. Mensagens dos
+    clientes nunca são repassadas ao grupo: apenas pedidos de dados, que
+    são respondidos ao próprio cliente.
+    """
 
     async def connect(self):
         self.room_group_name = "financials"
 
         # Join room group
-        await self.channel_layer.group_add(  # type: ignore
-            self.room_group_name, self.channel_name
-        )
+        if self.channel_layer is not None:
+            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
         await self.accept()
 
+        await self.send_summary()
+
     async def disconnect(self, close_code):
         # Leave room group
-        await self.channel_layer.group_discard(  # type: ignore
-            self.room_group_name, self.channel_name
-        )
+        if self.channel_layer is not None:
+            await self.channel_layer.group_discard(
+                self.room_group_name, self.channel_name
+            )
 
-    # Receive message from WebSocket
     async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json["message"]
-        action = text_data_json.get("action", "default")
-
-        # Send message to room group
-        await self.channel_layer.group_send(  # type: ignore
-            self.room_group_name,
-            {"type": "financial_message", "message": message, "action": action},
-        )
+        try:
+            message_type = json.loads(text_data).get("type")
+        except (json.JSONDecodeError, AttributeError):
+            await self.send_error("Invalid JSON format")
+            return
+
+        if message_type == "get_summary":
+            await self.send_summary()
+        else:
+            await self.send_error("Unknown message type")
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({"type": "error", "message": message}))
+
+    async def send_summary(self):
+        await self.send(text_data=encode("summary_update", await self.get_summary()))
 
-    # Receive message from room group
     async def financial_message(self, event):
-        message = event["message"]
-        action = event.get("action", "default")
+        # Frames calculados uma vez por versão e compartilhados pelos consumers
+        frames = await payload_fanout.get_or_build(
+            event.get("version"), lambda: self.build_event_frames(event)
+        )
+        for frame in frames:
+            await self.send(text_data=frame)
+
+    async def build_event_frames(self, event):
+        """Build the encoded frames sent to clients for a group event"""
+        actions = event.get("actions") or [event["action"]]
+        frames = [
+            json.dumps(
+                {
+                    "type": "update",
+                    "message": event["message"],
+                    "action": event["action"],
+                    "actions": actions,
+                }
+            )
+        ]
+
+        changed = live.split_refs(event.get("ids", []))
+        deleted = live.split_refs(event.get("deleted_ids", []))
+        for kind in live.ROW_SOURCES:
+            if changed.get(kind) or deleted.get(kind):
+                frames.extend(
+                    await self.build_delta_frames(
+                        kind, changed.get(kind, []), deleted.get(kind, [])
+                    )
+                )
+
+        if any(action in SUMMARY_ACTIONS for action in actions):
+            frames.append(encode("summary_update", await self.get_summary()))
+        return frames
+
+    async def build_delta_frames(self, kind, ids, deleted_ids):
+        """Build frames with only the rows of ``kind`` affected by a change"""
+        rows, missing_ids = await self.get_rows(kind, ids)
+        deleted_ids = list(deleted_ids) + missing_ids
+
+        frames = []
+        if rows:
+            frames.append(encode(f"{kind}_upsert", rows))
+        if deleted_ids:
+            frames.append(encode(f"{kind}_delete", deleted_ids))
+        return frames
+
+    @database_sync_to_async
+    def get_rows(self, kind, ids):
+        if not ids:
+            return [], []
+        with timed_serialization():
+            return live.get_rows(kind, ids)
 
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({"message": message, "action": action}))
+    @database_sync_to_async
+    def get_summary(self):
+        with timed_serialization():
+            return live.compute_summary()
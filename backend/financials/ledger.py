@@ -0,0 +1,128 @@
+"""
+Livro-razão das transações com o saldo acumulado após cada lançamento.
+
+O saldo é calculado no banco por uma função de janela (soma dos valores com
+sinal na ordem ``transaction_date, id``) sobre as linhas da página, somada ao
+saldo anterior ao cursor. Esse saldo inicial usa os totais mensais
+(``rollups``) como checkpoints: somam-se as células dos meses anteriores ao
+do cursor e, das transações, apenas as do próprio mês até o cursor. Assim
+qualquer página, ou a busca por uma data, custa o mesmo que a primeira.
+"""
+
+import sys
+from datetime import datetime
+from decimal import Decimal
+from django.db.models import (
+    Case,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Q,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+from employees.pagination import KeysetPagination
+from .models import Transaction, TransactionMonthlyRollup
+
+BALANCE_FIELD = DecimalField(max_digits=16, decimal_places=2)
+
+
+def signed_amount(field="amount"):
+    """Valor com sinal: receitas somam e despesas subtraem"""
+    return Case(
+        When(transaction_type="income", then=F(field)),
+        default=-F(field),
+        output_field=BALANCE_FIELD,
+    )
+
+
+def _total(queryset, field):
+    return queryset.aggregate(
+        balance=Coalesce(
+            Sum(signed_amount(field)),
+            Value(Decimal("0.00")),
+            output_field=BALANCE_FIELD,
+        )
+    )["balance"]
+
+
+def balance_before(position=None, inclusive=False):
+    """
+    Saldo das transações anteriores a ``position`` = ``(data, id)`` na ordem
+    do livro, incluindo a própria posição se ``inclusive``. Sem posição,
+    o saldo de todas as transações.
+    """
+    if position is None:
+        return _total(TransactionMonthlyRollup.objects.all(), "total")
+    day, pk = position
+    month = day.replace(day=1)
+    checkpoint = _total(
+        TransactionMonthlyRollup.objects.filter(month__lt=month), "total"
+    )
+    same_day = {"pk__lte" if inclusive else "pk__lt": pk}
+    since = _total(
+        Transaction.objects.filter(
+            Q(transaction_date__gte=month, transaction_date__lt=day)
+            | Q(transaction_date=day, **same_day)
+        ),
+        "amount",
+    )
+    return checkpoint + since
+
+
+def running_balance(descending=False):
+    """Soma acumulada dos valores com sinal no sentido da leitura"""
+    order = [F("transaction_date").asc(), F("id").asc()]
+    if descending:
+        order = [F("transaction_date").desc(), F("id").desc()]
+    return Window(
+        Sum(signed_amount()),
+        order_by=order,
+        frame=RowRange(start=None, end=0),
+        output_field=BALANCE_FIELD,
+    )
+
+
+class TransactionLedgerPagination(KeysetPagination):
+    """
+    Páginas do livro-razão em ordem cronológica (``?ordering=-transaction_date``
+    para as mais recentes primeiro), com o saldo após cada lançamento.
+    ``?date=AAAA-MM-DD`` posiciona a primeira página nessa data.
+    """
+
+    ordering_fields = ("transaction_date",)
+    default_ordering = "transaction_date"
+    date_query_param = "date"
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        value = request.query_params.get(self.date_query_param)
+        if cursor is not None or not value:
+            return cursor
+        try:
+            day = datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValidationError({self.date_query_param: "Use o formato AAAA-MM-DD."})
+        # Cursor logo antes do primeiro lançamento do dia (logo depois do
+        # último, com as mais recentes primeiro)
+        pk = sys.maxsize if self.descending else 0
+        return {"value": day.isoformat(), "pk": pk, "reverse": False}
+
+    def annotate_page(self, queryset, position, descending):
+        running = running_balance(descending)
+        if descending:
+            # Lendo para trás, o saldo após cada linha é o anterior ao cursor
+            # menos as linhas entre ela (exclusive) e o cursor
+            balance = Value(balance_before(position)) - running + signed_amount()
+        elif position is None:
+            balance = running
+        else:
+            balance = Value(balance_before(position, inclusive=True)) + running
+        return queryset.annotate(
+            balance=ExpressionWrapper(balance, output_field=BALANCE_FIELD)
+        )
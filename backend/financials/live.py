@@ -0,0 +1,120 @@
+"""
+Dados enviados pelo FinancialConsumer: resumo financeiro e linhas alteradas.
+
+O grupo ``financials`` recebe alterações de transações, despesas e materiais
+no mesmo evento; os ids afetados são referências ``"<tipo>:<id>"`` (ver
+``ref``), para que a coalescência do broadcaster una ids de modelos
+diferentes sem misturá-los.
+
+O resumo é lido dos totais mensais (``rollups``), então o custo não depende
+do número de transações.
+"""
+
+from decimal import Decimal
+from django.db.models import Q, Sum
+from django.utils import timezone
+from . import rollups
+from .models import Expense, Material, Transaction, TransactionMonthlyRollup
+from .serializers import (
+    ExpenseSerializer,
+    LiveSummarySerializer,
+    MaterialSerializer,
+    TransactionSerializer,
+)
+
+# Tipo da referência -> (queryset, serializer) usados nos deltas de linhas
+ROW_SOURCES = {
+    "transaction": (
+        Transaction.objects.select_related(
+            "category", "expense", "construction", "construction_sector"
+        ),
+        TransactionSerializer,
+    ),
+    "expense": (
+        Expense.objects.select_related(
+            "category", "material", "construction", "construction_sector"
+        ),
+        ExpenseSerializer,
+    ),
+    "material": (Material.objects.all(), MaterialSerializer),
+}
+
+
+def ref(kind, pk):
+    """Referência de um registro nos ids dos eventos do grupo ``financials``"""
+    return f"{kind}:{pk}"
+
+
+def split_refs(refs):
+    """Agrupa referências por tipo: ``{"transaction": [1, 2], ...}``"""
+    grouped = {}
+    for value in refs:
+        kind, _, pk = str(value).partition(":")
+        if kind in ROW_SOURCES and pk.isdigit():
+            grouped.setdefault(kind, []).append(int(pk))
+    return grouped
+
+
+def get_rows(kind, ids):
+    """Serializa os registros informados e lista os que não existem mais"""
+    queryset, serializer_class = ROW_SOURCES[kind]
+    rows = serializer_class(queryset.filter(pk__in=ids), many=True).data
+    found = {row["id"] for row in rows}
+    return rows, [pk for pk in ids if pk not in found]
+
+
+def _category_entry(categories, row):
+    zero = Decimal("0.00")
+    return categories.setdefault(
+        row["category"],
+        {
+            "category": row["category"],
+            "category_name": row["category_name"],
+            "income": zero,
+            "expense": zero,
+            "expenses": zero,
+        },
+    )
+
+
+def compute_summary(today=None):
+    """
+    Saldo acumulado, receitas e despesas do mês corrente e totais do mês por
+    categoria. São três consultas às células mensais.
+    """
+    month = (today or timezone.localdate()).replace(day=1)
+    current = Q(month=month)
+    zero = Decimal("0.00")
+
+    totals = TransactionMonthlyRollup.objects.filter(entry_count__gt=0).aggregate(
+        income=Sum("total", filter=Q(transaction_type="income")),
+        expense=Sum("total", filter=Q(transaction_type="expense")),
+        month_income=Sum("total", filter=current & Q(transaction_type="income")),
+        month_expense=Sum("total", filter=current & Q(transaction_type="expense")),
+    )
+    totals = {field: value or zero for field, value in totals.items()}
+
+    categories = {}
+    for row in rollups.summarize(
+        rollups.TRANSACTIONS, ["category", "transaction_type"], month, month
+    ):
+        entry = _category_entry(categories, row)
+        entry[row["transaction_type"]] += row["total"]
+    for row in rollups.summarize(rollups.EXPENSES, ["category"], month, month):
+        entry = _category_entry(categories, row)
+        entry["expenses"] += row["total"]
+
+    summary = {
+        "month": month.strftime("%Y-%m"),
+        "balance": totals["income"] - totals["expense"],
+        "income": totals["income"],
+        "expense": totals["expense"],
+        "month_income": totals["month_income"],
+        "month_expense": totals["month_expense"],
+        # Sem categoria por último, as demais pelo nome
+        "categories": sorted(
+            categories.values(),
+            key=lambda entry: (entry["category"] is None, entry["category_name"] or ""),
+        ),
+    }
+    return LiveSummarySerializer(summary).data
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from financials import stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere o saldo em estoque de cada material com o livro de "
+        "movimentações e grava checkpoints para limitar os próximos recálculos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Apenas verifica divergências, sem gravar checkpoints "
+            "(termina com erro se houver drift)",
+        )
+
+    def handle(self, *args, **options):
+        drift = stock.diff_balances()
+        for material_id, stored, actual in drift:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Divergência no material {material_id}: "
+                    f"gravado={stored} movimentações={actual}"
+                )
+            )
+
+        if options["check"]:
+            if drift:
+                raise CommandError(f"{len(drift)} divergência(s) encontrada(s).")
+            self.stdout.write(self.style.SUCCESS("Saldos de estoque consistentes."))
+            return
+
+        # Checkpoint de um saldo divergente perpetuaria o erro no livro
+        if drift:
+            raise CommandError(
+                f"{len(drift)} divergência(s) encontrada(s); checkpoints não gravados."
+            )
+        created = stock.checkpoint()
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(created)} checkpoint(s) de estoque gravado(s).")
+        )
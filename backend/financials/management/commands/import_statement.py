@@ -0,0 +1,61 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from gestao_api.broadcast import broadcaster
+from financials.statements import IMPORT_FORMATS, StatementImport, open_text, parse_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa um extrato bancário (CSV ou OFX) como transações, ignorando "
+        "as linhas já importadas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Arquivo do extrato")
+        parser.add_argument(
+            "--format",
+            dest="import_format",
+            choices=IMPORT_FORMATS,
+            help="Formato do arquivo (padrão: pela extensão)",
+        )
+        parser.add_argument("--account", default="", help="Conta bancária do extrato")
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        import_format = options["import_format"] or path.suffix.lstrip(".").lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(
+                f"Formato inválido. Use --format com: {', '.join(IMPORT_FORMATS)}"
+            )
+        if not path.is_file():
+            raise CommandError(f"Arquivo não encontrado: {path}")
+
+        with path.open("rb") as fileobj:
+            try:
+                stream = open_text(fileobj, options["encoding"])
+            except LookupError:
+                raise CommandError(f"Codificação desconhecida: {options['encoding']}")
+            result = StatementImport(options["account"], options["chunk_size"]).run(
+                parse_rows(stream, import_format)
+            )
+
+        if result.created:
+            broadcaster.notify(
+                "financials",
+                "financial_message",
+                "Transaction data changed",
+                "transactions_imported",
+            )
+            broadcaster.flush_all()
+
+        for error in result.errors:
+            self.stderr.write(f"Linha {error['row']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.created} transação(ões) importada(s), "
+                f"{result.duplicates} já existente(s), "
+                f"{len(result.errors)} com erro."
+            )
+        )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from financials import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói os totais mensais de transações e despesas e o cubo de "
+        "custos por obra a partir dos registros e informa divergências entre "
+        "os valores gravados e os reais"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Apenas verifica divergências, sem reconstruir "
+            "(termina com erro se houver drift)",
+        )
+
+    def handle(self, *args, **options):
+        total_drift = 0
+        for spec in rollups.ALL_SPECS:
+            label = spec.model._meta.verbose_name_plural
+            live = rollups.live_values(spec)
+            drift = rollups.diff_rollup(spec, live=live)
+            total_drift += len(drift)
+
+            for cell, field, stored, actual in drift:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Divergência ({label}) {cell} {field}: "
+                        f"gravado={stored} real={actual}"
+                    )
+                )
+
+            if not options["check"]:
+                rollups.rebuild_rollup(spec, live=live)
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{label} reconstruídos ({len(live)} células, "
+                        f"{len(drift)} divergência(s) corrigida(s))."
+                    )
+                )
+
+        if options["check"]:
+            if total_drift:
+                raise CommandError(f"{total_drift} divergência(s) encontrada(s).")
+            self.stdout.write(self.style.SUCCESS("Totais mensais consistentes."))
@@ -0,0 +1,209 @@
+# Generated by Django 5.2 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_rollups(apps, schema_editor):
+    """Calcula as células a partir das transações e despesas existentes"""
+    Transaction = apps.get_model("financials", "Transaction")
+    Expense = apps.get_model("financials", "Expense")
+    TransactionMonthlyRollup = apps.get_model("financials", "TransactionMonthlyRollup")
+    ExpenseMonthlyRollup = apps.get_model("financials", "ExpenseMonthlyRollup")
+
+    rows = (
+        Transaction.objects.annotate(month=TruncMonth("transaction_date"))
+        .values("month", "transaction_type", "payment_method", "category_id")
+        .annotate(total=Sum("amount"), entry_count=Count("id"))
+        .order_by()
+    )
+    TransactionMonthlyRollup.objects.bulk_create(
+        [TransactionMonthlyRollup(**row) for row in rows], batch_size=1000
+    )
+
+    rows = (
+        Expense.objects.annotate(month=TruncMonth("expense_date"))
+        .values("month", "expense_type", "category_id")
+        .annotate(
+            total=Sum("amount"), quantity=Sum("quantity"), entry_count=Count("id")
+        )
+        .order_by()
+    )
+    ExpenseMonthlyRollup.objects.bulk_create(
+        [ExpenseMonthlyRollup(**row) for row in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("financials", "0003_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExpenseMonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(verbose_name="Mês")),
+                (
+                    "expense_type",
+                    models.CharField(
+                        choices=[
+                            ("material", "Material"),
+                            ("service", "Serviço"),
+                            ("utility", "Utilidade"),
+                            ("other", "Outro"),
+                        ],
+                        max_length=10,
+                        verbose_name="Tipo de Despesa",
+                    ),
+                ),
+                (
+                    "total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=16,
+                        verbose_name="Total",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.BigIntegerField(default=0, verbose_name="Quantidade"),
+                ),
+                (
+                    "entry_count",
+                    models.IntegerField(default=0, verbose_name="Lançamentos"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="financials.expensecategory",
+                        verbose_name="Categoria",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Total Mensal de Despesas",
+                "verbose_name_plural": "Totais Mensais de Despesas",
+                "indexes": [
+                    models.Index(fields=["month"], name="expense_rollup_month_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("category__isnull", False)),
+                        fields=("month", "expense_type", "category"),
+                        name="unique_expense_rollup_cell",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("category__isnull", True)),
+                        fields=("month", "expense_type"),
+                        name="unique_expense_rollup_cell_no_category",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="TransactionMonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(verbose_name="Mês")),
+                (
+                    "transaction_type",
+                    models.CharField(
+                        choices=[("income", "Receita"), ("expense", "Despesa")],
+                        max_length=10,
+                        verbose_name="Tipo de Transação",
+                    ),
+                ),
+                (
+                    "payment_method",
+                    models.CharField(
+                        choices=[
+                            ("cash", "Dinheiro"),
+                            ("credit_card", "Cartão de Crédito"),
+                            ("debit_card", "Cartão de Débito"),
+                            ("transfer", "Transferência"),
+                            ("pix", "PIX"),
+                            ("other", "Outro"),
+                        ],
+                        max_length=20,
+                        verbose_name="Método de Pagamento",
+                    ),
+                ),
+                (
+                    "total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=16,
+                        verbose_name="Total",
+                    ),
+                ),
+                (
+                    "entry_count",
+                    models.IntegerField(default=0, verbose_name="Lançamentos"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="financials.expensecategory",
+                        verbose_name="Categoria",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Total Mensal de Transações",
+                "verbose_name_plural": "Totais Mensais de Transações",
+                "indexes": [
+                    models.Index(fields=["month"], name="transaction_rollup_month_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("category__isnull", False)),
+                        fields=(
+                            "month",
+                            "transaction_type",
+                            "payment_method",
+                            "category",
+                        ),
+                        name="unique_transaction_rollup_cell",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("category__isnull", True)),
+                        fields=("month", "transaction_type", "payment_method"),
+                        name="unique_transaction_rollup_cell_no_category",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,148 @@
+# Generated by Django 5.2 on 2026-10-17 00:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_stock(apps, schema_editor):
+    """Lança o saldo atual de cada material como movimentação inicial"""
+    Material = apps.get_model("financials", "Material")
+    StockMovement = apps.get_model("financials", "StockMovement")
+
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(material_id=pk, kind="opening", quantity=quantity)
+            for pk, quantity in Material.objects.filter(
+                stock_quantity__gt=0
+            ).values_list("pk", "stock_quantity")
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0007_hot_path_indexes"),
+        ("financials", "0004_monthly_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "last_movement_id",
+                    models.BigIntegerField(verbose_name="Última Movimentação"),
+                ),
+                ("balance", models.BigIntegerField(verbose_name="Saldo")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "material",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_checkpoints",
+                        to="financials.material",
+                        verbose_name="Material",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Checkpoint de Estoque",
+                "verbose_name_plural": "Checkpoints de Estoque",
+                "ordering": ["-last_movement_id"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("material", "last_movement_id"),
+                        name="unique_stock_checkpoint",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockMovement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Saldo Inicial"),
+                            ("purchase", "Entrada por Despesa"),
+                            ("consumption", "Consumo em Obra"),
+                            ("adjustment", "Ajuste de Despesa"),
+                        ],
+                        max_length=12,
+                        verbose_name="Tipo",
+                    ),
+                ),
+                ("quantity", models.IntegerField(verbose_name="Quantidade")),
+                (
+                    "note",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Observação"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "construction",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="stock_movements",
+                        to="employees.construction",
+                        verbose_name="Obra",
+                    ),
+                ),
+                (
+                    "expense",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="stock_movements",
+                        to="financials.expense",
+                        verbose_name="Despesa",
+                    ),
+                ),
+                (
+                    "material",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_movements",
+                        to="financials.material",
+                        verbose_name="Material",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Movimentação de Estoque",
+                "verbose_name_plural": "Movimentações de Estoque",
+                "ordering": ["-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["material", "id"], name="stock_movement_material_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(open_stock, migrations.RunPython.noop),
+    ]
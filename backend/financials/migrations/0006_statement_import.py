@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-17 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("financials", "0005_stock_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="account",
+            field=models.CharField(
+                blank=True, default="", max_length=50, verbose_name="Conta Bancária"
+            ),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                null=True,
+                verbose_name="Hash",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("content_hash__isnull", False)),
+                fields=("content_hash",),
+                name="unique_transaction_content_hash",
+            ),
+        ),
+    ]
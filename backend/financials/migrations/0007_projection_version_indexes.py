@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("financials", "0006_statement_import"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["updated_at"], name="transaction_updated_at_idx"
+            ),
+        ),
+    ]
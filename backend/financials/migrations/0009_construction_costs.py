@@ -0,0 +1,226 @@
+# Generated by Django 5.2 on 2026-10-17 01:15
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import TruncMonth
+
+COST_GROUPS = {
+    "salary": "labor",
+    "meal_allowance": "labor",
+    "transport_allowance": "labor",
+    "material": "material",
+    "service": "other",
+    "utility": "other",
+    "other": "other",
+    "transaction": "other",
+}
+
+
+def build_costs(apps, schema_editor):
+    """Calcula as células do cubo a partir da folha, despesas e transações"""
+    PaymentEntry = apps.get_model("employees", "PaymentEntry")
+    Expense = apps.get_model("financials", "Expense")
+    Transaction = apps.get_model("financials", "Transaction")
+    ConstructionCostRollup = apps.get_model("financials", "ConstructionCostRollup")
+
+    sources = (
+        PaymentEntry.objects.annotate(month=F("period"), cost_type=F("payment_type")),
+        Expense.objects.annotate(
+            month=TruncMonth("expense_date"), cost_type=F("expense_type")
+        ),
+        Transaction.objects.filter(
+            transaction_type="expense", expense__isnull=True
+        ).annotate(month=TruncMonth("transaction_date"), cost_type=Value("transaction")),
+    )
+    for queryset in sources:
+        rows = (
+            queryset.values(
+                "month", "construction_id", "construction_sector_id", "cost_type"
+            )
+            .annotate(total=Sum("amount"), entry_count=Count("id"))
+            .order_by()
+        )
+        ConstructionCostRollup.objects.bulk_create(
+            [
+                ConstructionCostRollup(**row, cost_group=COST_GROUPS[row["cost_type"]])
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0009_payment_entry_construction"),
+        ("financials", "0008_ledger_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="construction",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="expenses",
+                to="employees.construction",
+                verbose_name="Obra",
+            ),
+        ),
+        migrations.AddField(
+            model_name="expense",
+            name="construction_sector",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="expenses",
+                to="employees.constructionsector",
+                verbose_name="Setor da Obra",
+            ),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="construction",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="transactions",
+                to="employees.construction",
+                verbose_name="Obra",
+            ),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="construction_sector",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="transactions",
+                to="employees.constructionsector",
+                verbose_name="Setor da Obra",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ConstructionCostRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(verbose_name="Mês")),
+                (
+                    "cost_type",
+                    models.CharField(
+                        choices=[
+                            ("salary", "Salário"),
+                            ("meal_allowance", "Vale Refeição"),
+                            ("transport_allowance", "Vale Transporte"),
+                            ("material", "Material"),
+                            ("service", "Serviço"),
+                            ("utility", "Utilidade"),
+                            ("other", "Outro"),
+                            ("transaction", "Outras Saídas"),
+                        ],
+                        max_length=20,
+                        verbose_name="Tipo de Custo",
+                    ),
+                ),
+                (
+                    "cost_group",
+                    models.CharField(
+                        choices=[
+                            ("labor", "Mão de Obra"),
+                            ("material", "Materiais"),
+                            ("other", "Outras Despesas"),
+                        ],
+                        max_length=10,
+                        verbose_name="Grupo de Custo",
+                    ),
+                ),
+                (
+                    "total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=16,
+                        verbose_name="Total",
+                    ),
+                ),
+                (
+                    "entry_count",
+                    models.IntegerField(default=0, verbose_name="Lançamentos"),
+                ),
+                (
+                    "construction",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="employees.construction",
+                        verbose_name="Obra",
+                    ),
+                ),
+                (
+                    "construction_sector",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="employees.constructionsector",
+                        verbose_name="Setor da Obra",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Custo Mensal por Obra",
+                "verbose_name_plural": "Custos Mensais por Obra",
+                "indexes": [
+                    models.Index(fields=["month"], name="cost_rollup_month_idx"),
+                    models.Index(
+                        fields=["construction", "month"],
+                        name="cost_rollup_construction_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("construction_sector__isnull", False)),
+                        fields=(
+                            "month",
+                            "construction",
+                            "construction_sector",
+                            "cost_type",
+                        ),
+                        name="unique_cost_rollup_cell",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(
+                            ("construction__isnull", False),
+                            ("construction_sector__isnull", True),
+                        ),
+                        fields=("month", "construction", "cost_type"),
+                        name="unique_cost_rollup_cell_no_sector",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("construction__isnull", True)),
+                        fields=("month", "cost_type"),
+                        name="unique_cost_rollup_cell_no_construction",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(build_costs, migrations.RunPython.noop),
+    ]
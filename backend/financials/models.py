@@ -1,4 +1,5 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
 
 # Create your models here.
 
@@ -18,6 +19,17 @@ class Material(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # O saldo só muda por movimentações (UPDATE com F()); salvar o cadastro
+        # não pode sobrescrevê-lo com um valor lido antes
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "stock_quantity"
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["name"]
         verbose_name = "Material"
@@ -39,6 +51,20 @@ class ExpenseCategory(models.Model):
         verbose_name_plural = "Categorias de Despesas"
 
 
+# Grupo de cada tipo de custo no cubo por obra (ConstructionCostRollup):
+# pagamentos da folha, despesas por tipo e saídas sem despesa vinculada
+COST_GROUPS = {
+    "salary": "labor",
+    "meal_allowance": "labor",
+    "transport_allowance": "labor",
+    "material": "material",
+    "service": "other",
+    "utility": "other",
+    "other": "other",
+    "transaction": "other",
+}
+
+
 class Expense(models.Model):
     EXPENSE_TYPE_CHOICES = [
         ("material", "Material"),
@@ -68,6 +94,22 @@ class Expense(models.Model):
         blank=True,
         verbose_name="Categoria",
     )
+    construction = models.ForeignKey(
+        "employees.Construction",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="expenses",
+        verbose_name="Obra",
+    )
+    construction_sector = models.ForeignKey(
+        "employees.ConstructionSector",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="expenses",
+        verbose_name="Setor da Obra",
+    )
     quantity = models.PositiveIntegerField(default=1, verbose_name="Quantidade")
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
     expense_date = models.DateField(verbose_name="Data da Despesa")
@@ -77,17 +119,83 @@ class Expense(models.Model):
     def __str__(self):
         return self.description
 
+    def rollup_state(self):
+        """Contribuição da despesa para a célula mensal de ExpenseMonthlyRollup"""
+        return {
+            "month": self.expense_date.replace(day=1),
+            "expense_type": self.expense_type,
+            "category_id": self.category_id,
+            "total": self.amount,
+            "quantity": self.quantity,
+            "entry_count": 1,
+        }
+
+    def cost_state(self):
+        """Contribuição da despesa para o cubo de custos por obra"""
+        return {
+            "month": self.expense_date.replace(day=1),
+            "construction_id": self.construction_id,
+            "construction_sector_id": self.construction_sector_id,
+            "cost_type": self.expense_type,
+            "cost_group": COST_GROUPS[self.expense_type],
+            "total": self.amount,
+            "entry_count": 1,
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o estado carregado para calcular os deltas dos totais mensais
+        if not instance.get_deferred_fields():
+            instance._rollup_state = instance.rollup_state()
+            instance._cost_state = instance.cost_state()
+            instance._stock_state = instance.stock_state()
+        return instance
+
+    def stock_state(self):
+        """Entrada de estoque da despesa: (material, quantidade) ou None"""
+        if self.expense_type == "material" and self.material_id:
+            return (self.material_id, self.quantity)
+        return None
+
+    def clean(self):
+        # stock importa os modelos
+        from . import stock
+
+        # Formulários (admin) recusam a alteração que deixaria o estoque
+        # negativo antes de gravar
+        if self._state.adding:
+            before = None
+        elif hasattr(self, "_stock_state"):
+            before = self._stock_state
+        else:
+            before = stock.load_state(self)
+        stock.check_movements(
+            stock.expense_movements(self.pk, before, self.stock_state())
+        )
+
     def save(self, *args, **kwargs):
-        # Update material stock if expense type is material
-        if self.expense_type == "material" and self.material:
-            self.material.stock_quantity += self.quantity
-            self.material.save()
-        super().save(*args, **kwargs)
+        # A despesa, a movimentação de estoque e os totais mensais (sinais)
+        # são gravados juntos
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # Com savepoint: o estorno recusado (InsufficientStock) desfaz só a
+        # exclusão, sem invalidar a transação de quem chamou
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
     class Meta:
         ordering = ["-expense_date"]
         verbose_name = "Despesa"
         verbose_name_plural = "Despesas"
+        indexes = [
+            models.Index(fields=["expense_date"], name="expense_date_idx"),
+            models.Index(
+                fields=["expense_type", "expense_date"], name="expense_type_date_idx"
+            ),
+        ]
 
 
 class Transaction(models.Model):
@@ -133,14 +241,373 @@ class Transaction(models.Model):
         blank=True,
         verbose_name="Despesa Relacionada",
     )
+    construction = models.ForeignKey(
+        "employees.Construction",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="transactions",
+        verbose_name="Obra",
+    )
+    construction_sector = models.ForeignKey(
+        "employees.ConstructionSector",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="transactions",
+        verbose_name="Setor da Obra",
+    )
     notes = models.TextField(blank=True, null=True, verbose_name="Observações")
+    account = models.CharField(
+        max_length=50, blank=True, default="", verbose_name="Conta Bancária"
+    )
+    # Impressão digital das linhas importadas de extratos (ver statements.py)
+    content_hash = models.CharField(
+        max_length=64, null=True, blank=True, editable=False, verbose_name="Hash"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.description} - {self.amount}"
 
+    def rollup_state(self):
+        """Contribuição da transação para a célula mensal de TransactionMonthlyRollup"""
+        return {
+            "month": self.transaction_date.replace(day=1),
+            "transaction_type": self.transaction_type,
+            "payment_method": self.payment_method,
+            "category_id": self.category_id,
+            "total": self.amount,
+            "entry_count": 1,
+        }
+
+    def cost_state(self):
+        """
+        Contribuição para o cubo de custos por obra: só saídas sem despesa
+        vinculada, já que as vinculadas são contadas pela própria despesa.
+        """
+        if self.transaction_type != "expense" or self.expense_id:
+            return None
+        return {
+            "month": self.transaction_date.replace(day=1),
+            "construction_id": self.construction_id,
+            "construction_sector_id": self.construction_sector_id,
+            "cost_type": "transaction",
+            "cost_group": COST_GROUPS["transaction"],
+            "total": self.amount,
+            "entry_count": 1,
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o estado carregado para calcular os deltas dos totais mensais
+        if not instance.get_deferred_fields():
+            instance._rollup_state = instance.rollup_state()
+            instance._cost_state = instance.cost_state()
+        return instance
+
     class Meta:
         ordering = ["-transaction_date"]
         verbose_name = "Transação"
         verbose_name_plural = "Transações"
+        indexes = [
+            # Ordem do livro-razão e paginação por (data, id)
+            models.Index(
+                fields=["transaction_date", "id"], name="transaction_date_id_idx"
+            ),
+            models.Index(
+                fields=["transaction_type", "transaction_date"],
+                name="transaction_type_date_idx",
+            ),
+            # Versão dos dados da projeção de caixa (maior updated_at)
+            models.Index(fields=["updated_at"], name="transaction_updated_at_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash"],
+                condition=models.Q(content_hash__isnull=False),
+                name="unique_transaction_content_hash",
+            ),
+        ]
+
+
+class TransactionMonthlyRollup(models.Model):
+    """
+    Totais de transações por mês, tipo, forma de pagamento e categoria,
+    mantidos incrementalmente (ver ``financials.rollups``).
+    """
+
+    month = models.DateField(verbose_name="Mês")
+    transaction_type = models.CharField(
+        max_length=10,
+        choices=Transaction.TRANSACTION_TYPE_CHOICES,
+        verbose_name="Tipo de Transação",
+    )
+    payment_method = models.CharField(
+        max_length=20,
+        choices=Transaction.PAYMENT_METHOD_CHOICES,
+        verbose_name="Método de Pagamento",
+    )
+    # Ao excluir uma categoria as células são somadas às "sem categoria"
+    # antes da exclusão (ver signals), como o SET_NULL faz nas transações
+    category = models.ForeignKey(
+        ExpenseCategory,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Categoria",
+    )
+    total = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal("0.00"), verbose_name="Total"
+    )
+    entry_count = models.IntegerField(default=0, verbose_name="Lançamentos")
+
+    DIMENSIONS = ("month", "transaction_type", "payment_method", "category_id")
+    MEASURES = ("total", "entry_count")
+
+    class Meta:
+        verbose_name = "Total Mensal de Transações"
+        verbose_name_plural = "Totais Mensais de Transações"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "transaction_type", "payment_method", "category"],
+                condition=models.Q(category__isnull=False),
+                name="unique_transaction_rollup_cell",
+            ),
+            models.UniqueConstraint(
+                fields=["month", "transaction_type", "payment_method"],
+                condition=models.Q(category__isnull=True),
+                name="unique_transaction_rollup_cell_no_category",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["month"], name="transaction_rollup_month_idx"),
+        ]
+
+
+class ExpenseMonthlyRollup(models.Model):
+    """
+    Totais de despesas por mês, tipo de despesa e categoria, mantidos
+    incrementalmente (ver ``financials.rollups``).
+    """
+
+    month = models.DateField(verbose_name="Mês")
+    expense_type = models.CharField(
+        max_length=10,
+        choices=Expense.EXPENSE_TYPE_CHOICES,
+        verbose_name="Tipo de Despesa",
+    )
+    category = models.ForeignKey(
+        ExpenseCategory,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Categoria",
+    )
+    total = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal("0.00"), verbose_name="Total"
+    )
+    quantity = models.BigIntegerField(default=0, verbose_name="Quantidade")
+    entry_count = models.IntegerField(default=0, verbose_name="Lançamentos")
+
+    DIMENSIONS = ("month", "expense_type", "category_id")
+    MEASURES = ("total", "quantity", "entry_count")
+
+    class Meta:
+        verbose_name = "Total Mensal de Despesas"
+        verbose_name_plural = "Totais Mensais de Despesas"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "expense_type", "category"],
+                condition=models.Q(category__isnull=False),
+                name="unique_expense_rollup_cell",
+            ),
+            models.UniqueConstraint(
+                fields=["month", "expense_type"],
+                condition=models.Q(category__isnull=True),
+                name="unique_expense_rollup_cell_no_category",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["month"], name="expense_rollup_month_idx"),
+        ]
+
+
+class ConstructionCostRollup(models.Model):
+    """
+    Cubo de custos: totais por mês, obra, setor e tipo de custo (folha,
+    despesas e outras saídas), mantidos incrementalmente (ver
+    ``financials.rollups``).
+    """
+
+    COST_TYPE_CHOICES = [
+        ("salary", "Salário"),
+        ("meal_allowance", "Vale Refeição"),
+        ("transport_allowance", "Vale Transporte"),
+        *Expense.EXPENSE_TYPE_CHOICES,
+        ("transaction", "Outras Saídas"),
+    ]
+    COST_GROUP_CHOICES = [
+        ("labor", "Mão de Obra"),
+        ("material", "Materiais"),
+        ("other", "Outras Despesas"),
+    ]
+
+    month = models.DateField(verbose_name="Mês")
+    # Obras e setores com lançamentos não podem ser excluídos (PROTECT nas
+    # despesas e transações); pagamentos da folha guardam cópias que viram
+    # NULL, e as células são somadas às sem obra/setor antes (ver signals)
+    construction = models.ForeignKey(
+        "employees.Construction",
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Obra",
+    )
+    construction_sector = models.ForeignKey(
+        "employees.ConstructionSector",
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Setor da Obra",
+    )
+    cost_type = models.CharField(
+        max_length=20, choices=COST_TYPE_CHOICES, verbose_name="Tipo de Custo"
+    )
+    # Derivado do tipo; gravado para agrupar sem expressões
+    cost_group = models.CharField(
+        max_length=10, choices=COST_GROUP_CHOICES, verbose_name="Grupo de Custo"
+    )
+    total = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal("0.00"), verbose_name="Total"
+    )
+    entry_count = models.IntegerField(default=0, verbose_name="Lançamentos")
+
+    DIMENSIONS = (
+        "month",
+        "construction_id",
+        "construction_sector_id",
+        "cost_type",
+        "cost_group",
+    )
+    MEASURES = ("total", "entry_count")
+
+    class Meta:
+        verbose_name = "Custo Mensal por Obra"
+        verbose_name_plural = "Custos Mensais por Obra"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "construction", "construction_sector", "cost_type"],
+                condition=models.Q(construction_sector__isnull=False),
+                name="unique_cost_rollup_cell",
+            ),
+            models.UniqueConstraint(
+                fields=["month", "construction", "cost_type"],
+                condition=models.Q(
+                    construction__isnull=False, construction_sector__isnull=True
+                ),
+                name="unique_cost_rollup_cell_no_sector",
+            ),
+            models.UniqueConstraint(
+                fields=["month", "cost_type"],
+                condition=models.Q(construction__isnull=True),
+                name="unique_cost_rollup_cell_no_construction",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["month"], name="cost_rollup_month_idx"),
+            models.Index(
+                fields=["construction", "month"], name="cost_rollup_construction_idx"
+            ),
+        ]
+
+
+class StockMovement(models.Model):
+    """
+    Movimentação de estoque (somente inclusão). A quantidade tem sinal:
+    positiva para entradas, negativa para saídas. O saldo em
+    ``Material.stock_quantity`` é a soma das movimentações.
+    """
+
+    KIND_CHOICES = [
+        ("opening", "Saldo Inicial"),
+        ("purchase", "Entrada por Despesa"),
+        ("consumption", "Consumo em Obra"),
+        ("adjustment", "Ajuste de Despesa"),
+    ]
+
+    material = models.ForeignKey(
+        Material,
+        on_delete=models.CASCADE,
+        related_name="stock_movements",
+        verbose_name="Material",
+    )
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, verbose_name="Tipo")
+    quantity = models.IntegerField(verbose_name="Quantidade")
+    expense = models.ForeignKey(
+        Expense,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_movements",
+        verbose_name="Despesa",
+    )
+    construction = models.ForeignKey(
+        "employees.Construction",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_movements",
+        verbose_name="Obra",
+    )
+    note = models.CharField(max_length=200, blank=True, verbose_name="Observação")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.material_id} {self.get_kind_display()} {self.quantity:+d}"
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name = "Movimentação de Estoque"
+        verbose_name_plural = "Movimentações de Estoque"
+        indexes = [
+            # Soma das movimentações posteriores ao último checkpoint
+            models.Index(fields=["material", "id"], name="stock_movement_material_idx"),
+        ]
+
+
+class StockCheckpoint(models.Model):
+    """
+    Saldo de um material até uma movimentação. O saldo atual é o do último
+    checkpoint mais as movimentações seguintes, o que limita o recálculo.
+    """
+
+    material = models.ForeignKey(
+        Material,
+        on_delete=models.CASCADE,
+        related_name="stock_checkpoints",
+        verbose_name="Material",
+    )
+    last_movement_id = models.BigIntegerField(verbose_name="Última Movimentação")
+    balance = models.BigIntegerField(verbose_name="Saldo")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.material_id} até {self.last_movement_id}: {self.balance}"
+
+    class Meta:
+        ordering = ["-last_movement_id"]
+        verbose_name = "Checkpoint de Estoque"
+        verbose_name_plural = "Checkpoints de Estoque"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["material", "last_movement_id"],
+                name="unique_stock_checkpoint",
+            ),
+        ]
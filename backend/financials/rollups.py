@@ -0,0 +1,324 @@
+"""
+Totais mensais de transações e despesas mantidos incrementalmente.
+
+Cada transação contribui para uma célula (mês, tipo, forma de pagamento,
+categoria) de TransactionMonthlyRollup e cada despesa para uma célula (mês,
+tipo de despesa, categoria) de ExpenseMonthlyRollup. Os sinais aplicam a
+diferença entre o estado anterior e o novo com expressões F(), de modo que
+os relatórios leem apenas as células, e não as transações.
+
+O cubo de custos por obra (ConstructionCostRollup) segue o mesmo modelo com
+despesas e saídas sem despesa vinculada como fontes próprias; outros apps
+registram as suas com ``register_cost_source`` (a folha registra os
+pagamentos, que grava em lote pelo livro de pagamentos).
+"""
+
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import TruncMonth
+from .models import (
+    COST_GROUPS,
+    ConstructionCostRollup,
+    Expense,
+    ExpenseMonthlyRollup,
+    Transaction,
+    TransactionMonthlyRollup,
+)
+
+
+class RollupSpec:
+    """
+    Liga uma tabela de totais à tabela de origem. Tabelas com mais de uma
+    origem informam ``live``, que calcula as células diretamente.
+    """
+
+    def __init__(self, model, source=None, date_field=None, aggregates=None, live=None):
+        self.model = model
+        self.source = source
+        self.date_field = date_field
+        self.aggregates = aggregates
+        self.live = live
+
+    @property
+    def dimensions(self):
+        return self.model.DIMENSIONS
+
+    @property
+    def measures(self):
+        return self.model.MEASURES
+
+
+TRANSACTIONS = RollupSpec(
+    TransactionMonthlyRollup,
+    Transaction,
+    "transaction_date",
+    {"total": Sum("amount"), "entry_count": Count("id")},
+)
+EXPENSES = RollupSpec(
+    ExpenseMonthlyRollup,
+    Expense,
+    "expense_date",
+    {"total": Sum("amount"), "quantity": Sum("quantity"), "entry_count": Count("id")},
+)
+SPECS = {Transaction: TRANSACTIONS, Expense: EXPENSES}
+
+
+def _expense_costs():
+    return Expense.objects.annotate(
+        month=TruncMonth("expense_date"), cost_type=F("expense_type")
+    )
+
+
+def _transaction_costs():
+    return Transaction.objects.filter(
+        transaction_type="expense", expense__isnull=True
+    ).annotate(month=TruncMonth("transaction_date"), cost_type=Value("transaction"))
+
+
+# Funções que devolvem os querysets de origem do cubo de custos
+COST_SOURCES = [_expense_costs, _transaction_costs]
+
+
+def register_cost_source(source):
+    """
+    Registra uma origem do cubo de custos: função sem argumentos que devolve
+    um queryset com ``month``, ``cost_type``, ``construction_id``,
+    ``construction_sector_id`` e ``amount``. O app da origem aplica os deltas
+    com ``apply_transitions(COSTS, ...)`` ao gravar.
+    """
+    if source not in COST_SOURCES:
+        COST_SOURCES.append(source)
+
+
+def cost_live_values():
+    """Calcula as células do cubo de custos a partir das origens registradas"""
+    cells = {}
+    for source in COST_SOURCES:
+        queryset = source()
+        rows = (
+            queryset.values(
+                "month", "construction_id", "construction_sector_id", "cost_type"
+            )
+            .annotate(total=Sum("amount"), entry_count=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            cell = (
+                row["month"],
+                row["construction_id"],
+                row["construction_sector_id"],
+                row["cost_type"],
+                COST_GROUPS[row["cost_type"]],
+            )
+            cells[cell] = {"total": row["total"], "entry_count": row["entry_count"]}
+    return cells
+
+
+COSTS = RollupSpec(ConstructionCostRollup, live=cost_live_values)
+ALL_SPECS = (TRANSACTIONS, EXPENSES, COSTS)
+
+
+def load_state(instance):
+    """Lê do banco o estado persistido (None se o registro não existir)"""
+    current = type(instance).objects.filter(pk=instance.pk).first()
+    return current.rollup_state() if current else None
+
+
+def load_cost_state(instance):
+    """Lê do banco a contribuição persistida para o cubo de custos"""
+    current = type(instance).objects.filter(pk=instance.pk).first()
+    return current.cost_state() if current else None
+
+
+def _add(spec, cell, delta):
+    lookup = dict(zip(spec.dimensions, cell))
+    expressions = {field: F(field) + value for field, value in delta.items() if value}
+    if spec.model.objects.filter(**lookup).update(**expressions):
+        return
+    try:
+        with transaction.atomic():
+            # Primeira movimentação da célula: o delta é o próprio total
+            spec.model.objects.create(**lookup, **delta)
+    except IntegrityError:
+        # Outra transação criou a célula entre o UPDATE e o INSERT
+        spec.model.objects.filter(**lookup).update(**expressions)
+
+
+def apply_transitions(spec, transitions):
+    """
+    Aplica às células os deltas de uma sequência de (estado_anterior,
+    estado_novo), com estados de ``rollup_state()`` e None para registros
+    inexistentes. Há no máximo uma atualização por célula alterada.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(spec.measures, 0))
+    for before, after in transitions:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None:
+                continue
+            delta = deltas[tuple(state[field] for field in spec.dimensions)]
+            for field in spec.measures:
+                delta[field] += sign * state[field]
+
+    changed = {cell: delta for cell, delta in deltas.items() if any(delta.values())}
+    if not changed:
+        return
+    with transaction.atomic():
+        # Ordem fixa, para que transações concorrentes bloqueiem as células
+        # sempre na mesma sequência
+        for cell in sorted(changed, key=str):
+            _add(spec, cell, changed[cell])
+
+
+def merge_category(category_id):
+    """
+    Soma as células da categoria às células sem categoria e as remove,
+    espelhando o SET_NULL que a exclusão da categoria faz nos registros.
+    """
+    with transaction.atomic():
+        for spec in SPECS.values():
+            cells = spec.model.objects.filter(category_id=category_id)
+            rows = list(cells.values(*spec.dimensions, *spec.measures))
+            cells.delete()
+            apply_transitions(
+                spec,
+                [(None, {**row, "category_id": None}) for row in rows],
+            )
+
+
+def merge_construction(construction_id=None, sector_id=None):
+    """
+    Soma as células do cubo de uma obra (ou de um setor) às sem obra (ou sem
+    setor) e as remove, espelhando o SET_NULL nos pagamentos da folha.
+    """
+    if sector_id is not None:
+        cells = COSTS.model.objects.filter(construction_sector_id=sector_id)
+        moved = {"construction_sector_id": None}
+    else:
+        cells = COSTS.model.objects.filter(construction_id=construction_id)
+        moved = {"construction_id": None, "construction_sector_id": None}
+    with transaction.atomic():
+        rows = list(cells.values(*COSTS.dimensions, *COSTS.measures))
+        cells.delete()
+        apply_transitions(COSTS, [(None, {**row, **moved}) for row in rows])
+
+
+def live_values(spec):
+    """Calcula as células diretamente da tabela de origem"""
+    if spec.live is not None:
+        return spec.live()
+    rows = (
+        spec.source.objects.annotate(month=TruncMonth(spec.date_field))
+        .values(*spec.dimensions)
+        .annotate(**spec.aggregates)
+        .order_by()
+    )
+    return {
+        tuple(row[field] for field in spec.dimensions): {
+            field: row[field] for field in spec.measures
+        }
+        for row in rows
+    }
+
+
+def stored_values(spec):
+    """Lê as células gravadas, sem as que ficaram zeradas"""
+    return {
+        tuple(row[field] for field in spec.dimensions): {
+            field: row[field] for field in spec.measures
+        }
+        for row in spec.model.objects.filter(entry_count__gt=0).values(
+            *spec.dimensions, *spec.measures
+        )
+    }
+
+
+def diff_rollup(spec, stored=None, live=None):
+    """Lista as divergências (célula, campo, gravado, real) entre totais e origem"""
+    stored = stored_values(spec) if stored is None else stored
+    live = live_values(spec) if live is None else live
+
+    empty = dict.fromkeys(spec.measures, 0)
+    drift = []
+    for cell in sorted(set(stored) | set(live), key=str):
+        stored_measures = stored.get(cell, empty)
+        live_measures = live.get(cell, empty)
+        for field in spec.measures:
+            if stored_measures[field] != live_measures[field]:
+                drift.append(
+                    (cell, field, stored_measures[field], live_measures[field])
+                )
+    return drift
+
+
+@transaction.atomic
+def rebuild_rollup(spec, live=None):
+    """Reconstrói todas as células a partir da tabela de origem"""
+    live = live_values(spec) if live is None else live
+
+    spec.model.objects.all().delete()
+    spec.model.objects.bulk_create(
+        [
+            spec.model(**dict(zip(spec.dimensions, cell)), **measures)
+            for cell, measures in live.items()
+        ],
+        batch_size=1000,
+    )
+    return live
+
+
+def rebuild_all():
+    for spec in ALL_SPECS:
+        rebuild_rollup(spec)
+
+
+# Dimensões que podem ser usadas no agrupamento de cada resumo
+SUMMARY_DIMENSIONS = {
+    TRANSACTIONS: ("month", "transaction_type", "payment_method", "category"),
+    EXPENSES: ("month", "expense_type", "category"),
+    COSTS: ("month", "construction", "construction_sector", "cost_type", "cost_group"),
+}
+
+# Dimensões que são chaves estrangeiras: o resumo traz o id e o nome
+NAMED_DIMENSIONS = ("category", "construction", "construction_sector")
+
+
+def summarize(spec, group_by, start=None, end=None, filters=None):
+    """
+    Soma as células do período (meses ``start`` a ``end``, inclusive)
+    agrupando pelas dimensões pedidas. O custo depende do número de células,
+    e não do número de transações ou despesas.
+    """
+    cells = spec.model.objects.filter(entry_count__gt=0, **(filters or {}))
+    if start:
+        cells = cells.filter(month__gte=start)
+    if end:
+        cells = cells.filter(month__lte=end)
+
+    fields = []
+    for dimension in group_by:
+        if dimension in NAMED_DIMENSIONS:
+            fields += [f"{dimension}_id", f"{dimension}__name"]
+        else:
+            fields.append(dimension)
+    measures = {field: Sum(field) for field in spec.measures if field != "entry_count"}
+    if not fields:
+        # Sem dimensões: uma linha com o total do período (nenhuma se vazio)
+        row = cells.aggregate(**measures, count=Sum("entry_count"))
+        return [row] if row["count"] else []
+    rows = (
+        cells.values(*fields)
+        .annotate(**measures, count=Sum("entry_count"))
+        .order_by(*fields)
+    )
+
+    summary = []
+    for row in rows:
+        if "month" in row:
+            row["month"] = row["month"].strftime("%Y-%m")
+        for dimension in NAMED_DIMENSIONS:
+            if f"{dimension}_id" in row:
+                row[dimension] = row.pop(f"{dimension}_id")
+                row[f"{dimension}_name"] = row.pop(f"{dimension}__name")
+        summary.append(row)
+    return summary
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Material, Expense, ExpenseCategory, Transaction
+from employees.models import Construction
+from .models import Material, Expense, ExpenseCategory, StockMovement, Transaction
 
 
 class MaterialSerializer(serializers.ModelSerializer):
@@ -8,6 +9,33 @@ class MaterialSerializer(serializers.ModelSerializer):
         fields = "__all__"
         read_only_fields = ["created_at", "updated_at"]
 
+    def get_extra_kwargs(self):
+        extra_kwargs = super().get_extra_kwargs()
+        # O saldo informado no cadastro vira a movimentação inicial; depois
+        # ele muda apenas por movimentações de estoque
+        if self.instance is not None:
+            extra_kwargs["stock_quantity"] = {
+                **extra_kwargs.get("stock_quantity", {}),
+                "read_only": True,
+            }
+        return extra_kwargs
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = "__all__"
+
+
+class StockConsumptionSerializer(serializers.Serializer):
+    """Saída de material do estoque para uma obra"""
+
+    quantity = serializers.IntegerField(min_value=1)
+    construction = serializers.PrimaryKeyRelatedField(
+        queryset=Construction.objects.all(), required=False, allow_null=True
+    )
+    note = serializers.CharField(max_length=200, required=False, allow_blank=True)
+
 
 class ExpenseCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,9 +44,38 @@ class ExpenseCategorySerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ConstructionAttributionMixin:
+    """
+    Obra e setor de despesas e transações. O setor precisa ser da obra; sem
+    obra informada, ela é a do setor.
+    """
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        construction = attrs.get(
+            "construction", getattr(self.instance, "construction", None)
+        )
+        sector = attrs.get(
+            "construction_sector", getattr(self.instance, "construction_sector", None)
+        )
+        if sector is None:
+            return attrs
+        if construction is None and "construction" not in attrs:
+            attrs["construction"] = sector.construction
+        elif construction is None or sector.construction_id != construction.pk:
+            raise serializers.ValidationError(
+                {"construction_sector": "O setor não pertence à obra informada."}
+            )
+        return attrs
+
+
+class ExpenseSerializer(ConstructionAttributionMixin, serializers.ModelSerializer):
     material_name = serializers.ReadOnlyField(source="material.name", read_only=True)
     category_name = serializers.ReadOnlyField(source="category.name", read_only=True)
+    construction_name = serializers.ReadOnlyField(source="construction.name")
+    construction_sector_name = serializers.ReadOnlyField(
+        source="construction_sector.name"
+    )
 
     class Meta:
         model = Expense
@@ -30,6 +87,10 @@ class ExpenseSerializer(serializers.ModelSerializer):
             "material_name",
             "category",
             "category_name",
+            "construction",
+            "construction_name",
+            "construction_sector",
+            "construction_sector_name",
             "quantity",
             "amount",
             "expense_date",
@@ -39,11 +100,15 @@ class ExpenseSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(ConstructionAttributionMixin, serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source="category.name", read_only=True)
     expense_description = serializers.ReadOnlyField(
         source="expense.description", read_only=True
     )
+    construction_name = serializers.ReadOnlyField(source="construction.name")
+    construction_sector_name = serializers.ReadOnlyField(
+        source="construction_sector.name"
+    )
 
     class Meta:
         model = Transaction
@@ -58,8 +123,105 @@ class TransactionSerializer(serializers.ModelSerializer):
             "category_name",
             "expense",
             "expense_description",
+            "construction",
+            "construction_name",
+            "construction_sector",
+            "construction_sector_name",
             "notes",
+            "account",
             "created_at",
             "updated_at",
         ]
         read_only_fields = ["created_at", "updated_at"]
+
+
+class LedgerEntrySerializer(TransactionSerializer):
+    """Transação do livro-razão com o saldo acumulado após o lançamento"""
+
+    balance = serializers.DecimalField(max_digits=16, decimal_places=2, read_only=True)
+
+    class Meta(TransactionSerializer.Meta):
+        fields = TransactionSerializer.Meta.fields + ["balance"]
+
+
+class SummaryRowSerializer(serializers.Serializer):
+    """Linha do resumo financeiro; só as dimensões agrupadas aparecem"""
+
+    month = serializers.CharField(required=False)
+    transaction_type = serializers.CharField(required=False)
+    payment_method = serializers.CharField(required=False)
+    expense_type = serializers.CharField(required=False)
+    category = serializers.IntegerField(required=False)
+    category_name = serializers.CharField(required=False)
+    total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    quantity = serializers.IntegerField(required=False)
+    count = serializers.IntegerField()
+
+
+class SummaryTotalsSerializer(serializers.Serializer):
+    income = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expense = serializers.DecimalField(max_digits=16, decimal_places=2)
+    balance = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expenses = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class FinancialSummarySerializer(serializers.Serializer):
+    """Resumo do período calculado a partir dos totais mensais"""
+
+    start = serializers.CharField(allow_null=True)
+    end = serializers.CharField(allow_null=True)
+    group_by = serializers.ListField(child=serializers.CharField())
+    transactions = SummaryRowSerializer(many=True)
+    expenses = SummaryRowSerializer(many=True)
+    totals = SummaryTotalsSerializer()
+
+
+class CostRowSerializer(serializers.Serializer):
+    """Linha do cubo de custos; só as dimensões agrupadas aparecem"""
+
+    month = serializers.CharField(required=False)
+    construction = serializers.IntegerField(required=False, allow_null=True)
+    construction_name = serializers.CharField(required=False, allow_null=True)
+    construction_sector = serializers.IntegerField(required=False, allow_null=True)
+    construction_sector_name = serializers.CharField(required=False, allow_null=True)
+    cost_type = serializers.CharField(required=False)
+    cost_group = serializers.CharField(required=False)
+    total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    count = serializers.IntegerField()
+
+
+class CostTotalsSerializer(serializers.Serializer):
+    labor = serializers.DecimalField(max_digits=16, decimal_places=2)
+    material = serializers.DecimalField(max_digits=16, decimal_places=2)
+    other = serializers.DecimalField(max_digits=16, decimal_places=2)
+    total = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class ConstructionCostSerializer(serializers.Serializer):
+    """Cubo de custos por obra calculado a partir das células mensais"""
+
+    start = serializers.CharField(allow_null=True)
+    end = serializers.CharField(allow_null=True)
+    group_by = serializers.ListField(child=serializers.CharField())
+    rows = CostRowSerializer(many=True)
+    totals = CostTotalsSerializer()
+
+
+class LiveCategorySerializer(serializers.Serializer):
+    category = serializers.IntegerField(allow_null=True)
+    category_name = serializers.CharField(allow_null=True)
+    income = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expense = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expenses = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class LiveSummarySerializer(serializers.Serializer):
+    """Resumo enviado pelo WebSocket: saldo, mês corrente e categorias do mês"""
+
+    month = serializers.CharField()
+    balance = serializers.DecimalField(max_digits=16, decimal_places=2)
+    income = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expense = serializers.DecimalField(max_digits=16, decimal_places=2)
+    month_income = serializers.DecimalField(max_digits=16, decimal_places=2)
+    month_expense = serializers.DecimalField(max_digits=16, decimal_places=2)
+    categories = LiveCategorySerializer(many=True)
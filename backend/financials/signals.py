@@ -0,0 +1,111 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Expense, ExpenseCategory, Material, StockMovement, Transaction
+from . import rollups, stock
+
+
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Transaction)
+def capture_previous_state(sender, instance, **kwargs):
+    # Instâncias sem estado conhecido (ex.: carregadas com .only()) buscam o
+    # estado persistido para que o delta dos totais seja exato
+    if not instance._state.adding and not hasattr(instance, "_rollup_state"):
+        instance._rollup_state = rollups.load_state(instance)
+    if not instance._state.adding and not hasattr(instance, "_cost_state"):
+        instance._cost_state = rollups.load_cost_state(instance)
+    if (
+        sender is Expense
+        and not instance._state.adding
+        and not hasattr(instance, "_stock_state")
+    ):
+        instance._stock_state = stock.load_state(instance)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, "_rollup_state", None)
+    after = instance.rollup_state()
+    rollups.apply_transitions(rollups.SPECS[sender], [(before, after)])
+    instance._rollup_state = after
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    before = getattr(instance, "_rollup_state", None) or instance.rollup_state()
+    rollups.apply_transitions(rollups.SPECS[sender], [(before, None)])
+    instance._rollup_state = None
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Transaction)
+def update_costs_on_save(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, "_cost_state", None)
+    after = instance.cost_state()
+    rollups.apply_transitions(rollups.COSTS, [(before, after)])
+    instance._cost_state = after
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Transaction)
+def update_costs_on_delete(sender, instance, **kwargs):
+    before = getattr(instance, "_cost_state", None)
+    if before is None and not hasattr(instance, "_cost_state"):
+        before = instance.cost_state()
+    rollups.apply_transitions(rollups.COSTS, [(before, None)])
+    instance._cost_state = None
+
+
+@receiver(pre_delete, sender=Expense)
+def release_linked_transactions(sender, instance, **kwargs):
+    # O SET_NULL das transações vinculadas não dispara sinais; sem a despesa
+    # elas passam a contar no cubo como saídas próprias
+    linked = list(Transaction.objects.filter(expense=instance))
+    for item in linked:
+        item.expense_id = None
+    rollups.apply_transitions(
+        rollups.COSTS, [(None, item.cost_state()) for item in linked]
+    )
+
+
+@receiver(pre_delete, sender=ExpenseCategory)
+def merge_category_rollups(sender, instance, **kwargs):
+    rollups.merge_category(instance.pk)
+
+
+@receiver(pre_delete, sender="employees.Construction")
+def merge_construction_costs(sender, instance, **kwargs):
+    rollups.merge_construction(construction_id=instance.pk)
+
+
+@receiver(pre_delete, sender="employees.ConstructionSector")
+def merge_sector_costs(sender, instance, **kwargs):
+    rollups.merge_construction(sector_id=instance.pk)
+
+
+@receiver(post_save, sender=Expense)
+def record_stock_on_save(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, "_stock_state", None)
+    after = instance.stock_state()
+    stock.record_movements(stock.expense_movements(instance.pk, before, after))
+    instance._stock_state = after
+
+
+@receiver(post_delete, sender=Expense)
+def record_stock_on_delete(sender, instance, **kwargs):
+    before = getattr(instance, "_stock_state", None)
+    if before is None and not hasattr(instance, "_stock_state"):
+        before = instance.stock_state()
+    # A despesa já foi excluída: a movimentação não aponta para ela
+    stock.record_movements(stock.expense_movements(None, before, None))
+    instance._stock_state = None
+
+
+@receiver(post_save, sender=Material)
+def record_opening_stock(sender, instance, created, **kwargs):
+    # Saldo informado no cadastro vira a movimentação inicial do material
+    if created and instance.stock_quantity:
+        StockMovement.objects.create(
+            material=instance, kind="opening", quantity=instance.stock_quantity
+        )
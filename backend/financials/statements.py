@@ -0,0 +1,312 @@
+"""
+Importação de extratos bancários (CSV ou OFX) como transações.
+
+O arquivo é lido sob demanda e processado em blocos: em cada bloco os hashes
+das linhas são conferidos com uma única consulta e as transações novas são
+gravadas com ``bulk_create``, então a memória usada depende do tamanho do
+bloco (e das linhas de um mesmo dia) e não do extrato. Erros são reportados
+por linha sem interromper o lote.
+
+O ``content_hash`` de cada linha (conta, data, valor, descrição e a ocorrência
+dessa combinação no arquivo) tem índice único: reimportar um extrato, ou um
+extrato com período sobreposto, ignora as linhas já gravadas, enquanto
+lançamentos idênticos no mesmo dia continuam distintos pela ocorrência. As
+ocorrências são contadas só para o dia corrente, já que extratos vêm em
+ordem de data (crescente ou decrescente) e as linhas de um dia ficam juntas.
+"""
+
+import csv
+import functools
+import hashlib
+import io
+import re
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from django.db import IntegrityError, transaction
+from .models import Transaction
+from . import rollups
+
+IMPORT_FORMATS = ("csv", "ofx")
+
+# Nomes aceitos no cabeçalho do CSV, já normalizados por _normalize_header
+CSV_COLUMNS = {
+    "transaction_date": ("data", "date", "data_lancamento", "data_transacao"),
+    "amount": ("valor", "amount", "valor_rs", "montante"),
+    "description": ("descricao", "description", "historico", "lancamento", "memo"),
+    "payment_method": ("forma_pagamento", "payment_method", "tipo", "type"),
+}
+CSV_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y")
+
+# Tipos (TRNTYPE do OFX ou coluna de tipo do CSV) que definem a forma de
+# pagamento; CREDIT, DEBIT, OTHER e afins só indicam entrada ou saída
+PAYMENT_METHOD_TYPES = {
+    "XFER": "transfer",
+    "ATM": "cash",
+    "CASH": "cash",
+    "POS": "debit_card",
+}
+
+# Textos do banco (tipo e descrição) que indicam a forma de pagamento,
+# testados nesta ordem. "Crédito" e "débito" sozinhos não indicam cartão
+# (ex.: "CRÉDITO TED", "TRANSF CRÉDITO SALÁRIO"); só com CARTÃO/CARD.
+_CARD = r"(?:CART[AÃ]O|\bCARD\b)"
+PAYMENT_METHOD_PATTERNS = (
+    ("pix", re.compile(r"\bPIX\b")),
+    ("transfer", re.compile(r"\bTED\b|\bDOC\b|\bTEF\b|TRANSF|\bXFER\b")),
+    ("cash", re.compile(r"SAQUE|\bATM\b|DINHEIRO|\bCASH\b")),
+    ("debit_card", re.compile(rf"{_CARD}.*D[EÉ]BITO|D[EÉ]BITO.*{_CARD}")),
+    ("credit_card", re.compile(_CARD)),
+)
+
+MAX_AMOUNT = Decimal("99999999.99")
+DESCRIPTION_LENGTH = Transaction._meta.get_field("description").max_length
+
+
+def open_text(fileobj, encoding="utf-8-sig"):
+    """Abre um arquivo binário (upload, disco) como texto, aceitando BOM"""
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding=encoding, errors="replace", newline="")
+
+
+def map_payment_method(kind, description):
+    """
+    Forma de pagamento de Transaction a partir do tipo informado pelo banco
+    (se ele a definir) ou dos textos do tipo e da descrição
+    """
+    kind = (kind or "").strip().upper()
+    if kind in PAYMENT_METHOD_TYPES:
+        return PAYMENT_METHOD_TYPES[kind]
+    text = f"{kind} {description}".upper()
+    for method, pattern in PAYMENT_METHOD_PATTERNS:
+        if pattern.search(text):
+            return method
+    return "other"
+
+
+def parse_amount(value):
+    """Aceita ``1234.56``, ``-1.234,56``, ``R$ 10,00`` e ``(10,00)``"""
+    text = value.strip().replace("R$", "").replace(" ", "")
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()")
+    if "," in text:
+        # Formato brasileiro: ponto como milhar e vírgula decimal
+        text = text.replace(".", "").replace(",", ".")
+    amount = Decimal(text).quantize(Decimal("0.01"))
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError("Valor acima do limite.")
+    return -amount if negative else amount
+
+
+def _normalize_header(name):
+    name = name.strip().lower()
+    for accented, plain in zip("áàâãéêíóôõúç", "aaaaeeiooouc"):
+        name = name.replace(accented, plain)
+    return re.sub(r"[^a-z0-9]+", "_", name).strip("_")
+
+
+# Extratos repetem poucas datas; o strptime é feito uma vez por data
+@functools.lru_cache(maxsize=4096)
+def _parse_date(value, formats):
+    for date_format in formats:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {value!r}.")
+
+
+def _line(transaction_date, amount, description, kind=""):
+    description = " ".join(description.split())
+    return {
+        "transaction_date": transaction_date,
+        "amount": amount,
+        "description": description,
+        "payment_method": map_payment_method(kind, description),
+    }
+
+
+def _parse_csv(stream):
+    """CSV com cabeçalho; o separador (vírgula ou ponto e vírgula) é detectado"""
+    header = stream.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    names = [
+        _normalize_header(name)
+        for name in next(csv.reader([header], delimiter=delimiter), [])
+    ]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        found = [alias for alias in aliases if alias in names]
+        if found:
+            columns[field] = names.index(found[0])
+    missing = {"transaction_date", "amount", "description"} - set(columns)
+    if missing:
+        yield 1, None, "Colunas ausentes: " + ", ".join(sorted(missing)) + "."
+        return
+
+    for number, row in enumerate(csv.reader(stream, delimiter=delimiter), start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            yield number, _line(
+                _parse_date(row[columns["transaction_date"]], CSV_DATE_FORMATS),
+                parse_amount(row[columns["amount"]]),
+                row[columns["description"]],
+                row[columns["payment_method"]] if "payment_method" in columns else "",
+            ), None
+        except IndexError:
+            yield number, None, "Linha com colunas faltando."
+        except (ValueError, InvalidOperation) as error:
+            yield number, None, str(error) or "Valor inválido."
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _parse_ofx(stream):
+    """
+    Blocos ``<STMTTRN>`` de um OFX, em SGML (tags sem fechamento) ou XML. O
+    número informado é o da transação no arquivo.
+    """
+    number, fields = 0, None
+    for text in stream:
+        for closing, tag, value in _OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing:
+                    number += 1
+                    yield (number, *_ofx_line(fields or {}))
+                    fields = None
+                else:
+                    fields = {}
+            elif fields is not None and not closing:
+                fields[tag] = value.strip()
+
+
+def _ofx_line(fields):
+    name, memo = fields.get("NAME", ""), fields.get("MEMO", "")
+    description = f"{name} {memo}" if name and memo and name != memo else name or memo
+    try:
+        return (
+            _line(
+                _parse_date(fields.get("DTPOSTED", "")[:8], ("%Y%m%d",)),
+                parse_amount(fields.get("TRNAMT", "")),
+                description,
+                fields.get("TRNTYPE", ""),
+            ),
+            None,
+        )
+    except (ValueError, InvalidOperation) as error:
+        return None, str(error) or "Valor inválido."
+
+
+def parse_rows(stream, import_format):
+    """
+    Gera ``(número, dados, erro)`` para cada lançamento do extrato; ``dados``
+    tem data, valor (negativo para saídas), descrição e forma de pagamento.
+    """
+    if import_format == "ofx":
+        return _parse_ofx(stream)
+    return _parse_csv(stream)
+
+
+def content_hash(account, data, occurrence):
+    key = "|".join(
+        [
+            account,
+            data["transaction_date"].isoformat(),
+            str(data["amount"]),
+            data["description"].upper(),
+            str(occurrence),
+        ]
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class StatementImport:
+    """Estado de uma importação: transações criadas, duplicadas e erros"""
+
+    def __init__(self, account="", chunk_size=1000):
+        self.account = account
+        self.chunk_size = chunk_size
+        # Ocorrências das linhas do dia em leitura
+        self.current_date = None
+        self.occurrences = Counter()
+        self.created = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "failed": len(self.errors),
+            "errors": self.errors,
+        }
+
+    def run(self, rows):
+        chunk = []
+        for number, data, error in rows:
+            if error:
+                self.errors.append({"row": number, "errors": error})
+                continue
+            chunk.append(self._build(data))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        return self
+
+    def _build(self, data):
+        if data["transaction_date"] != self.current_date:
+            self.current_date = data["transaction_date"]
+            self.occurrences.clear()
+        key = (data["amount"], data["description"].upper())
+        self.occurrences[key] += 1
+        return Transaction(
+            description=data["description"][:DESCRIPTION_LENGTH]
+            or "Lançamento importado",
+            transaction_type="expense" if data["amount"] < 0 else "income",
+            amount=abs(data["amount"]),
+            transaction_date=data["transaction_date"],
+            payment_method=data["payment_method"],
+            account=self.account,
+            content_hash=content_hash(self.account, data, self.occurrences[key]),
+        )
+
+    def _import_chunk(self, chunk):
+        try:
+            created = self._save(chunk)
+        except IntegrityError:
+            # Importação concorrente do mesmo extrato gravou linhas entre a
+            # consulta e o INSERT; o bloco é refeito contra o estado atual
+            created = self._save(chunk)
+        self.created += created
+        self.duplicates += len(chunk) - created
+
+    def _save(self, chunk):
+        with transaction.atomic():
+            existing = set(
+                Transaction.objects.filter(
+                    content_hash__in=[item.content_hash for item in chunk]
+                ).values_list("content_hash", flat=True)
+            )
+            # Um hash repetido no bloco (dia fora de ordem no arquivo) conta
+            # como duplicado em vez de violar o índice único
+            new = []
+            for item in chunk:
+                if item.content_hash not in existing:
+                    existing.add(item.content_hash)
+                    new.append(item)
+            Transaction.objects.bulk_create(new)
+            # INSERTs em lote não disparam sinais; os totais mensais e o cubo de
+            # custos recebem os deltas aqui
+            rollups.apply_transitions(
+                rollups.TRANSACTIONS, [(None, item.rollup_state()) for item in new]
+            )
+            rollups.apply_transitions(
+                rollups.COSTS, [(None, item.cost_state()) for item in new]
+            )
+        return len(new)
@@ -0,0 +1,201 @@
+"""
+Livro de estoque dos materiais.
+
+Toda entrada (despesa de material) ou saída (consumo em obra) gera um
+StockMovement, que nunca é alterado; correções de despesas geram novas
+movimentações com a diferença. O saldo em ``Material.stock_quantity`` é
+atualizado com ``F()`` no mesmo UPDATE que confere se há saldo suficiente,
+sem leitura prévia, de modo que movimentações concorrentes não se perdem.
+
+Checkpoints guardam o saldo até uma movimentação; o recálculo soma apenas
+as movimentações posteriores ao último checkpoint.
+"""
+
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.core.exceptions import ValidationError
+from .models import Material, StockCheckpoint, StockMovement
+
+
+class InsufficientStock(ValidationError):
+    """Saída maior que o saldo do material (as views respondem 400)"""
+
+    def __init__(self):
+        super().__init__(
+            "Estoque insuficiente para a movimentação.", code="insufficient_stock"
+        )
+
+
+def _deltas(movements):
+    deltas = defaultdict(int)
+    for movement in movements:
+        deltas[movement["material_id"]] += movement["quantity"]
+    return deltas
+
+
+def check_movements(movements):
+    """
+    Confere, sem gravar, se há saldo para as saídas de ``movements``; usado
+    para validar formulários antes de gravar (uma consulta).
+    """
+    withdrawals = {pk: -delta for pk, delta in _deltas(movements).items() if delta < 0}
+    if not withdrawals:
+        return
+    balances = dict(
+        Material.objects.filter(pk__in=withdrawals).values_list("pk", "stock_quantity")
+    )
+    if any(balances.get(pk, 0) < quantity for pk, quantity in withdrawals.items()):
+        raise InsufficientStock()
+
+
+def record_movements(movements):
+    """
+    Lança ``movements`` (dicionários com material_id, kind, quantity e,
+    opcionalmente, expense_id, construction_id e note) e atualiza os saldos.
+
+    Saídas que deixariam o saldo negativo cancelam o lote com
+    InsufficientStock.
+    """
+    movements = [movement for movement in movements if movement["quantity"]]
+    if not movements:
+        return []
+
+    deltas = _deltas(movements)
+
+    with transaction.atomic():
+        # Ordem fixa de materiais evita deadlock entre lotes concorrentes
+        for material_id in sorted(deltas):
+            # Mesmo com delta zero o UPDATE bloqueia a linha do material até o
+            # commit, o que o checkpoint usa para não pular movimentações
+            delta = deltas[material_id]
+            materials = Material.objects.filter(pk=material_id)
+            if delta < 0:
+                materials = materials.filter(stock_quantity__gte=-delta)
+            if not materials.update(stock_quantity=F("stock_quantity") + delta):
+                raise InsufficientStock()
+        return StockMovement.objects.bulk_create(
+            StockMovement(**movement) for movement in movements
+        )
+
+
+def consume(material, quantity, construction=None, note=""):
+    """Registra a saída de ``quantity`` unidades para uma obra"""
+    (movement,) = record_movements(
+        [
+            {
+                "material_id": material.pk,
+                "kind": "consumption",
+                "quantity": -quantity,
+                "construction_id": construction.pk if construction else None,
+                "note": note,
+            }
+        ]
+    )
+    material.refresh_from_db(fields=["stock_quantity"])
+    return movement
+
+
+def expense_movements(expense_id, before, after):
+    """
+    Movimentações que levam o estoque do estado anterior de uma despesa ao
+    novo; estados são ``Expense.stock_state()`` (None sem entrada de estoque).
+    """
+    if before == after:
+        return []
+    if before and after and before[0] == after[0]:
+        material_id, quantity = after
+        changes = [(material_id, quantity - before[1], "adjustment")]
+    else:
+        changes = []
+        if before:
+            changes.append((before[0], -before[1], "adjustment"))
+        if after:
+            kind = "purchase" if before is None else "adjustment"
+            changes.append((after[0], after[1], kind))
+    return [
+        {
+            "material_id": material_id,
+            "kind": kind,
+            "quantity": quantity,
+            "expense_id": expense_id,
+        }
+        for material_id, quantity, kind in changes
+    ]
+
+
+def load_state(expense):
+    """Lê do banco a entrada de estoque persistida da despesa"""
+    current = type(expense).objects.filter(pk=expense.pk).first()
+    return current.stock_state() if current else None
+
+
+def computed_balances(material_ids=None):
+    """
+    Recalcula ``{material: (saldo, última movimentação)}`` a partir do
+    último checkpoint de cada material mais as movimentações seguintes.
+    """
+    latest = StockCheckpoint.objects.filter(material=OuterRef("pk")).order_by(
+        "-last_movement_id"
+    )
+    materials = Material.objects.annotate(
+        checkpoint_balance=Coalesce(Subquery(latest.values("balance")[:1]), 0),
+        checkpoint_movement=Coalesce(
+            Subquery(latest.values("last_movement_id")[:1]), 0
+        ),
+    )
+    if material_ids is not None:
+        materials = materials.filter(pk__in=material_ids)
+    rows = materials.annotate(
+        since=Coalesce(
+            Sum(
+                "stock_movements__quantity",
+                filter=Q(stock_movements__id__gt=F("checkpoint_movement")),
+            ),
+            0,
+        ),
+        last_movement=Coalesce(Max("stock_movements__id"), 0),
+    ).values_list("pk", "checkpoint_balance", "since", "last_movement")
+    return {
+        pk: (checkpoint_balance + since, last_movement)
+        for pk, checkpoint_balance, since, last_movement in rows
+    }
+
+
+def diff_balances(computed=None):
+    """Lista (material, saldo gravado, saldo pelas movimentações) divergentes"""
+    computed = computed_balances() if computed is None else computed
+    stored = dict(Material.objects.values_list("pk", "stock_quantity"))
+    return [
+        (pk, stored[pk], balance)
+        for pk, (balance, _) in sorted(computed.items())
+        if stored.get(pk) != balance
+    ]
+
+
+def checkpoint():
+    """
+    Grava um checkpoint para cada material com movimentações novas.
+
+    As linhas dos materiais são bloqueadas antes do cálculo: lotes em
+    andamento terminam antes, e nenhuma movimentação com id menor que o do
+    checkpoint pode ser confirmada depois dele.
+    """
+    with transaction.atomic():
+        list(Material.objects.select_for_update().order_by("pk").values_list("pk"))
+        computed = computed_balances()
+        latest = dict(
+            StockCheckpoint.objects.values("material_id")
+            .annotate(last=Max("last_movement_id"))
+            .values_list("material_id", "last")
+        )
+        return StockCheckpoint.objects.bulk_create(
+            [
+                StockCheckpoint(
+                    material_id=pk, last_movement_id=last_movement, balance=balance
+                )
+                for pk, (balance, last_movement) in computed.items()
+                if last_movement and last_movement != latest.get(pk)
+            ]
+        )
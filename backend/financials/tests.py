@@ -1,3 +1,934 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from employees.models import Construction, ConstructionSector, Department, Employee
+from gestao_api.testing import PlanCheckMixin, QueryBudgetMixin
+from .models import (
+    Expense,
+    ExpenseCategory,
+    ExpenseMonthlyRollup,
+    Material,
+    StockCheckpoint,
+    StockMovement,
+    Transaction,
+    TransactionMonthlyRollup,
+)
+from gestao_api.fanout import new_version, payload_fanout
+from .consumers import FinancialConsumer
+from . import live, rollups, statements, stock
 
-# Create your tests here.
+
+class TransactionExportTests(TestCase):
+    def setUp(self):
+        category = ExpenseCategory.objects.create(name="Aluguel")
+        for day in range(1, 6):
+            Transaction.objects.create(
+                description=f"Pagamento {day}",
+                transaction_type="expense" if day % 2 else "income",
+                amount=Decimal("100.00") * day,
+                transaction_date=date(2025, 3, day),
+                category=category,
+            )
+
+    def test_ndjson_export_streams_filtered_rows(self):
+        response = self.client.get(
+            reverse("transaction-export"),
+            {"export_format": "ndjson", "transaction_type": "expense"},
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["category_name"], "Aluguel")
+        self.assertEqual(rows[0]["transaction_date"], "2025-03-01")
+
+
+class FinancialIndexPlanTests(PlanCheckMixin, TestCase):
+    def setUp(self):
+        Transaction.objects.bulk_create(
+            Transaction(
+                description=f"Lançamento {index}",
+                transaction_type="income" if index % 3 else "expense",
+                amount=Decimal("10.00"),
+                transaction_date=date(2024, 1, 1) + timedelta(days=index % 700),
+            )
+            for index in range(2000)
+        )
+        Expense.objects.bulk_create(
+            Expense(
+                description=f"Despesa {index}",
+                expense_type="service" if index % 2 else "material",
+                amount=Decimal("10.00"),
+                expense_date=date(2024, 1, 1) + timedelta(days=index % 700),
+            )
+            for index in range(2000)
+        )
+
+    def test_key_queries_use_indexes(self):
+        period = (date(2025, 3, 1), date(2025, 3, 31))
+        for queryset in (
+            Transaction.objects.filter(transaction_date__range=period),
+            Transaction.objects.filter(
+                transaction_type="income", transaction_date__range=period
+            ),
+            Transaction.objects.all()[:20],
+            Transaction.objects.filter(transaction_date__gt=period[0]).order_by(
+                "transaction_date", "id"
+            )[:20],
+            Expense.objects.filter(expense_date__range=period),
+            Expense.objects.filter(expense_type="service", expense_date__range=period),
+            Expense.objects.all()[:20],
+        ):
+            with self.subTest(query=str(queryset.query)):
+                self.assertUsesIndex(queryset)
+
+
+class FinancialQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def seed(self, count):
+        offset = Expense.objects.count()
+        materials = Material.objects.bulk_create(
+            Material(name=f"Material {offset + index}", unit_price=Decimal("5.00"))
+            for index in range(max(count // 10, 1))
+        )
+        categories = ExpenseCategory.objects.bulk_create(
+            ExpenseCategory(name=f"Categoria {offset + index}")
+            for index in range(max(count // 10, 1))
+        )
+        expenses = Expense.objects.bulk_create(
+            Expense(
+                description=f"Despesa {offset + index}",
+                material=materials[index % len(materials)],
+                category=categories[index % len(categories)],
+                amount=Decimal("10.00"),
+                expense_date=date(2025, 3, 1),
+            )
+            for index in range(count)
+        )
+        Transaction.objects.bulk_create(
+            Transaction(
+                description=f"Pagamento {offset + index}",
+                transaction_type="expense",
+                amount=Decimal("10.00"),
+                transaction_date=date(2025, 3, 1),
+                category=expense.category,
+                expense=expense,
+            )
+            for index, expense in enumerate(expenses)
+        )
+        rollups.rebuild_all()
+
+    def urls(self):
+        expense = Expense.objects.first()
+        transaction = Transaction.objects.first()
+        return [
+            reverse("material-list"),
+            reverse("material-detail", args=[expense.material_id]),
+            reverse("expensecategory-list"),
+            reverse("expensecategory-detail", args=[expense.category_id]),
+            reverse("expense-list"),
+            reverse("expense-detail", args=[expense.pk]),
+            reverse("transaction-list"),
+            reverse("transaction-detail", args=[transaction.pk]),
+            reverse("financial-summary") + "?group_by=month,category",
+            reverse("transaction-ledger") + "?date=2025-03-01",
+            reverse("transaction-ledger") + "?ordering=-transaction_date",
+            reverse("construction-costs") + "?group_by=construction,month,cost_type",
+        ]
+
+    def test_endpoints_stay_within_budget(self):
+        self.assertEndpointsWithinBudget(self.seed, self.urls)
+
+
+class FinancialRollupTests(TestCase):
+    def setUp(self):
+        self.rent = ExpenseCategory.objects.create(name="Aluguel")
+        self.tools = ExpenseCategory.objects.create(name="Ferramentas")
+
+    def transaction(self, amount, day, transaction_type="expense", **fields):
+        return Transaction.objects.create(
+            description="Lançamento",
+            transaction_type=transaction_type,
+            amount=Decimal(amount),
+            transaction_date=day,
+            **fields,
+        )
+
+    def assertConsistent(self):
+        for spec in rollups.SPECS.values():
+            self.assertEqual(rollups.diff_rollup(spec), [])
+
+    def test_cells_follow_creates_updates_and_deletes(self):
+        first = self.transaction("100.00", date(2025, 1, 10), category=self.rent)
+        self.transaction("50.00", date(2025, 1, 20), category=self.rent)
+        self.transaction("70.00", date(2025, 2, 5), "income", payment_method="pix")
+        Expense.objects.create(
+            description="Martelo",
+            expense_type="other",
+            category=self.tools,
+            quantity=3,
+            amount=Decimal("45.00"),
+            expense_date=date(2025, 1, 8),
+        )
+
+        cell = TransactionMonthlyRollup.objects.get(
+            month=date(2025, 1, 1), category=self.rent
+        )
+        self.assertEqual((cell.total, cell.entry_count), (Decimal("150.00"), 2))
+        expense_cell = ExpenseMonthlyRollup.objects.get()
+        self.assertEqual(expense_cell.quantity, 3)
+
+        # Mudar o mês move o valor de uma célula para outra
+        first.transaction_date = date(2025, 2, 1)
+        first.amount = Decimal("120.00")
+        first.save()
+        cell.refresh_from_db()
+        self.assertEqual((cell.total, cell.entry_count), (Decimal("50.00"), 1))
+        self.assertConsistent()
+
+        first.delete()
+        Expense.objects.get().delete()
+        self.assertConsistent()
+
+    def test_deleting_category_merges_cells_into_uncategorized(self):
+        self.transaction("100.00", date(2025, 1, 10), category=self.rent)
+        self.transaction("30.00", date(2025, 1, 11))
+
+        self.rent.delete()
+
+        cell = TransactionMonthlyRollup.objects.get(category__isnull=True)
+        self.assertEqual((cell.total, cell.entry_count), (Decimal("130.00"), 2))
+        self.assertConsistent()
+
+    def test_summary_groups_cells_for_the_period(self):
+        self.transaction("100.00", date(2024, 12, 10), category=self.rent)
+        self.transaction("100.00", date(2025, 1, 10), category=self.rent)
+        self.transaction("40.00", date(2025, 1, 15), category=self.tools)
+        self.transaction("500.00", date(2025, 2, 1), "income")
+        Expense.objects.create(
+            description="Serviço",
+            expense_type="service",
+            amount=Decimal("80.00"),
+            expense_date=date(2025, 2, 3),
+        )
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("financial-summary"),
+                {"start": "2025-01", "end": "2025-02", "group_by": "month"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [
+                (row["month"], row["transaction_type"], row["total"], row["count"])
+                for row in data["transactions"]
+            ],
+            [("2025-01", "expense", "140.00", 2), ("2025-02", "income", "500.00", 1)],
+        )
+        self.assertEqual(data["expenses"][0]["total"], "80.00")
+        self.assertEqual(data["totals"]["income"], "500.00")
+        self.assertEqual(data["totals"]["balance"], "360.00")
+
+        response = self.client.get(
+            reverse("financial-summary"),
+            {"group_by": "category", "transaction_type": "expense"},
+        )
+        rows = response.json()["transactions"]
+        self.assertEqual(
+            [(row["category_name"], row["total"]) for row in rows],
+            [("Aluguel", "200.00"), ("Ferramentas", "40.00")],
+        )
+
+    def test_summary_rejects_invalid_parameters(self):
+        for params in (
+            {"group_by": "month,employee"},
+            {"start": "2025/01"},
+            {"start": "2025-03", "end": "2025-01"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(reverse("financial-summary"), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    description="Importada",
+                    transaction_type="income",
+                    amount=Decimal("10.00"),
+                    transaction_date=date(2025, 1, 1),
+                )
+            ]
+        )
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_financial_rollups", check=True, stdout=StringIO())
+        call_command("rebuild_financial_rollups", stdout=StringIO())
+        self.assertConsistent()
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.cement = Material.objects.create(name="Cimento", unit_price="30.00")
+        self.sand = Material.objects.create(name="Areia", unit_price="10.00")
+        self.construction = Construction.objects.create(
+            name="Obra Centro", address="Rua A", start_date=date(2025, 1, 1)
+        )
+
+    def purchase(self, material, quantity):
+        return Expense.objects.create(
+            description="Compra",
+            expense_type="material",
+            material=material,
+            quantity=quantity,
+            amount=Decimal("100.00"),
+            expense_date=date(2025, 1, 10),
+        )
+
+    def assertStock(self, material, quantity):
+        material.refresh_from_db()
+        self.assertEqual(material.stock_quantity, quantity)
+        self.assertEqual(stock.diff_balances(), [])
+
+    def test_expense_changes_apply_only_the_difference(self):
+        expense = self.purchase(self.cement, 10)
+        self.assertStock(self.cement, 10)
+
+        # Salvar de novo sem mudanças não soma a quantidade outra vez
+        expense.description = "Compra de cimento"
+        expense.save()
+        self.assertStock(self.cement, 10)
+
+        expense.quantity = 7
+        expense.save()
+        self.assertStock(self.cement, 7)
+
+        expense.material = self.sand
+        expense.save()
+        self.assertStock(self.cement, 0)
+        self.assertStock(self.sand, 7)
+
+        expense.delete()
+        self.assertStock(self.sand, 0)
+        self.assertEqual(
+            list(StockMovement.objects.order_by("id").values_list("kind", "quantity")),
+            [
+                ("purchase", 10),
+                ("adjustment", -3),
+                ("adjustment", -7),
+                ("adjustment", 7),
+                ("adjustment", -7),
+            ],
+        )
+
+    def test_consumption_cannot_overdraw(self):
+        self.purchase(self.cement, 5)
+        url = reverse("material-consume", args=[self.cement.pk])
+
+        response = self.client.post(
+            url, {"quantity": 3, "construction": self.construction.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["stock_quantity"], 2)
+
+        response = self.client.post(url, {"quantity": 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertStock(self.cement, 2)
+        self.assertEqual(StockMovement.objects.filter(kind="consumption").count(), 1)
+
+        # Editar o cadastro não sobrescreve o saldo
+        response = self.client.patch(
+            reverse("material-detail", args=[self.cement.pk]),
+            {"stock_quantity": 100, "unit_price": "32.00"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertStock(self.cement, 2)
+
+        response = self.client.get(reverse("material-movements", args=[self.cement.pk]))
+        self.assertEqual(
+            [row["kind"] for row in response.json()["results"]],
+            ["consumption", "purchase"],
+        )
+
+    def test_opening_stock_is_set_on_create_only(self):
+        with mock.patch("financials.views.MaterialViewSet._notify_update"):
+            response = self.client.post(
+                reverse("material-list"),
+                {"name": "Brita", "unit_price": "50.00", "stock_quantity": 12},
+            )
+        self.assertEqual(response.status_code, 201)
+        gravel = Material.objects.get(pk=response.json()["id"])
+        self.assertEqual(
+            list(gravel.stock_movements.values_list("kind", "quantity")),
+            [("opening", 12)],
+        )
+        self.assertStock(gravel, 12)
+
+    def test_deleting_expense_after_consumption_is_refused(self):
+        expense = self.purchase(self.cement, 5)
+        stock.consume(self.cement, 4)
+
+        # A exclusão e o estorno da entrada são desfeitos juntos
+        with self.assertRaises(stock.InsufficientStock), transaction.atomic():
+            expense.delete()
+        self.assertTrue(Expense.objects.filter(pk=expense.pk).exists())
+        self.assertStock(self.cement, 1)
+
+        response = self.client.delete(reverse("expense-detail", args=[expense.pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quantity", response.json())
+
+        # Formulários (admin) recusam a alteração antes de gravar
+        expense.quantity = 2
+        with self.assertRaises(ValidationError):
+            expense.full_clean()
+        expense.quantity = 4
+        expense.full_clean()
+        self.assertStock(self.cement, 1)
+
+    def test_opening_stock_and_checkpoints(self):
+        bricks = Material.objects.create(
+            name="Tijolo", unit_price="1.00", stock_quantity=100
+        )
+        self.purchase(bricks, 20)
+        call_command("checkpoint_stock", stdout=StringIO())
+        self.assertEqual(StockCheckpoint.objects.get(material=bricks).balance, 120)
+
+        stock.consume(bricks, 50)
+        self.assertEqual(stock.computed_balances([bricks.pk])[bricks.pk][0], 70)
+        self.assertStock(bricks, 70)
+
+        # Sem movimentações novas, nenhum checkpoint é gravado
+        call_command("checkpoint_stock", stdout=StringIO())
+        call_command("checkpoint_stock", stdout=StringIO())
+        self.assertEqual(StockCheckpoint.objects.filter(material=bricks).count(), 2)
+
+        Material.objects.filter(pk=bricks.pk).update(stock_quantity=1)
+        with self.assertRaises(CommandError):
+            call_command("checkpoint_stock", "--check", stdout=StringIO())
+
+
+class StatementImportTests(TestCase):
+    CSV = (
+        "Data;Histórico;Valor\n"
+        "05/03/2025;PIX RECEBIDO CLIENTE;1.500,00\n"
+        "06/03/2025;COMPRA CARTAO DEBITO LOJA;-45,90\n"
+        "06/03/2025;COMPRA CARTAO DEBITO LOJA;-45,90\n"
+        "07/03/2025;TED ENVIADA FORNECEDOR;-300,00\n"
+    )
+    OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>XFER<DTPOSTED>20250310120000[-3:BRT]<TRNAMT>-80.00
+<NAME>Aluguel<MEMO>Transferência aluguel</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT</TRNTYPE>
+<DTPOSTED>20250311</DTPOSTED>
+<TRNAMT>200.50</TRNAMT>
+<MEMO>PIX RECEBIDO</MEMO>
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKTRANLIST></OFX>
+"""
+
+    def upload(self, content, name="extrato.csv", **data):
+        file = SimpleUploadedFile(name, content.encode("utf-8"))
+        with mock.patch("financials.views.TransactionViewSet._notify_update") as notify:
+            response = self.client.post(
+                reverse("transaction-import-statement"),
+                {"file": file, "account": "itau-1234", **data},
+            )
+        return response, notify
+
+    def test_reimport_skips_lines_already_imported(self):
+        response, notify = self.upload(self.CSV)
+        self.assertEqual(response.status_code, 200)
+        # Lançamentos idênticos no mesmo arquivo são mantidos
+        self.assertEqual(response.json()["created"], 4)
+        notify.assert_called_once_with("transactions_imported")
+
+        rows = Transaction.objects.order_by("transaction_date", "id").values_list(
+            "transaction_type", "amount", "payment_method", "account"
+        )
+        self.assertEqual(
+            list(rows),
+            [
+                ("income", Decimal("1500.00"), "pix", "itau-1234"),
+                ("expense", Decimal("45.90"), "debit_card", "itau-1234"),
+                ("expense", Decimal("45.90"), "debit_card", "itau-1234"),
+                ("expense", Decimal("300.00"), "transfer", "itau-1234"),
+            ],
+        )
+        for spec in rollups.SPECS.values():
+            self.assertEqual(rollups.diff_rollup(spec), [])
+
+        # Extrato sobreposto: só a linha nova entra
+        extended = self.CSV + "08/03/2025;SAQUE 24H;-100,00\n"
+        response, notify = self.upload(extended)
+        self.assertEqual(
+            (response.json()["created"], response.json()["duplicates"]), (1, 4)
+        )
+        self.assertEqual(Transaction.objects.get(amount=100).payment_method, "cash")
+
+        response, notify = self.upload(self.CSV)
+        self.assertEqual(
+            (response.json()["created"], response.json()["duplicates"]), (0, 4)
+        )
+        notify.assert_not_called()
+
+    def test_ofx_sgml_and_xml_blocks(self):
+        response, _ = self.upload(self.OFX, name="extrato.ofx")
+        self.assertEqual(response.json()["created"], 2)
+        rent, pix = Transaction.objects.order_by("transaction_date")
+        self.assertEqual(
+            (rent.transaction_date, rent.amount, rent.payment_method),
+            (date(2025, 3, 10), Decimal("80.00"), "transfer"),
+        )
+        self.assertEqual(rent.description, "Aluguel Transferência aluguel")
+        self.assertEqual((pix.transaction_type, pix.payment_method), ("income", "pix"))
+
+    def test_payment_method_mapping(self):
+        cases = [
+            # Tipos genéricos do OFX só indicam entrada ou saída
+            (("CREDIT", "TED RECEBIDA FULANO"), "transfer"),
+            (("DEBIT", "TARIFA BANCARIA"), "other"),
+            (("DEBIT", "PAGAMENTO BOLETO"), "other"),
+            (("CREDIT", "PIX RECEBIDO"), "pix"),
+            (("XFER", "Aluguel"), "transfer"),
+            (("ATM", "Retirada"), "cash"),
+            (("POS", "Mercado"), "debit_card"),
+            # "Crédito"/"débito" sem cartão não são compras no cartão
+            (("", "TRANSF CREDITO SALARIO"), "transfer"),
+            (("", "CREDITO TED FULANO"), "transfer"),
+            (("", "COMPRA CARTAO DEBITO LOJA"), "debit_card"),
+            (("", "COMPRA CARTÃO CRÉDITO LOJA"), "credit_card"),
+            (("", "SAQUE 24H"), "cash"),
+        ]
+        for texts, method in cases:
+            with self.subTest(texts=texts):
+                self.assertEqual(statements.map_payment_method(*texts), method)
+
+    def test_invalid_lines_are_reported_without_stopping(self):
+        response, _ = self.upload(
+            "Data,Descrição,Valor\n2025-03-01,Teste,abc\n2025-03-02,Tarifa,-9.90\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(response.json()["errors"][0]["row"], 2)
+
+    def test_import_is_batched(self):
+        lines = ["Data,Descrição,Valor"] + [
+            f"2025-01-{index % 28 + 1:02d},Pagamento {index},-{index + 1}.00"
+            for index in range(250)
+        ]
+        rows = statements.parse_rows(StringIO("\n".join(lines)), "csv")
+        with CaptureQueriesContext(connection) as queries:
+            result = statements.StatementImport(chunk_size=50).run(rows)
+        self.assertEqual((result.created, result.duplicates), (250, 0))
+        # Só as ocorrências do último dia lido ficam em memória
+        self.assertEqual(len(result.occurrences), 1)
+        inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "financials_transaction"')
+        ]
+        self.assertEqual(len(inserts), 5)
+        self.assertEqual(rollups.diff_rollup(rollups.TRANSACTIONS), [])
+
+
+class TransactionLedgerTests(TestCase):
+    def setUp(self):
+        self.url = reverse("transaction-ledger")
+        for index in range(40):
+            Transaction.objects.create(
+                description=f"Lançamento {index}",
+                transaction_type="income" if index % 3 else "expense",
+                amount=Decimal("10.25") * (index % 7 + 1),
+                # Vários lançamentos por dia, ao longo de três meses
+                transaction_date=date(2025, 1, 20) + timedelta(days=index * 2 // 3),
+            )
+        balance = Decimal("0.00")
+        self.expected = []
+        for row in Transaction.objects.order_by("transaction_date", "id"):
+            sign = 1 if row.transaction_type == "income" else -1
+            balance += sign * row.amount
+            self.expected.append((row.pk, str(balance)))
+
+    def walk(self, url, link="next"):
+        rows = []
+        while url:
+            data = self.client.get(url).data
+            page = [(row["id"], row["balance"]) for row in data["results"]]
+            # Cada página vem na ordem pedida; para trás as páginas se antepõem
+            rows = page + rows if link == "previous" else rows + page
+            url = data[link]
+        return rows
+
+    def test_running_balance_across_pages(self):
+        rows = self.walk(self.url + "?page_size=7")
+
+        self.assertEqual(rows, self.expected)
+
+    def test_backwards_and_descending(self):
+        response = self.client.get(self.url, {"page_size": 7, "date": "2025-02-10"})
+        backwards = self.walk(response.data["previous"], link="previous")
+        descending = self.walk(self.url + "?page_size=7&ordering=-transaction_date")
+
+        position = self.expected.index(
+            (response.data["results"][0]["id"], response.data["results"][0]["balance"])
+        )
+        self.assertEqual(backwards, self.expected[:position])
+        self.assertEqual(descending, self.expected[::-1])
+
+    def test_seek_by_date(self):
+        first = Transaction.objects.filter(transaction_date__gte=date(2025, 2, 10))
+        first = first.order_by("transaction_date", "id").first()
+
+        response = self.client.get(self.url, {"date": "2025-02-10"})
+
+        position = [pk for pk, _ in self.expected].index(first.pk)
+        self.assertEqual(
+            [(row["id"], row["balance"]) for row in response.data["results"][:3]],
+            self.expected[position : position + 3],
+        )
+        self.assertEqual(
+            self.client.get(self.url, {"date": "10/02/2025"}).status_code, 400
+        )
+
+    def test_deep_page_costs_like_first(self):
+        url = self.url + "?page_size=5"
+        for _ in range(6):
+            url = self.client.get(url).data["next"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        # Saldo dos meses anteriores, saldo do mês até o cursor e a página
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(
+            [(row["id"], row["balance"]) for row in response.data["results"]],
+            self.expected[30:35],
+        )
+
+
+class ConstructionCostTests(TestCase):
+    def setUp(self):
+        self.alfa = self.construction("Alfa")
+        self.beta = self.construction("Beta")
+        self.structure = ConstructionSector.objects.create(
+            name="Estrutura", construction=self.alfa
+        )
+        self.finishing = ConstructionSector.objects.create(
+            name="Acabamento", construction=self.alfa
+        )
+        self.ana = self.employee("Ana", self.alfa, self.structure)
+        self.ana.mark_salary_as_paid()
+        self.employee("Bruno", self.beta).mark_meal_allowance_as_paid(Decimal("100.00"))
+
+        self.cement = Expense.objects.create(
+            description="Cimento",
+            expense_type="material",
+            amount=Decimal("1000.00"),
+            expense_date=date(2025, 3, 10),
+            construction=self.alfa,
+            construction_sector=self.structure,
+        )
+        Expense.objects.create(
+            description="Projeto",
+            expense_type="service",
+            amount=Decimal("300.00"),
+            expense_date=date(2025, 3, 12),
+            construction=self.beta,
+        )
+        self.transaction("Frete", "200.00", construction=self.alfa)
+        self.transaction("Tarifa", "50.00")
+        # Pagamento da despesa: contado pela própria despesa
+        self.transaction("Pagamento cimento", "1000.00", expense=self.cement)
+        self.transaction("Medição", "5000.00", "income", construction=self.alfa)
+
+    def construction(self, name):
+        return Construction.objects.create(
+            name=name, address="Rua Teste, 1", start_date=date(2025, 1, 1)
+        )
+
+    def employee(self, name, construction, sector=None):
+        return Employee.objects.create(
+            name=name,
+            department=Department.objects.get_or_create(name="Obras")[0],
+            position="Pedreiro",
+            construction=construction,
+            construction_sector=sector,
+            salary=Decimal("2500.00"),
+            payment_day=5,
+            meal_allowance=Decimal("400.00"),
+        )
+
+    def transaction(self, description, amount, transaction_type="expense", **fields):
+        return Transaction.objects.create(
+            description=description,
+            transaction_type=transaction_type,
+            amount=Decimal(amount),
+            transaction_date=date(2025, 3, 15),
+            **fields,
+        )
+
+    def costs(self, **params):
+        response = self.client.get(reverse("construction-costs"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cube_by_construction_and_group(self):
+        data = self.costs()
+
+        self.assertEqual(
+            {
+                (row["construction_name"], row["cost_group"]): row["total"]
+                for row in data["rows"]
+            },
+            {
+                (None, "other"): "50.00",
+                ("Alfa", "labor"): "2500.00",
+                ("Alfa", "material"): "1000.00",
+                ("Alfa", "other"): "200.00",
+                ("Beta", "labor"): "100.00",
+                ("Beta", "other"): "300.00",
+            },
+        )
+        self.assertEqual(
+            data["totals"],
+            {
+                "labor": "2600.00",
+                "material": "1000.00",
+                "other": "550.00",
+                "total": "4150.00",
+            },
+        )
+
+        data = self.costs(
+            construction=self.alfa.pk, group_by="construction_sector,month,cost_type"
+        )
+        self.assertEqual(
+            sorted(
+                (row["construction_sector_name"] or "", row["cost_type"], row["total"])
+                for row in data["rows"]
+            ),
+            [
+                ("", "transaction", "200.00"),
+                ("Estrutura", "material", "1000.00"),
+                ("Estrutura", "salary", "2500.00"),
+            ],
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse("construction-costs"), {"group_by": "x"}
+            ).status_code,
+            400,
+        )
+
+    def test_cells_follow_changes(self):
+        project = Expense.objects.get(description="Projeto")
+        project.construction = self.alfa
+        project.construction_sector = self.finishing
+        project.save()
+        # Sem a despesa, o pagamento vinculado passa a ser uma saída própria
+        self.cement.delete()
+        self.ana.reset_all_payment_status()
+
+        carla = self.employee("Carla", self.alfa, self.finishing)
+        carla.mark_salary_as_paid()
+        carla.construction_sector = None
+        carla.save()
+        project.construction_sector = None
+        project.save()
+        # Setor só com pagamentos da folha: as células vão para a obra
+        self.finishing.delete()
+
+        self.assertEqual(rollups.diff_rollup(rollups.COSTS), [])
+        self.assertEqual(self.costs(group_by="")["totals"]["total"], "4150.00")
+
+    def test_sector_must_belong_to_construction(self):
+        url = reverse("expense-list")
+        data = {
+            "description": "Tinta",
+            "expense_type": "material",
+            "amount": "80.00",
+            "expense_date": "2025-03-20",
+            "construction_sector": self.structure.pk,
+        }
+
+        response = self.client.post(url, {**data, "construction": self.beta.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("construction_sector", response.data)
+
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["construction"], self.alfa.pk)
+        self.assertEqual(response.data["construction_sector_name"], "Estrutura")
+
+    def test_linked_construction_and_sector_cannot_be_deleted(self):
+        gama = self.construction("Gama")
+        sector = ConstructionSector.objects.create(name="Fundação", construction=gama)
+        self.transaction("Sondagem", "900.00", construction=gama)
+        self.transaction("Estacas", "700.00", construction_sector=sector)
+
+        for url in (
+            reverse("constructionsector-detail", args=[sector.pk]),
+            reverse("construction-detail", args=[gama.pk]),
+        ):
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("transação", str(response.data))
+        self.assertEqual(
+            self.client.delete(
+                reverse("constructionsector-detail", args=[self.structure.pk])
+            ).status_code,
+            400,
+        )
+        self.assertTrue(ConstructionSector.objects.filter(pk=sector.pk).exists())
+
+        Transaction.objects.filter(construction=gama).update(construction=None)
+        Transaction.objects.filter(construction_sector=sector).delete()
+        response = self.client.delete(reverse("construction-detail", args=[gama.pk]))
+        self.assertEqual(response.status_code, 204)
+
+
+@override_settings(REALTIME_BROADCAST_WINDOW_MS=0)
+class FinancialLiveTests(TransactionTestCase):
+    def setUp(self):
+        self.rent = ExpenseCategory.objects.create(name="Aluguel")
+        today = date.today()
+        self.income = Transaction.objects.create(
+            description="Medição",
+            transaction_type="income",
+            amount=Decimal("1000.00"),
+            transaction_date=today,
+        )
+        self.expense = Transaction.objects.create(
+            description="Aluguel",
+            transaction_type="expense",
+            amount=Decimal("300.00"),
+            transaction_date=today,
+            category=self.rent,
+        )
+        Transaction.objects.create(
+            description="Mês anterior",
+            transaction_type="expense",
+            amount=Decimal("50.00"),
+            transaction_date=today.replace(day=1) - timedelta(days=1),
+        )
+
+    def tearDown(self):
+        payload_fanout.clear()
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(
+            FinancialConsumer.as_asgi(), "/ws/financials/"
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def test_summary_reads_monthly_cells(self):
+        with self.assertNumQueries(3):
+            summary = live.compute_summary()
+
+        self.assertEqual(summary["balance"], "650.00")
+        self.assertEqual(summary["month_income"], "1000.00")
+        self.assertEqual(summary["month_expense"], "300.00")
+        self.assertEqual(
+            [(row["category_name"], row["expense"]) for row in summary["categories"]],
+            [("Aluguel", "300.00"), (None, "0.00")],
+        )
+
+    def test_notifications_carry_row_references(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)("financials", channel_name)
+
+        self.client.delete(reverse("transaction-detail", args=[self.income.pk]))
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(event["deleted_ids"], [f"transaction:{self.income.pk}"])
+
+        cement = Material.objects.create(name="Cimento", unit_price="30.00")
+        self.client.post(
+            reverse("expense-list"),
+            {
+                "description": "Cimento",
+                "expense_type": "material",
+                "material": cement.pk,
+                "quantity": 2,
+                "amount": "60.00",
+                "expense_date": "2025-01-10",
+            },
+        )
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        expense = Expense.objects.get()
+        self.assertEqual(
+            sorted(event["ids"]), [f"expense:{expense.pk}", f"material:{cement.pk}"]
+        )
+
+    async def test_consumer_pushes_summary_and_changed_rows(self):
+        communicator = await self.connect()
+        initial = await communicator.receive_json_from()
+        self.assertEqual(initial["type"], "summary_update")
+        self.assertEqual(initial["data"]["balance"], "650.00")
+
+        self.expense.amount = Decimal("400.00")
+        await database_sync_to_async(self.expense.save)()
+        await get_channel_layer().group_send(
+            "financials",
+            {
+                "type": "financial_message",
+                "message": "Transaction data changed",
+                "action": "transaction_updated",
+                "ids": [f"transaction:{self.expense.pk}"],
+                "deleted_ids": ["expense:999"],
+                "version": new_version(),
+            },
+        )
+
+        self.assertEqual((await communicator.receive_json_from())["type"], "update")
+        upsert = await communicator.receive_json_from()
+        self.assertEqual(upsert["type"], "transaction_upsert")
+        self.assertEqual(upsert["data"][0]["amount"], "400.00")
+        delete = await communicator.receive_json_from()
+        self.assertEqual(delete, {"type": "expense_delete", "data": [999]})
+        summary = await communicator.receive_json_from()
+        self.assertEqual(summary["type"], "summary_update")
+        self.assertEqual(summary["data"]["balance"], "550.00")
+
+        await communicator.disconnect()
+
+    async def test_client_messages_are_not_relayed(self):
+        sender = await self.connect()
+        listener = await self.connect()
+        await sender.receive_json_from()
+        await listener.receive_json_from()
+
+        await sender.send_json_to({"message": "spam", "action": "transaction_created"})
+        self.assertEqual((await sender.receive_json_from())["type"], "error")
+        self.assertTrue(await listener.receive_nothing())
+
+        await sender.send_json_to({"type": "get_summary"})
+        self.assertEqual((await sender.receive_json_from())["type"], "summary_update")
+        self.assertTrue(await listener.receive_nothing())
+
+        await sender.disconnect()
+        await listener.disconnect()
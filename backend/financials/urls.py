@@ -5,6 +5,8 @@ from .views import (
     ExpenseViewSet,
     ExpenseCategoryViewSet,
     TransactionViewSet,
+    FinancialSummaryView,
+    ConstructionCostView,
 )
 
 router = DefaultRouter()
@@ -15,4 +17,6 @@ router.register(r"transactions", TransactionViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("summary/", FinancialSummaryView.as_view(), name="financial-summary"),
+    path("costs/", ConstructionCostView.as_view(), name="construction-costs"),
 ]
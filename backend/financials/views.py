@@ -2,80 +2,165 @@ from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
 from django.utils import timezone
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from datetime import datetime
+from gestao_api.broadcast import broadcaster
+from gestao_api.exports import ExportMixin
 from typing import Any
-from .models import Material, Expense, ExpenseCategory, Transaction
+from decimal import Decimal
+from .models import Material, Expense, ExpenseCategory, StockMovement, Transaction
+from . import live, rollups, stock
+from .ledger import TransactionLedgerPagination
+from .statements import IMPORT_FORMATS, StatementImport, open_text, parse_rows
 from .serializers import (
     MaterialSerializer,
     ExpenseSerializer,
     ExpenseCategorySerializer,
+    ConstructionCostSerializer,
+    FinancialSummarySerializer,
+    LedgerEntrySerializer,
+    StockConsumptionSerializer,
+    StockMovementSerializer,
     TransactionSerializer,
 )
 
 
-class MaterialViewSet(viewsets.ModelViewSet):
+class StockErrorMixin:
+    """Responde 400 quando a movimentação deixaria o estoque negativo"""
+
+    def handle_exception(self, exc):
+        if isinstance(exc, stock.InsufficientStock):
+            exc = ValidationError({"quantity": exc.messages})
+        return super().handle_exception(exc)
+
+
+class MaterialViewSet(StockErrorMixin, viewsets.ModelViewSet):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
+    query_budget = {"list": 2, "retrieve": 1, "movements": 3}
+
+    @action(detail=True, methods=["post"])
+    def consume(self, request, pk=None):
+        """Registra o consumo do material em uma obra"""
+        material = self.get_object()
+        serializer = StockConsumptionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        stock.consume(
+            material,
+            serializer.validated_data["quantity"],
+            construction=serializer.validated_data.get("construction"),
+            note=serializer.validated_data.get("note", ""),
+        )
+        self._notify_update("stock_consumed", ids=[material.pk])
+        return Response(MaterialSerializer(material).data)
+
+    @action(detail=True, methods=["get"])
+    def movements(self, request, pk=None):
+        """Histórico de movimentações de estoque do material"""
+        movements = StockMovement.objects.filter(material=self.get_object())
+        page = self.paginate_queryset(movements)
+        serializer = StockMovementSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        self._notify_update("material_created")
+        self._notify_update("material_created", ids=[instance.pk])
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        self._notify_update("material_updated")
+        self._notify_update("material_updated", ids=[instance.pk])
 
     def perform_destroy(self, instance):
+        material_id = instance.pk
         instance.delete()
-        self._notify_update("material_deleted")
+        self._notify_update("material_deleted", deleted_ids=[material_id])
 
-    def _notify_update(self, action):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
+    def _notify_update(self, action, ids=(), deleted_ids=()):
+        # Referências "material:<id>" para os deltas do FinancialConsumer
+        broadcaster.notify(
             "financials",
-            {
-                "type": "financial_message",
-                "message": "Material data changed",
-                "action": action,
-            },
+            "financial_message",
+            "Material data changed",
+            action,
+            ids=[live.ref("material", pk) for pk in ids],
+            deleted_ids=[live.ref("material", pk) for pk in deleted_ids],
         )
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
-    queryset = Expense.objects.all()
+class ExpenseViewSet(StockErrorMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = Expense.objects.select_related(
+        "material", "category", "construction", "construction_sector"
+    )
     serializer_class = ExpenseSerializer
-    filterset_fields = ["expense_type", "material", "expense_date"]
+    query_budget = {"list": 2, "retrieve": 1}
+    filterset_fields = [
+        "expense_type",
+        "material",
+        "expense_date",
+        "construction",
+        "construction_sector",
+    ]
+    export_filename = "despesas"
+    export_fields = (
+        ("id", "id"),
+        ("description", "description"),
+        ("expense_type", "expense_type"),
+        ("material", "material_id"),
+        ("material_name", "material__name"),
+        ("category", "category_id"),
+        ("category_name", "category__name"),
+        ("construction", "construction_id"),
+        ("construction_name", "construction__name"),
+        ("construction_sector", "construction_sector_id"),
+        ("construction_sector_name", "construction_sector__name"),
+        ("quantity", "quantity"),
+        ("amount", "amount"),
+        ("expense_date", "expense_date"),
+        ("created_at", "created_at"),
+        ("updated_at", "updated_at"),
+    )
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        self._notify_update("expense_created")
+        self._notify_update("expense_created", instance.pk, [instance.material_id])
 
     def perform_update(self, serializer):
+        previous_material_id = serializer.instance.material_id
         instance = serializer.save()
-        self._notify_update("expense_updated")
+        self._notify_update(
+            "expense_updated",
+            instance.pk,
+            [previous_material_id, instance.material_id],
+        )
 
     def perform_destroy(self, instance):
+        expense_id = instance.pk
         instance.delete()
-        self._notify_update("expense_deleted")
+        self._notify_update(
+            "expense_deleted", None, [instance.material_id], deleted_id=expense_id
+        )
 
-    def _notify_update(self, action):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
+    def _notify_update(self, action, expense_id, material_ids, deleted_id=None):
+        # Despesas de material alteram o estoque: o material também vai no delta
+        ids = [live.ref("material", pk) for pk in set(material_ids) if pk]
+        if expense_id:
+            ids.append(live.ref("expense", expense_id))
+        broadcaster.notify(
             "financials",
-            {
-                "type": "financial_message",
-                "message": "Expense data changed",
-                "action": action,
-            },
+            "financial_message",
+            "Expense data changed",
+            action,
+            ids=ids,
+            deleted_ids=[live.ref("expense", deleted_id)] if deleted_id else [],
         )
 
 
 class ExpenseCategoryViewSet(viewsets.ModelViewSet):
     queryset = ExpenseCategory.objects.all()
     serializer_class = ExpenseCategorySerializer
+    query_budget = {"list": 2, "retrieve": 1}
 
     def perform_create(self, serializer):
         instance = serializer.save()
@@ -90,41 +175,263 @@ class ExpenseCategoryViewSet(viewsets.ModelViewSet):
         self._notify_update("category_deleted")
 
     def _notify_update(self, action):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
-            "financials",
-            {
-                "type": "financial_message",
-                "message": "Category data changed",
-                "action": action,
-            },
+        broadcaster.notify(
+            "financials", "financial_message", "Category data changed", action
         )
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
-    queryset = Transaction.objects.all()
+class TransactionViewSet(ExportMixin, viewsets.ModelViewSet):
+    queryset = Transaction.objects.select_related(
+        "category", "expense", "construction", "construction_sector"
+    )
     serializer_class = TransactionSerializer
-    filterset_fields = ["category", "transaction_type"]
+    query_budget = {"list": 2, "retrieve": 1, "ledger": 3}
+    filterset_fields = [
+        "category",
+        "transaction_type",
+        "construction",
+        "construction_sector",
+    ]
+    export_filename = "transacoes"
+    export_fields = (
+        ("id", "id"),
+        ("description", "description"),
+        ("transaction_type", "transaction_type"),
+        ("amount", "amount"),
+        ("transaction_date", "transaction_date"),
+        ("payment_method", "payment_method"),
+        ("category", "category_id"),
+        ("category_name", "category__name"),
+        ("expense", "expense_id"),
+        ("expense_description", "expense__description"),
+        ("construction", "construction_id"),
+        ("construction_name", "construction__name"),
+        ("construction_sector", "construction_sector_id"),
+        ("construction_sector_name", "construction_sector__name"),
+        ("notes", "notes"),
+        ("account", "account"),
+        ("created_at", "created_at"),
+        ("updated_at", "updated_at"),
+    )
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        self._notify_update("transaction_created")
+        self._notify_update("transaction_created", ids=[instance.pk])
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_statement(self, request):
+        """
+        Importa um extrato bancário (campo ``file``, CSV ou OFX) da conta
+        ``account``; linhas já importadas são ignoradas.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "Envie o arquivo do extrato."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        import_format = request.query_params.get(
+            "import_format", upload.name.rsplit(".", 1)[-1].lower()
+        )
+        if import_format not in IMPORT_FORMATS:
+            raise ValidationError(
+                {"import_format": f"Formato inválido. Use: {', '.join(IMPORT_FORMATS)}"}
+            )
+        try:
+            stream = open_text(
+                upload.file, request.query_params.get("encoding", "utf-8-sig")
+            )
+        except LookupError:
+            raise ValidationError({"encoding": "Codificação desconhecida."})
+
+        result = StatementImport(account=request.data.get("account", "")).run(
+            parse_rows(stream, import_format)
+        )
+        # Uma única notificação para o extrato inteiro, sem as linhas: os
+        # clientes recebem o resumo e recarregam a lista se precisarem
+        if result.created:
+            self._notify_update("transactions_imported")
+        return Response(result.as_dict())
+
+    @action(detail=False, methods=["get"])
+    def ledger(self, request):
+        """
+        Livro-razão: todas as transações em ordem cronológica com o saldo
+        acumulado após cada uma. Os filtros da listagem não se aplicam, já
+        que o saldo é sempre o do livro inteiro.
+        """
+        paginator = TransactionLedgerPagination()
+        page = paginator.paginate_queryset(self.queryset, request, view=self)
+        serializer = LedgerEntrySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        self._notify_update("transaction_updated")
+        self._notify_update("transaction_updated", ids=[instance.pk])
 
     def perform_destroy(self, instance):
+        transaction_id = instance.pk
         instance.delete()
-        self._notify_update("transaction_deleted")
+        self._notify_update("transaction_deleted", deleted_ids=[transaction_id])
 
-    def _notify_update(self, action):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(  # type: ignore
+    def _notify_update(self, action, ids=(), deleted_ids=()):
+        broadcaster.notify(
             "financials",
-            {
-                "type": "financial_message",
-                "message": "Transaction data changed",
-                "action": action,
+            "financial_message",
+            "Transaction data changed",
+            action,
+            ids=[live.ref("transaction", pk) for pk in ids],
+            deleted_ids=[live.ref("transaction", pk) for pk in deleted_ids],
+        )
+
+
+def parse_month(value, field):
+    """Converte ``AAAA-MM`` no primeiro dia do mês (None se não informado)"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise ValidationError({field: "Use o formato AAAA-MM."})
+
+
+def parse_period(params):
+    """Meses ``?start=`` e ``?end=`` (AAAA-MM) de um resumo"""
+    start = parse_month(params.get("start"), "start")
+    end = parse_month(params.get("end"), "end")
+    if start and end and start > end:
+        raise ValidationError({"end": "O fim deve ser igual ou posterior ao início."})
+    return start, end
+
+
+def parse_group_by(value, known):
+    """Lista de dimensões separadas por vírgula, todas entre ``known``"""
+    group_by = [
+        dimension.strip() for dimension in value.split(",") if dimension.strip()
+    ]
+    unknown = [dimension for dimension in group_by if dimension not in known]
+    if unknown:
+        raise ValidationError(
+            {"group_by": f"Dimensões inválidas: {', '.join(unknown)}."}
+        )
+    return group_by
+
+
+class FinancialSummaryView(APIView):
+    """
+    Resumo do período a partir dos totais mensais: transações e despesas
+    agrupadas por ``?group_by=`` (month, transaction_type, payment_method,
+    expense_type, category), entre ``?start=`` e ``?end=`` (AAAA-MM).
+    """
+
+    query_budget = {"get": 2}
+
+    def get(self, request):
+        params = request.query_params
+        start, end = parse_period(params)
+
+        group_by = parse_group_by(
+            params.get("group_by", "month"),
+            set(rollups.SUMMARY_DIMENSIONS[rollups.TRANSACTIONS])
+            | set(rollups.SUMMARY_DIMENSIONS[rollups.EXPENSES]),
+        )
+
+        filters = {}
+        for field in ("transaction_type", "payment_method", "expense_type"):
+            if params.get(field):
+                filters[field] = params[field]
+        if params.get("category"):
+            try:
+                filters["category_id"] = int(params["category"])
+            except ValueError:
+                raise ValidationError({"category": "Informe o id da categoria."})
+
+        # Receitas e despesas não se somam: as transações sempre separam o tipo
+        transaction_group = group_by
+        if "transaction_type" not in group_by:
+            transaction_group = group_by + ["transaction_type"]
+        transactions = self._summarize(
+            rollups.TRANSACTIONS, transaction_group, start, end, filters
+        )
+        expenses = self._summarize(rollups.EXPENSES, group_by, start, end, filters)
+
+        by_type = {"income": Decimal("0.00"), "expense": Decimal("0.00")}
+        for row in transactions:
+            by_type[row["transaction_type"]] += row["total"]
+        summary = {
+            "start": params.get("start"),
+            "end": params.get("end"),
+            "group_by": group_by,
+            "transactions": transactions,
+            "expenses": expenses,
+            "totals": {
+                "income": by_type["income"],
+                "expense": by_type["expense"],
+                "balance": by_type["income"] - by_type["expense"],
+                "expenses": sum((row["total"] for row in expenses), Decimal("0.00")),
             },
+        }
+        return Response(FinancialSummarySerializer(summary).data)
+
+    def _summarize(self, spec, group_by, start, end, filters):
+        dimensions = rollups.SUMMARY_DIMENSIONS[spec]
+        fields = {
+            "category_id" if dimension == "category" else dimension
+            for dimension in dimensions
+        }
+        return rollups.summarize(
+            spec,
+            [dimension for dimension in group_by if dimension in dimensions],
+            start,
+            end,
+            {field: value for field, value in filters.items() if field in fields},
         )
+
+
+class ConstructionCostView(APIView):
+    """
+    Cubo de custos por obra a partir das células mensais: pagamentos da
+    folha, despesas e saídas sem despesa vinculada, agrupados por
+    ``?group_by=`` (construction, construction_sector, month, cost_type,
+    cost_group) entre ``?start=`` e ``?end=`` (AAAA-MM). Aceita os filtros
+    ``?construction=``, ``?construction_sector=``, ``?cost_type=`` e
+    ``?cost_group=``.
+    """
+
+    query_budget = {"get": 2}
+
+    def get(self, request):
+        params = request.query_params
+        start, end = parse_period(params)
+        group_by = parse_group_by(
+            params.get("group_by", "construction,cost_group"),
+            rollups.SUMMARY_DIMENSIONS[rollups.COSTS],
+        )
+
+        filters = {}
+        for field in ("construction", "construction_sector"):
+            if params.get(field):
+                try:
+                    filters[f"{field}_id"] = int(params[field])
+                except ValueError:
+                    raise ValidationError({field: "Informe o id."})
+        for field in ("cost_type", "cost_group"):
+            if params.get(field):
+                filters[field] = params[field]
+
+        rows = rollups.summarize(rollups.COSTS, group_by, start, end, filters)
+        totals = dict.fromkeys(["labor", "material", "other"], Decimal("0.00"))
+        for row in rollups.summarize(
+            rollups.COSTS, ["cost_group"], start, end, filters
+        ):
+            totals[row["cost_group"]] += row["total"]
+        totals["total"] = sum(totals.values(), Decimal("0.00"))
+
+        costs = {
+            "start": params.get("start"),
+            "end": params.get("end"),
+            "group_by": group_by,
+            "rows": rows,
+            "totals": totals,
+        }
+        return Response(ConstructionCostSerializer(costs).data)
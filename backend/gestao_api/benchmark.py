@@ -0,0 +1,67 @@
+"""
+Medição de cenários de benchmark: latência, consultas SQL e pico de memória.
+
+Os resultados são dicionários simples, prontos para ``json.dump``, para que
+execuções diferentes possam ser comparadas.
+"""
+
+import platform
+import statistics
+import time
+import tracemalloc
+import django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(samples, fraction):
+    """Percentil pelo método do posto mais próximo"""
+    ordered = sorted(samples)
+    index = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def measure(run, iterations=20, warmup=2):
+    """
+    Executa ``run`` repetidamente e resume latência (ms), consultas por
+    execução e o pico de memória alocada (KiB) em uma execução extra.
+    """
+    for _ in range(warmup):
+        run()
+
+    latencies, queries = [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            run()
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+
+    # O tracemalloc distorce a latência, então a memória é medida à parte
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+        "queries": statistics.median_low(queries),
+        "queries_max": max(queries),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def environment():
+    """Metadados da execução, gravados junto com os resultados"""
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
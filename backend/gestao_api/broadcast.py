@@ -0,0 +1,144 @@
+"""
+Broadcaster com coalescência de eventos para os grupos de WebSocket.
+
+Rajadas de alterações (ações em massa no admin, importações, vários
+pagamentos seguidos) são agrupadas em uma janela configurável
+(``REALTIME_BROADCAST_WINDOW_MS``). Ao final da janela é enviado um único
+evento com a união dos ids afetados e das ações, limitando o recálculo nos
+consumers a um por janela, independente da taxa de escrita.
+"""
+
+import asyncio
+import atexit
+import threading
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from .fanout import new_version
+from .metrics import timed_group_send
+
+
+class PendingEvent:
+    """Evento acumulado de um grupo durante a janela de coalescência"""
+
+    def __init__(self, event_type, message):
+        self.event_type = event_type
+        self.message = message
+        self.actions = []
+        self.ids = set()
+        self.deleted_ids = set()
+
+    def merge(self, message, action, ids, deleted_ids):
+        self.message = message
+        if action not in self.actions:
+            self.actions.append(action)
+        self.deleted_ids.update(deleted_ids)
+        self.ids.update(ids)
+        self.ids.difference_update(self.deleted_ids)
+
+    def as_event(self):
+        return {
+            "type": self.event_type,
+            "message": self.message,
+            "action": self.actions[-1],
+            "actions": list(self.actions),
+            "ids": sorted(self.ids),
+            "deleted_ids": sorted(self.deleted_ids),
+            "version": new_version(),
+        }
+
+
+async def _running_loop():
+    return asyncio.get_running_loop()
+
+
+class CoalescingBroadcaster:
+    def __init__(self, window_ms=None):
+        self._window_ms = window_ms
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timers = {}
+
+    @property
+    def window(self):
+        window_ms = self._window_ms
+        if window_ms is None:
+            window_ms = getattr(settings, "REALTIME_BROADCAST_WINDOW_MS", 100)
+        return max(window_ms, 0) / 1000
+
+    def notify(self, group, event_type, message, action, ids=(), deleted_ids=()):
+        """
+        Agenda o envio de uma alteração para o grupo.
+
+        O evento só entra na janela após o commit da transação corrente, para
+        que os consumers nunca leiam dados ainda não confirmados.
+        """
+        ids = list(ids)
+        deleted_ids = list(deleted_ids)
+        transaction.on_commit(
+            lambda: self._enqueue(group, event_type, message, action, ids, deleted_ids)
+        )
+
+    def _enqueue(self, group, event_type, message, action, ids, deleted_ids):
+        with self._lock:
+            pending = self._pending.get(group)
+            opens_window = pending is None
+            if opens_window:
+                pending = self._pending[group] = PendingEvent(event_type, message)
+            pending.merge(message, action, ids, deleted_ids)
+
+        if not opens_window:
+            return
+
+        if not self.window:
+            self.flush(group)
+            return
+
+        # Dentro do servidor ASGI o envio é agendado no event loop principal,
+        # onde vivem as filas da camada de canais; fora dele (WSGI, comandos
+        # de gerenciamento) um timer em thread faz o envio
+        loop = async_to_sync(_running_loop)()
+        if loop.is_running():
+            loop.call_soon_threadsafe(
+                loop.call_later, self.window, self._flush_in_loop, group
+            )
+        else:
+            timer = threading.Timer(self.window, self.flush, args=[group])
+            timer.daemon = True
+            with self._lock:
+                self._timers[group] = timer
+            timer.start()
+
+    def _pop(self, group):
+        with self._lock:
+            pending = self._pending.pop(group, None)
+            timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        return pending.as_event() if pending else None
+
+    def _flush_in_loop(self, group):
+        event = self._pop(group)
+        if event is not None:
+            asyncio.ensure_future(timed_group_send(get_channel_layer(), group, event))
+
+    def flush(self, group):
+        """Envia imediatamente o evento acumulado do grupo, se houver"""
+        event = self._pop(group)
+        if event is not None:
+            async_to_sync(timed_group_send)(get_channel_layer(), group, event)
+        return event
+
+    def flush_all(self):
+        """Envia todos os eventos pendentes (ex.: ao final de um comando)"""
+        with self._lock:
+            groups = list(self._pending)
+        return [event for event in map(self.flush, groups) if event]
+
+
+# Instância compartilhada por views, admin e comandos
+broadcaster = CoalescingBroadcaster()
+
+# Processos que terminam dentro da janela (comandos, scripts) ainda notificam
+atexit.register(broadcaster.flush_all)
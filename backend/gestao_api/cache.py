@@ -0,0 +1,55 @@
+"""
+Cache LRU local ao processo, com expiração e invalidação por versão.
+
+As chaves pertencem a um namespace (ex.: o rótulo de um modelo) com um
+número de versão. ``invalidate(namespace)`` incrementa a versão e descarta,
+de forma preguiçosa, todas as entradas gravadas na versão anterior; o TTL
+limita por quanto tempo outro processo pode enxergar um valor desatualizado.
+"""
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class VersionedLRUCache:
+    def __init__(self, max_entries=1024, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = defaultdict(int)
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return default
+            value, version, expires_at = entry
+            if version != self._versions[namespace] or expires_at <= self._clock():
+                del self._entries[(namespace, key)]
+                return default
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._entries[(namespace, key)] = (
+                value,
+                self._versions[namespace],
+                self._clock() + self.ttl,
+            )
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace):
+        """Descarta as entradas do namespace incrementando sua versão"""
+        with self._lock:
+            self._versions[namespace] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
@@ -0,0 +1,76 @@
+"""
+Fan-out de payloads WebSocket calculados uma única vez por processo.
+
+Cada evento enviado a um grupo recebe uma versão (``version``). O primeiro
+consumer que processa a versão executa as consultas e o ``json.dumps``; os
+demais consumers do mesmo processo aguardam e reutilizam os mesmos bytes.
+"""
+
+import asyncio
+import json
+import uuid
+from collections import OrderedDict
+from rest_framework.utils.encoders import JSONEncoder
+from .instrumentation import timed_serialization
+
+
+def encode(message_type, data):
+    """Codifica uma mensagem para o WebSocket (Decimal e datas via DRF)"""
+    with timed_serialization():
+        return json.dumps({"type": message_type, "data": data}, cls=JSONEncoder)
+
+
+def new_version():
+    """Gera a versão que identifica um evento enviado ao grupo"""
+    return uuid.uuid4().hex
+
+
+class PayloadFanout:
+    """Cache LRU de payloads codificados, indexado pela versão do evento"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get_or_build(self, key, build):
+        """
+        Retorna o resultado de ``build()`` para a chave, calculando-o uma vez.
+
+        ``build`` é uma corrotina; chamadas concorrentes com a mesma chave
+        aguardam a primeira execução. Sem chave o cálculo não é compartilhado.
+        """
+        if key is None:
+            return await build()
+
+        loop = asyncio.get_running_loop()
+        future = self._entries.get(key)
+
+        # Futures de outro event loop só podem ser reaproveitados se concluídos
+        if future is not None and (future.done() or future.get_loop() is loop):
+            self._entries.move_to_end(key)
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._entries[key] = future
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        try:
+            result = await build()
+        except BaseException as exc:
+            # Falhas não ficam em cache: a próxima chamada tenta novamente
+            if self._entries.get(key) is future:
+                del self._entries[key]
+            future.set_exception(exc)
+            future.exception()  # evita o aviso de exceção não recuperada
+            raise
+
+        future.set_result(result)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Instância compartilhada pelos consumers do processo
+payload_fanout = PayloadFanout()
@@ -0,0 +1,312 @@
+"""
+Instrumentação opcional de requisições HTTP e mensagens WebSocket.
+
+Com ``REQUEST_INSTRUMENTATION`` ativo, cada requisição (InstrumentationMiddleware)
+e cada mensagem tratada por um consumer (InstrumentedConsumerMixin) mede o
+número de consultas SQL, o tempo no banco, o tempo de serialização e o tempo
+total. Os valores vão para o cabeçalho ``Server-Timing`` (HTTP), para uma
+linha de log estruturada e para histogramas em memória por endpoint.
+
+A medição atual fica em uma ContextVar, que o asgiref propaga para as threads
+do ``database_sync_to_async``; por isso as consultas são registradas por um
+execute_wrapper instalado em toda conexão criada, e não só na da requisição.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Limites (ms) dos buckets dos histogramas de tempo
+DURATION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = ContextVar("instrumentation_timing", default=None)
+_connected = False
+
+
+def is_enabled():
+    return getattr(settings, "REQUEST_INSTRUMENTATION", False)
+
+
+class Timing:
+    """Medições de uma requisição ou mensagem"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.total_ms = 0.0
+
+    def add_serialization(self, started, db_ms_before):
+        """Soma o trecho iniciado em ``started``, sem o tempo gasto no banco"""
+        elapsed = (time.perf_counter() - started) * 1000
+        self.serialize_ms += elapsed - (self.db_ms - db_ms_before)
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_ms:.2f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize_ms:.2f}, "
+            f"total;dur={self.total_ms:.2f}"
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: soma consultas e tempo no banco na medição atual"""
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.db_ms += (time.perf_counter() - start) * 1000
+
+
+def install(db_connection):
+    """Instala o record_query na conexão, uma única vez"""
+    if record_query not in db_connection.execute_wrappers:
+        db_connection.execute_wrappers.insert(0, record_query)
+
+
+def install_current():
+    install(connection)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+def enable():
+    """Passa a registrar consultas em todas as conexões novas"""
+    global _connected
+    if not _connected:
+        connection_created.connect(
+            _on_connection_created, dispatch_uid="gestao_api.instrumentation"
+        )
+        _connected = True
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Soma o bloco ao tempo de serialização da medição atual, descontando as
+    consultas executadas dentro dele (querysets avaliados pelo serializer).
+    """
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started, db_ms_before = time.perf_counter(), timing.db_ms
+    try:
+        yield
+    finally:
+        timing.add_serialization(started, db_ms_before)
+
+
+@contextmanager
+def measure(endpoint):
+    """
+    Mede o bloco como uma chamada de ``endpoint`` e registra o resultado.
+    ``endpoint`` pode ser uma função, chamada ao final do bloco.
+    """
+    timing = Timing()
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+        timing.finish()
+        if callable(endpoint):
+            endpoint = endpoint()
+        histograms.observe(endpoint, timing)
+        logger.info(
+            "endpoint=%s queries=%d db_ms=%.2f serialize_ms=%.2f total_ms=%.2f",
+            endpoint,
+            timing.queries,
+            timing.db_ms,
+            timing.serialize_ms,
+            timing.total_ms,
+            extra={
+                "endpoint": endpoint,
+                "queries": timing.queries,
+                "db_ms": round(timing.db_ms, 3),
+                "serialize_ms": round(timing.serialize_ms, 3),
+                "total_ms": round(timing.total_ms, 3),
+            },
+        )
+
+
+class RollingHistogram:
+    """
+    Histograma com buckets acumulados desde o início do processo e uma
+    janela com as últimas ``window`` amostras para percentis recentes.
+    """
+
+    def __init__(self, bounds=DURATION_BUCKETS_MS, window=1000):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentile(self, fraction):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    def cumulative_counts(self):
+        """Pares (limite, total até o limite), com ``inf`` por último"""
+        total, pairs = 0, []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class HistogramRegistry:
+    """Histogramas de tempo total, banco, serialização e consultas por endpoint"""
+
+    METRICS = ("total_ms", "db_ms", "serialize_ms", "queries")
+    QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+    def __init__(self, window=None):
+        self._window = window
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    @property
+    def window(self):
+        if self._window is not None:
+            return self._window
+        return getattr(settings, "INSTRUMENTATION_HISTOGRAM_WINDOW", 1000)
+
+    def _new_histograms(self):
+        return {
+            metric: RollingHistogram(
+                self.QUERY_BUCKETS if metric == "queries" else DURATION_BUCKETS_MS,
+                self.window,
+            )
+            for metric in self.METRICS
+        }
+
+    def observe(self, endpoint, timing):
+        with self._lock:
+            endpoint_histograms = self._endpoints.get(endpoint)
+            if endpoint_histograms is None:
+                endpoint_histograms = self._endpoints[endpoint] = self._new_histograms()
+            for metric in self.METRICS:
+                endpoint_histograms[metric].observe(getattr(timing, metric))
+
+    def items(self):
+        """Cópia rasa de ``{endpoint: {métrica: histograma}}`` para leitura"""
+        with self._lock:
+            return list(self._endpoints.items())
+
+    def snapshot(self):
+        """Resumo por endpoint: contagem, média e p50/p95/p99 da janela"""
+        summary = {}
+        # Sob o lock, para que a janela não mude enquanto é ordenada
+        with self._lock:
+            for endpoint, endpoint_histograms in self._endpoints.items():
+                summary[endpoint] = {
+                    metric: {
+                        "count": histogram.count,
+                        "mean": round(histogram.sum / histogram.count, 3),
+                        "p50": histogram.percentile(0.50),
+                        "p95": histogram.percentile(0.95),
+                        "p99": histogram.percentile(0.99),
+                    }
+                    for metric, histogram in endpoint_histograms.items()
+                }
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+# Histogramas compartilhados pelo processo
+histograms = HistogramRegistry()
+
+
+def http_endpoint(request):
+    """
+    Nome estável do endpoint: método e nome da rota. Caminhos sem rota
+    ficam juntos, para que URLs arbitrárias não criem histogramas novos.
+    """
+    match = getattr(request, "resolver_match", None)
+    route = (match.view_name if match else None) or "unmatched"
+    return f"{request.method} {route}"
+
+
+class InstrumentationMiddleware:
+    """
+    Mede cada requisição HTTP e adiciona o cabeçalho ``Server-Timing``.
+    Só é carregado com ``REQUEST_INSTRUMENTATION`` ativo.
+    """
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        enable()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        install_current()
+        # O endpoint só é conhecido depois da resolução da URL
+        with measure(lambda: http_endpoint(request)) as timing:
+            response = self.get_response(request)
+        response["Server-Timing"] = timing.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        # A renderização (DRF Response -> JSON) conta como serialização
+        timing = _current.get()
+        if timing is not None:
+            started, db_ms_before = time.perf_counter(), timing.db_ms
+            response.add_post_render_callback(
+                lambda rendered: timing.add_serialization(started, db_ms_before)
+            )
+        return response
+
+
+class InstrumentedConsumerMixin:
+    """
+    Mede cada mensagem tratada pelo consumer (frames recebidos do cliente e
+    eventos do grupo) como o endpoint ``WS <caminho> <tipo>``.
+    """
+
+    async def dispatch(self, message):
+        if not is_enabled():
+            return await super().dispatch(message)
+        if not getattr(self, "_instrumented", False):
+            enable()
+            # A conexão já aberta na thread do database_sync_to_async não passa
+            # pelo connection_created; a instalação roda nessa mesma thread
+            await sync_to_async(install_current)()
+            self._instrumented = True
+        with measure(f"WS {self.scope['path']} {message['type']}"):
+            return await super().dispatch(message)
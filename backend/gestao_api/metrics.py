@@ -0,0 +1,295 @@
+"""
+Métricas do processo no formato texto do Prometheus (endpoint ``/metrics``).
+
+Contadores e histogramas são atualizados nos pontos quentes (broadcaster,
+``database_sync_to_async`` e MetricsMiddleware) com uma soma sob lock; o
+estado da camada de canais (consumers por grupo e filas por canal) é lido
+apenas na coleta. A coleta percorre só estruturas em memória, sem consultas
+ao banco, e pode ser feita a cada poucos segundos.
+"""
+
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from channels.db import DatabaseSyncToAsync
+from channels.layers import get_channel_layer
+from django.http import HttpResponse
+from .instrumentation import RollingHistogram, http_endpoint
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites (s) dos buckets de latência
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Família de métricas com rótulos; os valores ficam por combinação de rótulos"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Gera ``(nome, rótulos, valor)`` para a exposição"""
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, labels, value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                # Sem janela de amostras: só os buckets acumulados interessam
+                histogram = self._values[key] = RollingHistogram(self.buckets, 0)
+            histogram.observe(value)
+
+    def samples(self):
+        with self._lock:
+            values = [
+                (labels, histogram.cumulative_counts(), histogram.sum, histogram.count)
+                for labels, histogram in self._values.items()
+            ]
+        for labels, buckets, total, count in values:
+            for bound, cumulative in buckets:
+                le = (("le", _format_value(bound)),)
+                yield self.name + "_bucket", labels + le, cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class Registry:
+    """Métricas registradas e coletores chamados a cada exposição"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, function):
+        """Registra uma função que gera métricas (Gauge prontos) na coleta"""
+        self.collectors.append(function)
+        return function
+
+    def expose(self):
+        lines = []
+        families = list(self.metrics)
+        for collect in self.collectors:
+            families.extend(collect())
+        for metric in families:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+group_send_total = registry.register(
+    Counter(
+        "gestao_group_send_total",
+        "Eventos enviados aos grupos do WebSocket, por grupo e ação",
+        ("group", "action"),
+    )
+)
+group_send_seconds = registry.register(
+    Histogram(
+        "gestao_group_send_seconds",
+        "Duração do group_send na camada de canais, por grupo e ação",
+        ("group", "action"),
+    )
+)
+db_sync_in_flight = registry.register(
+    Gauge(
+        "gestao_db_sync_in_flight",
+        "Chamadas database_sync_to_async enviadas e ainda não concluídas",
+    )
+)
+db_sync_wait_seconds = registry.register(
+    Histogram(
+        "gestao_db_sync_wait_seconds",
+        "Espera na fila do executor antes de uma chamada database_sync_to_async",
+    )
+)
+http_request_seconds = registry.register(
+    Histogram(
+        "gestao_http_request_seconds",
+        "Latência das requisições HTTP por endpoint",
+        ("endpoint",),
+    )
+)
+
+
+@registry.collector
+def channel_layer_metrics():
+    """
+    Consumers conectados por grupo e profundidade das filas de envio, lidos
+    da InMemoryChannelLayer do processo. Outras camadas não expõem esse estado.
+
+    Para não criar uma série por conexão, a fila de cada canal só aparece
+    quando não está vazia; o máximo e o total por grupo aparecem sempre.
+    """
+    layer = get_channel_layer()
+    groups = getattr(layer, "groups", None)
+    channels = getattr(layer, "channels", None)
+    if groups is None or channels is None:
+        return []
+
+    consumers = Gauge(
+        "gestao_ws_group_consumers", "Consumers conectados por grupo", ("group",)
+    )
+    depth = Gauge(
+        "gestao_channel_queue_depth",
+        "Mensagens aguardando na fila de um consumer (só filas não vazias)",
+        ("group", "channel"),
+    )
+    depth_max = Gauge(
+        "gestao_channel_queue_depth_max",
+        "Maior fila de envio entre os consumers do grupo",
+        ("group",),
+    )
+    depth_total = Gauge(
+        "gestao_channel_queue_depth_total",
+        "Soma das filas de envio dos consumers do grupo",
+        ("group",),
+    )
+
+    # Cópias: a camada é alterada pelo event loop enquanto a coleta roda
+    for group, members in list(groups.items()):
+        members = list(members)
+        sizes = []
+        for channel in members:
+            queue = channels.get(channel)
+            size = queue.qsize() if queue is not None else 0
+            sizes.append(size)
+            if size:
+                depth.set(size, group=group, channel=channel)
+        consumers.set(len(members), group=group)
+        depth_max.set(max(sizes, default=0), group=group)
+        depth_total.set(sum(sizes), group=group)
+    return [consumers, depth, depth_max, depth_total]
+
+
+def metrics_view(request):
+    return HttpResponse(registry.expose(), content_type=CONTENT_TYPE)
+
+
+async def timed_group_send(layer, group, event):
+    """``group_send`` registrando contagem e duração por ação do evento"""
+    started = time.perf_counter()
+    try:
+        await layer.group_send(group, event)
+    finally:
+        elapsed = time.perf_counter() - started
+        for action in event.get("actions") or [event.get("action", "")]:
+            group_send_total.inc(group=group, action=action)
+            group_send_seconds.observe(elapsed, group=group, action=action)
+
+
+_submitted_at = ContextVar("db_sync_submitted_at", default=None)
+
+
+class TrackedDatabaseSyncToAsync(DatabaseSyncToAsync):
+    """
+    ``database_sync_to_async`` que mede a saturação do executor: chamadas em
+    andamento e o tempo de espera até a thread começar a executá-las.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        @functools.wraps(func)
+        def tracked(*func_args, **func_kwargs):
+            # Roda no contexto copiado da chamada, que traz o instante do envio
+            submitted = _submitted_at.get()
+            if submitted is not None:
+                db_sync_wait_seconds.observe(time.perf_counter() - submitted)
+            return func(*func_args, **func_kwargs)
+
+        super().__init__(tracked, *args, **kwargs)
+
+    async def __call__(self, *args, **kwargs):
+        _submitted_at.set(time.perf_counter())
+        db_sync_in_flight.inc()
+        try:
+            return await super().__call__(*args, **kwargs)
+        finally:
+            db_sync_in_flight.dec()
+
+
+database_sync_to_async = TrackedDatabaseSyncToAsync
+
+
+class MetricsMiddleware:
+    """Registra a latência de cada requisição HTTP por endpoint"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        http_request_seconds.observe(
+            time.perf_counter() - started, endpoint=http_endpoint(request)
+        )
+        return response
@@ -0,0 +1,68 @@
+"""
+Orçamento de consultas SQL por endpoint.
+
+Cada view declara ``query_budget``: um inteiro, ou um dicionário pela ação
+do viewset (``list``, ``retrieve``, ações extras) ou pelo método HTTP em
+APIViews. O mesmo valor é conferido pelos testes (QueryBudgetMixin) e, em
+DEBUG, pelo QueryBudgetMiddleware, que registra as violações no log.
+"""
+
+import logging
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def get_query_budget(resolver_match, method):
+    """Retorna o orçamento declarado para a rota e o método, ou None"""
+    func = resolver_match.func
+    view_class = getattr(func, "cls", None) or getattr(func, "view_class", None)
+    budget = getattr(view_class, "query_budget", None)
+    if not isinstance(budget, dict):
+        return budget
+
+    method = method.lower()
+    actions = getattr(func, "actions", None)
+    return budget.get(actions.get(method) if actions else method)
+
+
+class QueryCounter:
+    """execute_wrapper que apenas conta as consultas executadas"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """
+    Em DEBUG, conta as consultas de cada requisição e avisa quando a view
+    ultrapassa o orçamento declarado. Fora de DEBUG não é carregado.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        match = getattr(request, "resolver_match", None)
+        budget = get_query_budget(match, request.method) if match else None
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                "Orçamento de consultas excedido em %s %s: %d consultas (limite %d)",
+                request.method,
+                request.path,
+                counter.count,
+                budget,
+            )
+        return response
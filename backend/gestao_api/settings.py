@@ -58,6 +58,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Só é carregado com REQUEST_INSTRUMENTATION; mede consultas e tempos
+    "gestao_api.instrumentation.InstrumentationMiddleware",
+    # Latência por endpoint exposta em /metrics
+    "gestao_api.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -67,6 +71,8 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    # Só é carregado com DEBUG; avisa quando um endpoint excede query_budget
+    "gestao_api.querybudget.QueryBudgetMiddleware",
 ]
 
 # CORS Settings
@@ -105,6 +111,29 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Janela (ms) em que alterações consecutivas são agrupadas em um único evento
+# de WebSocket por grupo; 0 envia cada alteração imediatamente
+REALTIME_BROADCAST_WINDOW_MS = config(
+    "REALTIME_BROADCAST_WINDOW_MS", default=100, cast=int
+)
+
+# Cache local (por processo) dos ids de departamentos, obras e setores
+# resolvidos pelo nome; o TTL limita a defasagem entre processos
+REFERENCE_CACHE_TTL_SECONDS = config(
+    "REFERENCE_CACHE_TTL_SECONDS", default=300, cast=int
+)
+REFERENCE_CACHE_MAX_ENTRIES = config(
+    "REFERENCE_CACHE_MAX_ENTRIES", default=4096, cast=int
+)
+
+# Instrumentação opcional de requisições e mensagens WebSocket (consultas,
+# tempo no banco, serialização e total; cabeçalho Server-Timing e log) e
+# tamanho da janela dos histogramas por endpoint
+REQUEST_INSTRUMENTATION = config("REQUEST_INSTRUMENTATION", default=False, cast=bool)
+INSTRUMENTATION_HISTOGRAM_WINDOW = config(
+    "INSTRUMENTATION_HISTOGRAM_WINDOW", default=1000, cast=int
+)
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -0,0 +1,68 @@
+"""Utilitários compartilhados pelos testes dos apps."""
+
+from unittest import SkipTest
+from urllib.parse import urlsplit
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from .querybudget import get_query_budget
+
+
+class PlanCheckMixin:
+    """
+    Confere com EXPLAIN que as consultas dos caminhos críticos usam índices.
+
+    Com ``enable_seqscan = off`` o PostgreSQL só escolhe uma varredura
+    sequencial quando nenhum índice atende a consulta, então o teste não
+    depende do volume de dados semeado. Em outros bancos o teste é pulado.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if connection.vendor != "postgresql":
+            raise SkipTest("EXPLAIN com enable_seqscan disponível apenas no PostgreSQL")
+        super().setUpClass()
+
+    def assertUsesIndex(self, queryset):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan, f"{queryset.query}\n{plan}")
+
+
+class QueryBudgetMixin:
+    """
+    Confere que os endpoints respeitam o ``query_budget`` declarado na view
+    com poucos e com muitos registros, o que denuncia consultas N+1 e
+    consultas que crescem com o tamanho da tabela.
+    """
+
+    budget_sizes = (10, 1000)
+
+    def assertWithinQueryBudget(self, url, method="get", **kwargs):
+        budget = get_query_budget(resolve(urlsplit(url).path), method)
+        self.assertIsNotNone(budget, f"{url} não declara query_budget")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, url)
+        self.assertLessEqual(
+            len(queries),
+            budget,
+            "\n".join([url] + [query["sql"] for query in queries]),
+        )
+        return response
+
+    def assertEndpointsWithinBudget(self, seed, urls):
+        """
+        Para cada tamanho em ``budget_sizes`` completa a base com
+        ``seed(quantidade)`` e confere todas as URLs de ``urls()``.
+        """
+        seeded = 0
+        for size in self.budget_sizes:
+            seed(size - seeded)
+            seeded = size
+            for url in urls():
+                with self.subTest(url=url, rows=size):
+                    self.assertWithinQueryBudget(url)
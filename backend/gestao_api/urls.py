@@ -19,6 +19,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -26,6 +27,8 @@ urlpatterns = [
     path("api/financials/", include("financials.urls")),
     path("api/users/", include("users.urls")),
     path("api-auth/", include("rest_framework.urls")),
+    # Métricas no formato do Prometheus
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 # Serve static and media files in development
@@ -54,6 +54,22 @@ export default function Dashboard() {
             setEmployees(message.data);
           }
           break;
+        case 'employee_upsert':
+          if (message.data) {
+            const changed: Employee[] = message.data;
+            setEmployees((current) => {
+              const byId = new Map(current.map((employee) => [employee.id, employee]));
+              changed.forEach((employee) => byId.set(employee.id, employee));
+              return Array.from(byId.values());
+            });
+          }
+          break;
+        case 'employee_delete':
+          if (message.data) {
+            const removed = new Set<number>(message.data);
+            setEmployees((current) => current.filter((employee) => !removed.has(employee.id)));
+          }
+          break;
         case 'initial_data':
           if (message.data) {
             setDepartments(message.data.departments || []);
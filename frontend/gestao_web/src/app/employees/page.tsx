@@ -57,6 +57,24 @@ export default function EmployeesPage() {
         }
         break;
 
+      case 'employee_upsert':
+        if (message.data) {
+          const changed: Employee[] = message.data;
+          setEmployees((current) => {
+            const byId = new Map(current.map((employee) => [employee.id, employee]));
+            changed.forEach((employee) => byId.set(employee.id, employee));
+            return Array.from(byId.values());
+          });
+        }
+        break;
+
+      case 'employee_delete':
+        if (message.data) {
+          const removed = new Set<number>(message.data);
+          setEmployees((current) => current.filter((employee) => !removed.has(employee.id)));
+        }
+        break;
+
       case 'update':
         console.log('🔄 Atualização geral:', message.action);
         // Handle specific actions